@@ -0,0 +1,65 @@
+"""
+Benchmark of Geocoder.geocode_addresses_async against the ThreadPoolExecutor path of geocode_addresses
+
+Both run against a local stub server with a fixed latency and a rate limit high enough that the
+concurrency of the engine, not the limit, sets the throughput.
+
+Run from the repository root:
+    python -m benchmarks.geocoder_async_benchmark [address_count] [latency_ms]
+"""
+import os
+import sys
+import time
+
+from benchmarks.geocoder_rate_benchmark import create_address_file
+from benchmarks.stub_geocode_server import StubGeocodeServer
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from geocoder import Geocoder
+from geocode_providers import GeocodeMapsProvider
+
+DEFAULT_ADDRESS_COUNT = 2_000
+DEFAULT_LATENCY_MS = 100
+REQUESTS_PER_SECOND = 1_000
+THREAD_COUNTS = [16, 64, 256]
+CONNECTION_COUNTS = [16, 64, 256]
+
+def run(server: StubGeocodeServer, address_file_path: str, method: str, concurrency: int) -> dict:
+    server.reset_counts()
+
+    provider = GeocodeMapsProvider(base_url=server.base_url, requests_per_second=REQUESTS_PER_SECOND, max_concurrency=concurrency)
+    gc = Geocoder(providers=[provider], address_file_path=address_file_path, max_threads=concurrency, use_cache=False, use_journal=False)
+
+    start = time.perf_counter()
+    if method == "threads":
+        gc.geocode_addresses()
+    else:
+        gc.geocode_addresses_async(max_connections=concurrency)
+    seconds = time.perf_counter() - start
+
+    return {
+        "method": method,
+        "threads / connections": concurrency,
+        "seconds": seconds,
+        "rows": len(gc.df),
+        "addresses per second": len(gc.addresses) / seconds
+    }
+
+if __name__ == "__main__":
+    address_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ADDRESS_COUNT
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LATENCY_MS
+
+    server = StubGeocodeServer(latency_seconds=latency_ms / 1000)
+    server.start()
+
+    address_file_path = create_address_file(address_count)
+
+    rows = [run(server, address_file_path, "threads", thread_count) for thread_count in THREAD_COUNTS]
+    rows += [run(server, address_file_path, "async", connection_count) for connection_count in CONNECTION_COUNTS]
+
+    server.shutdown()
+
+    print(f"\naddresses: {address_count:,}, latency: {latency_ms:,.0f} ms, rate limit: {REQUESTS_PER_SECOND:,} requests per second")
+    print(pd.DataFrame(rows).to_string(index=False, float_format="{:,.2f}".format))
@@ -0,0 +1,102 @@
+"""
+Benchmark and check of geocoding across several providers, against local fake providers
+
+Each fake provider is a stub server with its own rate limit. The scenarios check that work spread across
+providers adds up their quotas, that misses fall back to the next provider and that a provider that is down
+doesn't stop the job.
+
+Run from the repository root:
+    python -m benchmarks.geocoder_provider_benchmark [address_count] [requests_per_second]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.geocoder_rate_benchmark import create_address_file
+from benchmarks.stub_geocode_server import StubGeocodeServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from geocoder import Geocoder
+from geocode_providers import GeocodeMapsProvider, MaptilerProvider, PositionstackProvider
+
+DEFAULT_ADDRESS_COUNT = 300
+DEFAULT_REQUESTS_PER_SECOND = 10
+LATENCY_SECONDS = 0.05
+
+def create_providers(requests_per_second: float, miss_fractions: list[float], error_statuses: list[int]) -> tuple[list, list]:
+    """
+    Start a stub server for each fake provider (geocode.maps.co, positionstack, maptiler order) and create
+    providers pointing at them
+
+        Returns:
+            servers (list[StubGeocodeServer]), providers (list[Provider])
+    """
+
+    servers = []
+    providers = []
+    for i, (provider_class, miss_fraction, error_status) in enumerate(zip([GeocodeMapsProvider, PositionstackProvider, MaptilerProvider], miss_fractions, error_statuses)):
+        server = StubGeocodeServer(latency_seconds=LATENCY_SECONDS, requests_per_second=requests_per_second, miss_fraction=miss_fraction, error_status=error_status, seed=i)
+        server.start()
+
+        base_url = {
+            GeocodeMapsProvider: server.base_url,
+            PositionstackProvider: server.positionstack_base_url,
+            MaptilerProvider: server.maptiler_base_url
+        }[provider_class]
+
+        provider = provider_class(base_url=base_url, api_key="test", requests_per_second=requests_per_second)
+        # fail fast on the provider that is down
+        if error_status is not None:
+            provider.MAX_RETRIES = 1
+
+        servers.append(server)
+        providers.append(provider)
+
+    return servers, providers
+
+def run_scenario(name: str, address_file_path: str, provider_count: int, requests_per_second: float, miss_fractions: list[float], error_statuses: list[int], mode: str = "threads") -> dict:
+    servers, providers = create_providers(requests_per_second, miss_fractions[:provider_count], error_statuses[:provider_count])
+
+    gc = Geocoder(providers=providers, address_file_path=address_file_path, use_cache=False, use_journal=False)
+
+    start = time.perf_counter()
+    if mode == "async":
+        gc.geocode_addresses_async()
+    else:
+        gc.geocode_addresses()
+    seconds = time.perf_counter() - start
+
+    for server in servers:
+        server.shutdown()
+
+    return {
+        "scenario": name,
+        "mode": mode,
+        "seconds": seconds,
+        "addresses per second": len(gc.addresses) / seconds,
+        "found": gc.df["address"].nunique(),
+        "all found": gc.df["address"].nunique() == len(gc.addresses),
+        "schema ok": list(gc.df.columns) == Geocoder.RESULT_COLUMNS,
+        "requests per provider": ", ".join(f"{provider.name.lower()}: {provider.rate_limiter.request_count:,}" for provider in providers)
+    }
+
+if __name__ == "__main__":
+    address_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ADDRESS_COUNT
+    requests_per_second = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_REQUESTS_PER_SECOND
+
+    address_file_path = create_address_file(address_count)
+
+    no_misses = [0.0, 0.0, 0.0]
+    no_errors = [None, None, None]
+    rows = [
+        run_scenario("one provider", address_file_path, 1, requests_per_second, no_misses, no_errors),
+        run_scenario("three providers", address_file_path, 3, requests_per_second, no_misses, no_errors),
+        run_scenario("three providers", address_file_path, 3, requests_per_second, no_misses, no_errors, mode="async"),
+        run_scenario("30% misses, fallback", address_file_path, 3, requests_per_second, [0.3, 0.3, 0.0], no_errors),
+        run_scenario("first provider down", address_file_path, 3, requests_per_second, no_misses, [500, None, None])
+    ]
+
+    print(f"\naddresses: {address_count:,}, limit: {requests_per_second:,.0f} requests per second per provider, latency: {LATENCY_SECONDS * 1000:,.0f} ms")
+    print(pd.DataFrame(rows).to_string(index=False, float_format="{:,.2f}".format))
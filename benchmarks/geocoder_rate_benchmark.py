@@ -0,0 +1,90 @@
+"""
+Benchmark of the geocoder's shared rate limiter against the per thread time.sleep it replaced
+
+Both are run against a local stub server that allows requests_per_second and answers HTTP 429 above it.
+The sleeping threads either idle below the limit or burst past it depending on the thread count, the rate
+limiter should stay at the limit for any thread count.
+
+Run from the repository root:
+    python -m benchmarks.geocoder_rate_benchmark [requests_per_second] [address_count]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import requests
+
+from benchmarks.stub_geocode_server import StubGeocodeServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from geocoder import Geocoder
+from geocode_providers import GeocodeMapsProvider
+
+DEFAULT_REQUESTS_PER_SECOND = 20
+DEFAULT_ADDRESS_COUNT = 200
+LATENCY_SECONDS = 0.05
+THREAD_COUNTS = [1, 4, 16, 64]
+
+def create_address_file(address_count: int) -> str:
+    """
+    Write address_count unique addresses to a temporary csv file and return its path
+    """
+
+    file_path = os.path.join(tempfile.mkdtemp(), "addresses.csv")
+    pd.DataFrame({"address": [f"address {i}" for i in range(address_count)]}).to_csv(file_path, index=False)
+
+    return file_path
+
+def geocode_sleeping_threads(base_url: str, addresses: list[str], thread_count: int, wait_time: float):
+    """
+    The original worker: request, then sleep wait_time in every thread
+    """
+
+    def worker(address: str):
+        requests.get(base_url.format(address.replace(" ", "%20")))
+        time.sleep(wait_time)
+
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        list(executor.map(worker, addresses))
+
+def geocode_rate_limited(base_url: str, address_file_path: str, thread_count: int, requests_per_second: float):
+    provider = GeocodeMapsProvider(base_url=base_url, requests_per_second=requests_per_second, max_concurrency=thread_count)
+    gc = Geocoder(providers=[provider], address_file_path=address_file_path, max_threads=thread_count, use_cache=False, use_journal=False)
+    gc.geocode_addresses()
+
+def run(server: StubGeocodeServer, function, *args) -> dict:
+    server.reset_counts()
+
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+
+    return {
+        "seconds": seconds,
+        "successful": server.allowed_count,
+        "throttled": server.throttled_count,
+        "successful per second": server.allowed_count / seconds
+    }
+
+if __name__ == "__main__":
+    requests_per_second = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS_PER_SECOND
+    address_count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_ADDRESS_COUNT
+
+    server = StubGeocodeServer(latency_seconds=LATENCY_SECONDS, requests_per_second=requests_per_second)
+    server.start()
+
+    address_file_path = create_address_file(address_count)
+    addresses = list(pd.read_csv(address_file_path)["address"])
+
+    rows = []
+    for thread_count in THREAD_COUNTS:
+        rows.append({"method": "sleeping threads", "threads": thread_count, **run(server, geocode_sleeping_threads, server.base_url, addresses, thread_count, 1 / requests_per_second)})
+        rows.append({"method": "rate limiter", "threads": thread_count, **run(server, geocode_rate_limited, server.base_url, address_file_path, thread_count, requests_per_second)})
+
+    server.shutdown()
+
+    print(f"\nlimit: {requests_per_second:,.0f} requests per second, latency: {LATENCY_SECONDS * 1000:,.0f} ms, addresses: {address_count:,}")
+    print(pd.DataFrame(rows).to_string(index=False, float_format="{:,.2f}".format))
@@ -0,0 +1,122 @@
+"""
+Benchmark of the geocoder's local index of previous results: build time, memory footprint and lookup latency
+
+The index is built from a synthetic geocoder output file of address_count addresses (one to three result
+rows each), then looked up with exact, prefix, misspelt (fuzzy) and unknown addresses.
+
+Run from the repository root:
+    python -m benchmarks.local_index_benchmark [address_count] [lookup_count]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from geocode_providers import Provider
+from local_index import LocalGeocodeIndex
+
+DEFAULT_ADDRESS_COUNT = 100_000
+DEFAULT_LOOKUP_COUNT = 2_000
+
+STREET_NAMES = ["high", "station", "church", "park", "victoria", "green", "manor", "kings", "queens", "mill", "school", "new"]
+STREET_TYPES = ["street", "road", "lane", "avenue", "close", "drive"]
+TOWNS = ["leeds", "york", "bath", "derby", "exeter", "lincoln", "norwich", "oxford", "preston", "carlisle"]
+
+def create_addresses(address_count: int, rng: np.random.Generator) -> list[str]:
+    """
+    Return address_count unique synthetic addresses
+    """
+
+    addresses = set()
+    while len(addresses) < address_count:
+        addresses.add(f"{rng.integers(1, 2000)} {rng.choice(STREET_NAMES)} {rng.choice(STREET_TYPES)}, {rng.choice(TOWNS)}, united kingdom")
+
+    return sorted(addresses)
+
+def create_output_file(addresses: list[str], rng: np.random.Generator) -> str:
+    """
+    Write a geocoder output csv file with one to three result rows per address and return its path
+    """
+
+    rows = []
+    for i, address in enumerate(addresses):
+        for j in range(rng.integers(1, 4)):
+            rows.append({
+                "address": address,
+                "place_id": i * 10 + j,
+                "osm_id": i * 10 + j,
+                "lat": rng.uniform(50, 55),
+                "long": rng.uniform(-4, 1),
+                "display_name": address.title(),
+                "class": "place",
+                "type": "house"
+            })
+
+    file_path = os.path.join(tempfile.mkdtemp(), "geocoded_addresses.csv")
+    pd.DataFrame(rows, columns=Provider.RESULT_COLUMNS).to_csv(file_path, index=False)
+
+    return file_path
+
+def misspell(address: str, rng: np.random.Generator) -> str:
+    """
+    Swap two neighbouring letters of the street name
+    """
+
+    i = address.index(" ") + 2
+    return address[:i] + address[i + 1] + address[i] + address[i + 2:]
+
+def time_lookups(index: LocalGeocodeIndex, addresses: list[str]) -> dict:
+    found_count = 0
+    seconds = []
+    for address in addresses:
+        start = time.perf_counter()
+        result = index.lookup(address)
+        seconds.append(time.perf_counter() - start)
+        found_count += result is not None
+
+    return {
+        "found": f"{found_count:,} / {len(addresses):,}",
+        "median us": statistics.median(seconds) * 1e6,
+        "p99 us": np.percentile(seconds, 99) * 1e6
+    }
+
+if __name__ == "__main__":
+    address_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ADDRESS_COUNT
+    lookup_count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LOOKUP_COUNT
+
+    rng = np.random.default_rng(0)
+    addresses = create_addresses(address_count, rng)
+    file_path = create_output_file(addresses, rng)
+
+    start = time.perf_counter()
+    index = LocalGeocodeIndex(Provider.RESULT_COLUMNS, approximate=True)
+    index.build_from_files([file_path])
+    build_seconds = time.perf_counter() - start
+
+    # tracing slows the build down, measure memory on a second build
+    tracemalloc.start()
+    traced_index = LocalGeocodeIndex(Provider.RESULT_COLUMNS, approximate=True)
+    traced_index.build_from_files([file_path])
+    memory_bytes, peak_memory_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced_index
+
+    sample = [addresses[i] for i in rng.choice(len(addresses), size=min(lookup_count, len(addresses)), replace=False)]
+    unknown = [f"{rng.integers(1, 2000)} unknown {rng.choice(STREET_TYPES)}, nowhere, atlantis" for _ in sample]
+
+    rows = [
+        {"lookup": "exact", **time_lookups(index, [address.upper() for address in sample])},
+        {"lookup": "prefix", **time_lookups(index, [address.rsplit(",", 1)[0] for address in sample])},
+        {"lookup": "fuzzy", **time_lookups(index, [misspell(address, rng) for address in sample])},
+        {"lookup": "miss", **time_lookups(index, unknown)}
+    ]
+
+    print(f"\naddresses: {len(index):,}, result rows: {index.row_starts[-1]:,}, trigrams: {np.count_nonzero(np.diff(index.posting_starts)):,}")
+    print(f"build: {build_seconds:,.2f} s, memory: {memory_bytes / 2 ** 20:,.1f} MB (peak while building {peak_memory_bytes / 2 ** 20:,.1f} MB)")
+    print(pd.DataFrame(rows).to_string(index=False, float_format="{:,.1f}".format))
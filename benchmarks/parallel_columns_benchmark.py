@@ -0,0 +1,87 @@
+"""
+Benchmark of the Visual Indexer's per-column work run serially and on the ColumnExecutor process pool, used to
+set parallel_columns.MIN_PARALLEL_CELL_COUNTS
+
+Each operation is timed at each size with a serial executor and a parallel one whose pool is already started.
+On a machine with fewer cores than workers the parallel time is the serial work plus the cost of going
+parallel (dispatching tasks, pickling text columns, copying columns into and out of shared memory), which
+gives the break-even size for other core counts: with w busy cores a parallel run saves about
+serial * (1 - 1 / w) - overhead.
+
+Run from the repository root:
+    python -m benchmarks.parallel_columns_benchmark [max_workers] [rows x columns ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.suite import create_data, create_text_data, parse_size, SEED
+from parallel_columns import ColumnExecutor, MIN_PARALLEL_CELL_COUNTS
+
+DEFAULT_SIZES = [(100_000, 12), (300_000, 12), (1_000_000, 12)]
+REPEAT = 3
+
+def time_best(function, *args, repeat: int = REPEAT) -> float:
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        seconds.append(time.perf_counter() - start)
+
+    return min(seconds)
+
+def run_size(serial: ColumnExecutor, parallel: ColumnExecutor, row_count: int, column_count: int) -> list[dict]:
+    rng = np.random.default_rng(SEED)
+    data_df = create_data(row_count, column_count, rng)
+    text_df = create_text_data(data_df, rng)
+
+    columns = [data_df[column_name].to_numpy() for column_name in data_df.columns[1:]]
+    column_names = list(data_df.columns[1:])
+    text_columns = [text_df[column_name] for column_name in text_df.columns[1:]]
+    integer_columns = [data_df[column_name].fillna(0).astype(np.int64) for column_name in data_df.columns[1:]]
+
+    operations = {
+        "coerce (text)": lambda executor: executor.coerce_columns(text_columns),
+        "coerce (integers)": lambda executor: executor.coerce_columns(integer_columns),
+        "statistics": lambda executor: executor.calculate_statistics(columns, column_names),
+        "normalise": lambda executor: executor.normalise_columns(columns, ["log"] * column_count)
+    }
+
+    rows = []
+    for operation, function in operations.items():
+        serial_seconds = time_best(function, serial)
+        parallel_seconds = time_best(function, parallel)
+        rows.append({
+            "operation": operation,
+            "rows": row_count,
+            "columns": column_count,
+            "serial (s)": serial_seconds,
+            "parallel (s)": parallel_seconds,
+            "overhead (s)": parallel_seconds - serial_seconds,
+            "speedup": serial_seconds / parallel_seconds
+        })
+        print(f"{operation:<18} {row_count:>11,} x {column_count:<5,} serial {serial_seconds:,.3f} s, parallel {parallel_seconds:,.3f} s", flush=True)
+
+    return rows
+
+if __name__ == "__main__":
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    sizes = [parse_size(text) for text in sys.argv[2:]] or DEFAULT_SIZES
+
+    serial = ColumnExecutor(max_workers=1)
+    # parallel whatever the size, the thresholds are what is being measured
+    parallel = ColumnExecutor(max_workers=max(2, max_workers), min_parallel_cell_counts={operation: 1 for operation in MIN_PARALLEL_CELL_COUNTS})
+    parallel.run([(time.sleep, 0)] * parallel.max_workers)
+
+    try:
+        rows = []
+        for row_count, column_count in sizes:
+            rows.extend(run_size(serial, parallel, row_count, column_count))
+    finally:
+        parallel.shutdown()
+
+    print(f"\ncpu count: {os.cpu_count()}, workers: {parallel.max_workers}")
+    print(pd.DataFrame(rows).to_string(index=False, float_format="{:,.3f}".format))
@@ -0,0 +1,77 @@
+"""
+Benchmark of the ranking post-processing stage: ranking time, file size and read time of every candidate
+as csv against the top k candidates as parquet
+
+Run from the repository root:
+    python -m benchmarks.result_ranking_benchmark [address_count] [top_k]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from geocode_providers import Provider
+from result_ranking import rank_results
+
+DEFAULT_ADDRESS_COUNT = 200_000
+DEFAULT_TOP_K = 1
+MAX_CANDIDATES = 10
+
+CLASS_TYPES = [("aeroway", "aerodrome"), ("building", "hangar"), ("amenity", "bar"), ("tourism", "hotel"), ("highway", "primary"), ("boundary", "administrative")]
+
+def create_results(address_count: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Return geocoder results with one to MAX_CANDIDATES candidates per address, lat/long and ids as strings
+    as the providers return them
+    """
+
+    counts = rng.integers(1, MAX_CANDIDATES + 1, address_count)
+    addresses = np.repeat([f"{i} high street, leeds, united kingdom" for i in range(address_count)], counts)
+    class_types = rng.integers(0, len(CLASS_TYPES), len(addresses))
+
+    return pd.DataFrame({
+        "address": addresses,
+        "place_id": rng.integers(1, 10 ** 9, len(addresses)).astype(str),
+        "osm_id": rng.integers(1, 10 ** 10, len(addresses)).astype(str),
+        "lat": rng.uniform(50, 55, len(addresses)).astype(str),
+        "long": rng.uniform(-4, 1, len(addresses)).astype(str),
+        "display_name": [f"place {i}, leeds, united kingdom" for i in range(len(addresses))],
+        "class": [CLASS_TYPES[i][0] for i in class_types],
+        "type": [CLASS_TYPES[i][1] for i in class_types],
+        "importance": rng.uniform(0, 1, len(addresses)).round(6).astype(str)
+    }, columns=Provider.RESULT_COLUMNS)
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    address_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ADDRESS_COUNT
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_TOP_K
+
+    results_df = create_results(address_count, np.random.default_rng(0))
+    directory = tempfile.mkdtemp()
+
+    csv_file_path = os.path.join(directory, "geocoded_addresses.csv")
+    results_df.to_csv(csv_file_path, index=False)
+
+    ranked_df, rank_seconds = timed(rank_results, results_df, top_k)
+    parquet_file_path = os.path.join(directory, "geocoded_addresses.parquet")
+    ranked_df.to_parquet(parquet_file_path, index=False)
+
+    _, csv_read_seconds = timed(pd.read_csv, csv_file_path)
+    _, parquet_read_seconds = timed(pd.read_parquet, parquet_file_path)
+
+    rows = [
+        {"output": "every candidate, csv", "rows": len(results_df), "MB": os.path.getsize(csv_file_path) / 2 ** 20, "read s": csv_read_seconds},
+        {"output": f"top {top_k}, parquet", "rows": len(ranked_df), "MB": os.path.getsize(parquet_file_path) / 2 ** 20, "read s": parquet_read_seconds}
+    ]
+
+    print(f"\naddresses: {address_count:,}, candidates: {len(results_df):,}, ranking: {rank_seconds:,.2f} s ({len(results_df) / rank_seconds:,.0f} candidates per second)")
+    print(pd.DataFrame(rows).to_string(index=False, float_format="{:,.2f}".format))
@@ -0,0 +1,163 @@
+"""
+Benchmark of utils.index_columns, the index pipeline of the Visual Indexer and the headless indexer, against
+the row by row scoring loop it replaced, checking that both give bit for bit identical indexes
+
+Run from the repository root:
+    python -m benchmarks.scoring_benchmark [row_count] [column_count]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from columnar_data import compact_columns
+from utils import (
+    apply_transformations,
+    get_column_name_raw,
+    index_columns,
+    MAX_INDEX_CELL_SCORE,
+    MAX_INDEX_ROW_SCORE,
+    ORDER_REVERSING_TRANSFORMATIONS,
+    POLARITY_OPTIONS,
+    SCORE_COLUMN_NAME,
+    TRANSFORMATIONS
+)
+
+DEFAULT_ROW_COUNT = 20_000
+DEFAULT_COLUMN_COUNT = 10
+NAN_FRACTION = 0.05
+SEED = 0
+
+def create_test_data(row_count: int, column_count: int) -> tuple[pd.DataFrame, dict, dict, dict]:
+    """
+    Create random data and matching index settings
+
+        Parameters:
+            row_count (int)
+            column_count (int)
+
+        Returns:
+            data_df (pd.DataFrame), weights (dict), polarities (dict), transformations_to_use (dict)
+    """
+
+    rng = np.random.default_rng(SEED)
+    transformation_names = list(TRANSFORMATIONS.keys())
+
+    columns = {"label": [f"row {i}" for i in range(row_count)]}
+    weights = {"": 0}
+    polarities = {}
+    transformations_to_use = {}
+    for i in range(column_count):
+        column_name = f"column {i}"
+
+        values = rng.lognormal(size=row_count)
+        values[rng.random(row_count) < NAN_FRACTION] = np.nan
+
+        columns[column_name] = values
+        weights[column_name] = int(rng.integers(0, 101))
+        polarities[column_name] = POLARITY_OPTIONS[i % len(POLARITY_OPTIONS)]
+        transformations_to_use[column_name] = transformation_names[i % len(transformation_names)]
+
+    return pd.DataFrame(columns), weights, polarities, transformations_to_use
+
+def score_index_legacy(transformed_df: pd.DataFrame, weights: dict, polarities: dict, transformations_to_use: dict) -> pd.DataFrame:
+    """
+    Copy of the original "Index Output" code from pages/001_Visual_Indexer.py
+    """
+
+    columns = [list(transformed_df.iloc[:, 0])]
+    column_names = [transformed_df.columns[0]]
+    for column_name in transformed_df.columns[1:]:
+        column_name_raw = get_column_name_raw(column_name)
+
+        column_data = []
+        col_max = transformed_df[column_name].max()
+        col_min = transformed_df[column_name].min()
+        col_range = col_max - col_min
+
+        inversion_required = transformations_to_use[column_name_raw] in ORDER_REVERSING_TRANSFORMATIONS
+        higher_is_better = "higher" in polarities[column_name_raw].lower()
+
+        for item in transformed_df[column_name]:
+            value = MAX_INDEX_CELL_SCORE * ((item - col_min) / col_range)
+            if (higher_is_better and inversion_required) or (not(higher_is_better) and not(inversion_required)):
+                value = MAX_INDEX_CELL_SCORE - value
+
+            column_data.append(value)
+
+        columns.append(column_data)
+        column_names.append(column_name)
+
+    index_df = pd.DataFrame(np.array(columns).T, columns=column_names)
+
+    use_column = {column_name_raw: True for column_name_raw in [""] + list(transformations_to_use.keys())}
+    weights_to_use = [weights[key] for key in weights.keys() if use_column[key]]
+    max_score = np.sum(10 * np.array(weights_to_use))
+
+    row_scores = []
+    for _, row in index_df.iterrows():
+        sum = 0
+        for column_name in row.index[1:]:
+            if (str(row[column_name]).lower() != 'nan') and str(row[column_name]).lower() != 'none':
+                column_name_raw = get_column_name_raw(column_name)
+                sum += float(row[column_name]) * weights[column_name_raw]
+
+        row_scores.append(sum)
+
+    index_df[SCORE_COLUMN_NAME] = MAX_INDEX_ROW_SCORE * np.array(row_scores)/max_score
+    index_df['rank'] = index_df[SCORE_COLUMN_NAME].rank(ascending=False)
+
+    return index_df
+
+def compare_outputs(index_df_legacy: pd.DataFrame, index_df: pd.DataFrame) -> bool:
+    """
+    True when both index data frames hold bit for bit identical values
+
+    The legacy frame stores every cell as a string, so numeric columns are parsed before comparing.
+    """
+
+    if list(index_df_legacy.columns) != list(index_df.columns):
+        return False
+
+    if not (index_df_legacy.iloc[:, 0].astype(str).to_numpy() == index_df.iloc[:, 0].astype(str).to_numpy()).all():
+        return False
+
+    legacy_values = index_df_legacy.iloc[:, 1:].astype(float).to_numpy()
+    values = index_df.iloc[:, 1:].to_numpy(dtype=float)
+
+    return np.array_equal(legacy_values, values, equal_nan=True)
+
+def index_legacy(data_df: pd.DataFrame, weights: dict, polarities: dict, transformations_to_use: dict) -> pd.DataFrame:
+    transformed_df = apply_transformations(data_df, list(transformations_to_use.keys()), transformations_to_use)
+
+    return score_index_legacy(transformed_df, weights, polarities, transformations_to_use)
+
+def index(data_df: pd.DataFrame, weights: dict, polarities: dict, transformations_to_use: dict) -> pd.DataFrame:
+    columnar_data = compact_columns(data_df, "float64")[0]
+
+    return index_columns(columnar_data, transformations_to_use, weights, polarities)
+
+def time_function(function, *args) -> tuple[float, pd.DataFrame]:
+    start = time.perf_counter()
+    result = function(*args)
+
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROW_COUNT
+    column_count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_COLUMN_COUNT
+
+    test_data = create_test_data(row_count, column_count)
+
+    legacy_seconds, index_df_legacy = time_function(index_legacy, *test_data)
+    vectorised_seconds, index_df = time_function(index, *test_data)
+
+    print(f"rows: {row_count:,}, columns: {column_count:,}")
+    print(f"legacy loop: {legacy_seconds:.3f}s")
+    print(f"index_columns: {vectorised_seconds:.3f}s ({legacy_seconds / vectorised_seconds:,.0f}x faster)")
+
+    is_identical = compare_outputs(index_df_legacy, index_df)
+    print(f"identical output: {is_identical}")
+    if not is_identical:
+        sys.exit(1)
@@ -0,0 +1,88 @@
+"""
+Benchmark and check of the spatial index of geocoded points
+
+Builds the index over point_count points (half in city like clusters, half spread over the globe), saves
+and memory maps it, then runs batches of nearest point and within radius queries. Results are checked
+against a scipy KD-tree on 3D unit vectors, whose chord distances give the same neighbours.
+
+Run from the repository root:
+    python -m benchmarks.spatial_index_benchmark [point_count] [query_count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from spatial_index import EARTH_RADIUS_KM, SpatialIndex
+
+DEFAULT_POINT_COUNT = 1_000_000
+DEFAULT_QUERY_COUNT = 100_000
+RADIUS_KM = 5
+CLUSTER_COUNT = 200
+
+def create_points(point_count: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return lat and long of point_count points, half around CLUSTER_COUNT centres and half uniform on the sphere
+    """
+
+    uniform_count = point_count // 2
+    uniform_lat = np.degrees(np.arcsin(rng.uniform(-1, 1, uniform_count)))
+    uniform_long = rng.uniform(-180, 180, uniform_count)
+
+    centres = rng.integers(0, CLUSTER_COUNT, point_count - uniform_count)
+    centre_lat = rng.uniform(-60, 70, CLUSTER_COUNT)
+    centre_long = rng.uniform(-180, 180, CLUSTER_COUNT)
+    cluster_lat = np.clip(centre_lat[centres] + rng.normal(0, 0.2, len(centres)), -90, 90)
+    cluster_long = (centre_long[centres] + rng.normal(0, 0.2, len(centres)) + 180) % 360 - 180
+
+    return np.concatenate([uniform_lat, cluster_lat]), np.concatenate([uniform_long, cluster_long])
+
+def to_unit_vectors(lat: np.ndarray, long: np.ndarray) -> np.ndarray:
+    lat, long = np.radians(lat), np.radians(long)
+
+    return np.column_stack([np.cos(lat) * np.cos(long), np.cos(lat) * np.sin(long), np.sin(lat)])
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    point_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_POINT_COUNT
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_QUERY_COUNT
+
+    rng = np.random.default_rng(0)
+    lat, long = create_points(point_count, rng)
+    query_lat, query_long = create_points(query_count, rng)
+
+    index, build_seconds = timed(SpatialIndex, lat, long)
+    directory = tempfile.mkdtemp()
+    _, save_seconds = timed(index.save, directory)
+    mapped_index, load_seconds = timed(SpatialIndex.load, directory)
+
+    (nearest_ids, nearest_km), nearest_seconds = timed(mapped_index.query_nearest, query_lat, query_long)
+    radius_df, radius_seconds = timed(mapped_index.query_radius, query_lat, query_long, RADIUS_KM)
+
+    tree, tree_build_seconds = timed(cKDTree, to_unit_vectors(lat, long))
+    (tree_chords, tree_ids), tree_nearest_seconds = timed(tree.query, to_unit_vectors(query_lat, query_long))
+    tree_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(tree_chords / 2, 1))
+    chord = 2 * np.sin(RADIUS_KM / EARTH_RADIUS_KM / 2)
+    tree_radius_counts, tree_radius_seconds = timed(tree.query_ball_point, to_unit_vectors(query_lat, query_long), chord, return_length=True)
+
+    radius_counts = np.bincount(radius_df["query"], minlength=query_count)
+
+    rows = [
+        {"index": "grid (memory mapped)", "build s": build_seconds, "nearest s": nearest_seconds, f"within {RADIUS_KM} km s": radius_seconds, "nearest per s": query_count / nearest_seconds},
+        {"index": "scipy KD-tree", "build s": tree_build_seconds, "nearest s": tree_nearest_seconds, f"within {RADIUS_KM} km s": tree_radius_seconds, "nearest per s": query_count / tree_nearest_seconds}
+    ]
+
+    print(f"\npoints: {point_count:,}, queries: {query_count:,}, save: {save_seconds:,.2f} s, load: {load_seconds * 1000:,.1f} ms, index size: {sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 2 ** 20:,.1f} MB")
+    print(pd.DataFrame(rows).to_string(index=False, float_format="{:,.2f}".format))
+    print(f"nearest distances match KD-tree: {np.allclose(nearest_km, tree_km, atol=1e-6)}, max difference: {np.abs(nearest_km - tree_km).max():.2e} km")
+    print(f"within {RADIUS_KM} km counts match KD-tree: {np.array_equal(radius_counts, tree_radius_counts)}, pairs: {len(radius_df):,}")
@@ -0,0 +1,149 @@
+"""
+Local stand-in for the geocoding provider APIs used by the geocoder benchmarks
+
+The server answers geocode.maps.co (/search?q=...), positionstack (/v1/forward?query=...) and maptiler
+(/geocoding/<query>.json) requests with one fake candidate per query after a configurable latency. With a
+rate limit set it behaves like the real providers and answers HTTP 429 with a Retry-After header when the
+limit is exceeded. miss_fraction of the queries (chosen by hashing the query with seed) get an empty result
+and error_status makes every request fail, to exercise provider fallback.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+import zlib
+
+RETRY_AFTER_SECONDS = 1
+
+class StubGeocodeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # keep up with bursts from the unthrottled benchmark runs
+    request_queue_size = 1024
+
+    def __init__(self, latency_seconds: float = 0.0, requests_per_second: float = None, miss_fraction: float = 0.0, error_status: int = None, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), StubGeocodeHandler)
+        self.latency_seconds = latency_seconds
+        self.requests_per_second = requests_per_second
+        self.miss_fraction = miss_fraction
+        self.error_status = error_status
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.allowed_count = 0
+        self.throttled_count = 0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/search?q={{}}"
+
+    @property
+    def positionstack_base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/forward?access_key={{}}&query={{}}"
+
+    @property
+    def maptiler_base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/geocoding/{{}}.json?key={{}}"
+
+    def is_miss(self, query: str) -> bool:
+        return zlib.crc32(f"{self.seed}|{query}".encode("utf-8")) % 1000 < 1000 * self.miss_fraction
+
+    def is_allowed(self) -> bool:
+        """
+        Count the request against a one second window, like the quota of the real provider
+        """
+
+        with self.lock:
+            if self.requests_per_second is not None:
+                now = time.monotonic()
+                if now - self.window_start >= 1:
+                    self.window_start = now
+                    self.window_count = 0
+
+                if self.window_count >= self.requests_per_second:
+                    self.throttled_count += 1
+                    return False
+
+                self.window_count += 1
+
+            self.allowed_count += 1
+
+            return True
+
+    def reset_counts(self):
+        with self.lock:
+            self.allowed_count = 0
+            self.throttled_count = 0
+            self.window_start = time.monotonic()
+            self.window_count = 0
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+
+        return thread
+
+class StubGeocodeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parameters = parse_qs(url.query)
+        if url.path.startswith("/geocoding/"):
+            response_format = "maptiler"
+            query = unquote(url.path[len("/geocoding/"):-len(".json")])
+        elif url.path == "/v1/forward":
+            response_format = "positionstack"
+            query = parameters.get("query", [""])[0]
+        else:
+            response_format = "geocodemaps"
+            query = parameters.get("q", [""])[0]
+
+        is_allowed = self.server.is_allowed()
+
+        time.sleep(self.server.latency_seconds)
+
+        if not is_allowed:
+            self.send_json(429, {"error": "rate limit exceeded"}, {"Retry-After": str(RETRY_AFTER_SECONDS)})
+            return
+
+        if self.server.error_status is not None:
+            self.send_json(self.server.error_status, {"error": "stub error"})
+            return
+
+        place_id = zlib.crc32(query.encode("utf-8"))
+        candidates = [] if self.server.is_miss(query) else [place_id]
+
+        if response_format == "positionstack":
+            body = {"data": [
+                {"latitude": 39.5, "longitude": -8.0, "label": query, "name": query, "type": "locality"}
+                for _ in candidates
+            ]}
+        elif response_format == "maptiler":
+            body = {"type": "FeatureCollection", "features": [
+                {"id": f"municipality.{place_id}", "place_name": query, "center": [-8.0, 39.5], "place_type": ["municipality"], "properties": {"ref": f"osm:r{place_id}", "kind": "admin_area"}}
+                for place_id in candidates
+            ]}
+        else:
+            body = [
+                {"place_id": place_id, "osm_id": place_id, "lat": "39.5", "lon": "-8.0", "display_name": query, "class": "place", "type": "town", "importance": 0.5}
+                for place_id in candidates
+            ]
+
+        self.send_json(200, body)
+
+    def send_json(self, status_code: int, body, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,383 @@
+"""
+Benchmark suite for the indexer and geocoder hot paths, with json results and regression checks
+
+Synthetic data is generated at each size (rows x columns) and each stage of the indexing pipeline is timed:
+reading csv, xlsx and parquet files, coercing text columns (including the convert_to_float_or_nan
+fallback), the transformation statistics grid on all rows and on a preview sample, normalisation, scoring
+and the headless build_index. Geocoder throughput is measured against the local stub server with the thread
+pool and the async engine.
+
+Each result is the best time of repeat runs. The peak memory is traced (tracemalloc) in one more run, since
+tracing slows numpy and pandas down. tracemalloc sees python and numpy allocations but not arrow's, so
+parquet reads report little memory. Files are only generated up to a size where writing them is reasonable,
+larger sizes skip the read stages.
+
+Run from the repository root:
+    python -m benchmarks.suite run [-p quick|full] [-s 1000x10 100000x50 ...] [-r repeat] [-o results.json]
+    python -m benchmarks.suite compare baseline.json results.json [-t 0.1]
+"""
+import argparse
+from datetime import datetime, timezone
+from io import BytesIO
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.geocoder_rate_benchmark import create_address_file
+from benchmarks.stub_geocode_server import StubGeocodeServer
+from columnar_data import compact_columns
+from indexer import build_index, write_index
+from utils import (
+    calculate_matrix_statistics,
+    convert_to_float_or_nan,
+    create_score_matrix,
+    is_flip_required,
+    JACKKNIFE_GROUP_COUNT,
+    normalise_transformed_column,
+    POLARITY_OPTIONS,
+    PREVIEW_SAMPLE_ROW_COUNT,
+    read_arrow_file,
+    read_csv_file,
+    read_excel_sheet,
+    rescore_index,
+    sample_row_indexes,
+    STATISTICS_BLOCK_BYTES,
+    TRANSFORMATIONS
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from geocoder import Geocoder
+from geocode_providers import GeocodeMapsProvider
+
+# sizes are rows x columns, the full preset is every combination up to FULL_MAX_CELL_COUNT cells
+PRESETS = {
+    "quick": [(1_000, 10), (100_000, 10), (100_000, 50)],
+    "full": [(row_count, column_count) for row_count in [1_000, 100_000, 1_000_000, 5_000_000] for column_count in [10, 50, 500]]
+}
+DEFAULT_PRESET = "quick"
+FULL_MAX_CELL_COUNT = 250_000_000
+
+# largest files generated for the read stages, and the largest input of the scalar coercion reference
+CSV_MAX_CELL_COUNT = 50_000_000
+XLSX_MAX_CELL_COUNT = 500_000
+SCALAR_MAX_CELL_COUNT = 1_000_000
+
+NAN_FRACTION = 0.05
+# fraction of text values the vectorised coercion can't parse, e.g. "1_000" is only accepted by float()
+UNPARSABLE_FRACTION = 0.01
+SEED = 0
+
+DEFAULT_REPEAT = 3
+
+GEOCODE_ADDRESS_COUNT = 2_000
+GEOCODE_LATENCY_SECONDS = 0.02
+GEOCODE_REQUESTS_PER_SECOND = 1_000
+GEOCODE_CONCURRENCY = 64
+
+# a stage is a regression when it is this much slower (or uses this much more memory), and the difference
+# is larger than the noise floor
+DEFAULT_THRESHOLD = 0.1
+MIN_SECONDS_DIFFERENCE = 0.01
+MIN_MEMORY_MB_DIFFERENCE = 1
+
+KEY_FIELDS = ["suite", "stage", "rows", "columns"]
+
+def parse_size(text: str) -> tuple[int, int]:
+    row_count, column_count = text.lower().split("x")
+
+    return int(row_count.replace("_", "")), int(column_count.replace("_", ""))
+
+def create_data(row_count: int, column_count: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Label column followed by column_count lognormal float columns with NAN_FRACTION missing values
+    """
+
+    columns = {"label": pd.array([f"row {i}" for i in range(row_count)], dtype="str")}
+    for i in range(column_count):
+        values = rng.lognormal(size=row_count)
+        values[rng.random(row_count) < NAN_FRACTION] = np.nan
+        columns[f"column {i}"] = values
+
+    return pd.DataFrame(columns)
+
+def create_text_data(data_df: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    The float columns of data_df as text, as excel and mixed csv columns load, with some values only
+    convert_to_float_or_nan can parse
+    """
+
+    text_df = data_df.copy()
+    for column_name in data_df.columns[1:]:
+        text = data_df[column_name].round(3).astype("str")
+        text[data_df[column_name].isna()] = None
+        unparsable = rng.random(len(text)) < UNPARSABLE_FRACTION
+        text[unparsable] = "1_000"
+        text_df[column_name] = text.astype(object)
+
+    return text_df
+
+def measure(function, *args, repeat: int = DEFAULT_REPEAT, trace_memory: bool = True) -> dict:
+    """
+    Best time of repeat calls of function(*args), and the peak memory traced during one more call
+
+        Returns:
+            measurement (dict): seconds and peak_memory_mb (None when trace_memory is False)
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        seconds.append(time.perf_counter() - start)
+
+    peak_memory_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            function(*args)
+            peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    return {"seconds": min(seconds), "peak_memory_mb": peak_memory_mb}
+
+def coerce_scalar(data_df: pd.DataFrame):
+    """
+    The cell by cell coercion compact_columns replaced, as a reference
+    """
+
+    for column_name in data_df.columns[1:]:
+        data_df[column_name].map(convert_to_float_or_nan)
+
+def normalise_columns(columnar_data, transformations: list[str]) -> list[np.ndarray]:
+    return [
+        normalise_transformed_column(columnar_data.get_column(column_name), transformation)
+        for column_name, transformation in zip(columnar_data.column_names, transformations)
+    ]
+
+def score(labels: pd.Series, column_names: list[str], normalised_columns: list[np.ndarray], column_weights: np.ndarray, flip_required: np.ndarray) -> pd.DataFrame:
+    score_matrix, is_valid = create_score_matrix(normalised_columns)
+
+    return rescore_index(labels, column_names, score_matrix, is_valid, column_weights, flip_required)
+
+def run_indexer_benchmarks(row_count: int, column_count: int, repeat: int, trace_memory: bool) -> list[dict]:
+    """
+    Time every stage of the indexing pipeline on synthetic data of one size
+    """
+
+    rng = np.random.default_rng(SEED)
+    data_df = create_data(row_count, column_count, rng)
+    cell_count = row_count * column_count
+
+    stages = {}
+
+    if cell_count <= CSV_MAX_CELL_COUNT:
+        csv_bytes = data_df.to_csv(index=False).encode("utf-8")
+        stages["read csv"] = (lambda: read_csv_file(BytesIO(csv_bytes)),)
+
+    if cell_count <= XLSX_MAX_CELL_COUNT:
+        xlsx_file = BytesIO()
+        data_df.to_excel(xlsx_file, index=False)
+        stages["read xlsx"] = (lambda: read_excel_sheet(BytesIO(xlsx_file.getvalue()), "Sheet1", 1, 1),)
+
+    parquet_file = BytesIO()
+    data_df.to_parquet(parquet_file, index=False)
+    stages["read parquet"] = (read_arrow_file, parquet_file.getvalue(), "parquet")
+
+    text_df = create_text_data(data_df, rng)
+    stages["coerce text"] = (compact_columns, text_df, "float64")
+    if cell_count <= SCALAR_MAX_CELL_COUNT:
+        stages["coerce text (convert_to_float_or_nan)"] = (coerce_scalar, text_df)
+
+    stages["compact"] = (compact_columns, data_df)
+
+    columnar_data = compact_columns(data_df)[0]
+    stages["statistics"] = (calculate_matrix_statistics, columnar_data.columns, columnar_data.column_names)
+
+    sample = columnar_data.take(sample_row_indexes(row_count, PREVIEW_SAMPLE_ROW_COUNT))
+    stages["statistics (preview sample)"] = (calculate_matrix_statistics, sample.columns, sample.column_names, STATISTICS_BLOCK_BYTES, JACKKNIFE_GROUP_COUNT)
+
+    transformation_names = list(TRANSFORMATIONS.keys())
+    transformations = [transformation_names[i % len(transformation_names)] for i in range(column_count)]
+    polarities = [POLARITY_OPTIONS[i % len(POLARITY_OPTIONS)] for i in range(column_count)]
+    stages["normalise"] = (normalise_columns, columnar_data, transformations)
+
+    normalised_columns = normalise_columns(columnar_data, transformations)
+    column_names = [f"{column_name}___{transformation}" for column_name, transformation in zip(columnar_data.column_names, transformations)]
+    column_weights = rng.integers(1, 101, size=column_count).astype(float)
+    flip_required = np.array([is_flip_required(transformation, polarity) for transformation, polarity in zip(transformations, polarities)])
+    stages["score"] = (score, columnar_data.get_labels(), column_names, normalised_columns, column_weights, flip_required)
+
+    index_df = score(columnar_data.get_labels(), column_names, normalised_columns, column_weights, flip_required)
+    stages["write index parquet"] = (lambda: write_index(index_df, BytesIO(), "parquet"),)
+
+    stages["build_index"] = (build_index, data_df, {})
+
+    results = []
+    for stage, (function, *args) in stages.items():
+        measurement = measure(function, *args, repeat=repeat, trace_memory=trace_memory)
+        results.append({"suite": "indexer", "stage": stage, "rows": row_count, "columns": column_count, **measurement})
+        print_result(results[-1])
+
+    return results
+
+def geocode(server: StubGeocodeServer, address_file_path: str, method: str):
+    provider = GeocodeMapsProvider(base_url=server.base_url, requests_per_second=GEOCODE_REQUESTS_PER_SECOND, max_concurrency=GEOCODE_CONCURRENCY)
+    gc = Geocoder(providers=[provider], address_file_path=address_file_path, max_threads=GEOCODE_CONCURRENCY, use_cache=False, use_journal=False, use_local_index=False)
+
+    if method == "threads":
+        gc.geocode_addresses()
+    else:
+        gc.geocode_addresses_async(max_connections=GEOCODE_CONCURRENCY)
+
+def run_geocoder_benchmarks(address_count: int, repeat: int, trace_memory: bool) -> list[dict]:
+    """
+    Time Geocoder.geocode_addresses and geocode_addresses_async against the stub server
+    """
+
+    server = StubGeocodeServer(latency_seconds=GEOCODE_LATENCY_SECONDS, requests_per_second=GEOCODE_REQUESTS_PER_SECOND)
+    server.start()
+
+    try:
+        address_file_path = create_address_file(address_count)
+
+        results = []
+        for method in ["threads", "async"]:
+            measurement = measure(geocode, server, address_file_path, method, repeat=repeat, trace_memory=trace_memory)
+            results.append({
+                "suite": "geocoder",
+                "stage": f"geocode_addresses ({method})",
+                "rows": address_count,
+                "columns": 1,
+                **measurement,
+                "addresses_per_second": address_count / measurement["seconds"]
+            })
+            print_result(results[-1])
+    finally:
+        server.shutdown()
+
+    return results
+
+def print_result(result: dict):
+    memory = "-" if result["peak_memory_mb"] is None else f"{result['peak_memory_mb']:,.1f} MB"
+    print(f"{result['suite']:<9} {result['stage']:<40} {result['rows']:>11,} x {result['columns']:<5,} {result['seconds']:>10,.4f} s {memory:>13}", flush=True)
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def get_metadata(repeat: int) -> dict:
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat
+    }
+
+def compare_results(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> pd.DataFrame:
+    """
+    Join two result files on suite, stage and size and flag the stages that got slower or use more memory
+
+        Parameters:
+            baseline (dict), current (dict): contents of result files written by the run command
+            threshold (float): fractional increase flagged as a regression
+
+        Returns:
+            comparison_df (pd.DataFrame): one row per stage in both files, with the time and memory ratios
+                                          and a regression column
+    """
+
+    columns = KEY_FIELDS + ["seconds", "peak_memory_mb"]
+    baseline_df = pd.DataFrame(baseline["results"]).reindex(columns=columns)
+    current_df = pd.DataFrame(current["results"]).reindex(columns=columns)
+
+    comparison_df = baseline_df.merge(current_df, on=KEY_FIELDS, suffixes=("_baseline", "_current"))
+    comparison_df["seconds_ratio"] = comparison_df["seconds_current"] / comparison_df["seconds_baseline"]
+    comparison_df["memory_ratio"] = comparison_df["peak_memory_mb_current"] / comparison_df["peak_memory_mb_baseline"]
+
+    is_slower = (comparison_df["seconds_ratio"] > 1 + threshold) & (comparison_df["seconds_current"] - comparison_df["seconds_baseline"] > MIN_SECONDS_DIFFERENCE)
+    is_larger = (comparison_df["memory_ratio"] > 1 + threshold) & (comparison_df["peak_memory_mb_current"] - comparison_df["peak_memory_mb_baseline"] > MIN_MEMORY_MB_DIFFERENCE)
+    comparison_df["regression"] = np.select([is_slower & is_larger, is_slower, is_larger], ["time, memory", "time", "memory"], "")
+
+    return comparison_df
+
+def process_args(args: list) -> argparse.Namespace:
+    """
+    Process the command line arguments used to call the module
+
+        Parameters:
+            args (list): command line arguments, without the program name
+
+        Returns:
+            args (argparse.Namespace)
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the indexer and geocoder hot paths.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write the results as json")
+    run_parser.add_argument("-p", "--preset", choices=PRESETS.keys(), default=DEFAULT_PRESET, help="sizes to run when --sizes isn't given")
+    run_parser.add_argument("-s", "--sizes", nargs="+", type=parse_size, default=None, help="sizes as rows x columns, e.g. 100000x50")
+    run_parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs of each stage, the best is kept")
+    run_parser.add_argument("-o", "--output", dest="output_path", default=None, help="results json file, defaults to benchmark_results_<time>.json")
+    run_parser.add_argument("-a", "--addresses", dest="address_count", type=int, default=GEOCODE_ADDRESS_COUNT, help="addresses geocoded, 0 skips the geocoder")
+    run_parser.add_argument("--no-memory", dest="trace_memory", action="store_false", help="don't trace peak memory")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two results files and flag regressions")
+    compare_parser.add_argument("baseline_path")
+    compare_parser.add_argument("current_path")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD, help="fractional slow down or memory increase flagged")
+
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+    args = process_args(sys.argv[1:])
+
+    if args.command == "run":
+        sizes = args.sizes
+        if sizes is None:
+            sizes = [size for size in PRESETS[args.preset] if size[0] * size[1] <= FULL_MAX_CELL_COUNT]
+
+        results = []
+        for row_count, column_count in sizes:
+            results.extend(run_indexer_benchmarks(row_count, column_count, args.repeat, args.trace_memory))
+
+        if args.address_count > 0:
+            results.extend(run_geocoder_benchmarks(args.address_count, args.repeat, args.trace_memory))
+
+        output_path = args.output_path
+        if output_path is None:
+            output_path = f"benchmark_results_{datetime.now():%Y%m%d_%H%M%S}.json"
+
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump({"metadata": get_metadata(args.repeat), "results": results}, f, indent=2)
+
+        print(f"\n{len(results):,} results written to {output_path}")
+    else:
+        with open(args.baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        with open(args.current_path, "r", encoding="utf-8") as f:
+            current = json.load(f)
+
+        comparison_df = compare_results(baseline, current, args.threshold)
+        print(comparison_df.to_string(index=False, float_format="{:,.3f}".format))
+
+        regression_count = int((comparison_df["regression"] != "").sum())
+        print(f"\n{regression_count:,} regression(s) of {len(comparison_df):,} stage(s), threshold {args.threshold:.0%}")
+
+        if regression_count > 0:
+            sys.exit(1)
@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+
+from parallel_columns import ColumnExecutor
+from utils import get_coercion_row
+
+# float dtypes values can be stored as, None picks float32 when every usable column fits it exactly
+FLOAT_DTYPES = {
+    "float64": np.float64,
+    "float32": np.float32
+}
+
+class ColumnarData:
+    """
+    The label column and usable numeric columns of loaded data, stored compactly for the Visual Indexer
+
+    Labels are stored once as a categorical and each numeric column as a contiguous array, either a float64
+    column of the loaded data (not copied) or a column of a single column-major matrix holding the columns
+    that had to be coerced or converted, so data frames for display and scoring are built without copying
+    the values.
+
+    Instances are shared through the stage cache and must not be modified.
+    """
+
+    def __init__(self, labels: pd.Categorical, label_name: str, columns: list[np.ndarray], column_names: list[str]):
+        self.labels = labels
+        self.label_name = label_name
+        self.columns = list(columns)
+        self.column_names = list(column_names)
+        self.column_indexes = {column_name: i for i, column_name in enumerate(self.column_names)}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.columns[0].dtype if self.columns != [] else np.dtype(np.float64)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the labels and of every array the columns keep alive, e.g. the whole block of loaded data a
+        float64 column views
+        """
+
+        owners = {id(owner): owner for owner in map(get_owner, self.columns)}
+
+        return int(self.labels.nbytes + sum(owner.nbytes for owner in owners.values()))
+
+    def get_labels(self) -> pd.Series:
+        """
+        Return the label column as a categorical series sharing the stored codes
+        """
+
+        return pd.Series(self.labels, name=self.label_name, copy=False)
+
+    def get_values(self, column_name: str) -> np.ndarray:
+        return self.columns[self.column_indexes[column_name]]
+
+    def get_column(self, column_name: str) -> pd.Series:
+        """
+        Return a numeric column as a series viewing the stored column
+        """
+
+        return pd.Series(self.get_values(column_name), name=column_name, copy=False)
+
+    def head(self, row_count: int) -> "ColumnarData":
+        """
+        Return the first row_count rows, viewing the stored labels and columns
+        """
+
+        return ColumnarData(self.labels[:row_count], self.label_name, [column[:row_count] for column in self.columns], self.column_names)
+
+    def take(self, row_indexes: np.ndarray) -> "ColumnarData":
+        """
+        Return a copy of the rows at row_indexes in a single matrix, e.g. a sample from utils.sample_row_indexes
+        """
+
+        values = np.empty((len(row_indexes), len(self.columns)), dtype=self.dtype, order="F")
+        for i, column in enumerate(self.columns):
+            values[:, i] = column.take(row_indexes)
+
+        return ColumnarData(self.labels.take(row_indexes), self.label_name, list(values.T), self.column_names)
+
+    def to_data_frame(self) -> pd.DataFrame:
+        """
+        Return the label column followed by the numeric columns, the values are not copied
+        """
+
+        data_df = pd.DataFrame(dict(zip(self.column_names, self.columns)), columns=self.column_names, copy=False)
+        data_df.insert(0, self.label_name, self.get_labels())
+
+        return data_df
+
+    def get_memory_report(self) -> pd.DataFrame:
+        """
+        Return the dtype, shape and size of the labels and of the arrays holding the columns
+        """
+
+        rows = [
+            {"part": "labels (codes)", "dtype": str(self.labels.codes.dtype), "shape": f"{len(self):,}", "size (MB)": self.labels.codes.nbytes / 1024 / 1024},
+            {"part": "labels (categories)", "dtype": str(self.labels.categories.dtype), "shape": f"{len(self.labels.categories):,}", "size (MB)": (self.labels.nbytes - self.labels.codes.nbytes) / 1024 / 1024}
+        ]
+
+        owners = {}
+        for column in self.columns:
+            owner = get_owner(column)
+            owners.setdefault(id(owner), (owner, []))[1].append(column)
+
+        for owner, columns in owners.values():
+            # a block of loaded data can hold columns that aren't used
+            owner_column_count = owner.size // max(1, len(self))
+            rows.append({"part": f"values ({len(columns):,} of {owner_column_count:,} columns used)", "dtype": str(owner.dtype), "shape": f"{len(self):,} x {owner_column_count:,}", "size (MB)": owner.nbytes / 1024 / 1024})
+
+        return pd.DataFrame(rows, columns=["part", "dtype", "shape", "size (MB)"])
+
+def get_owner(array: np.ndarray) -> np.ndarray:
+    """
+    Return the array that owns the memory array views
+    """
+
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+
+    return array
+
+def is_float32_exact(values: np.ndarray) -> bool:
+    """
+    True if every value of a float64 column survives a round trip through float32
+    """
+
+    with np.errstate(over="ignore"):
+        return bool(np.array_equal(values.astype(np.float32), values, equal_nan=True))
+
+def compact_columns(data_df: pd.DataFrame, float_dtype: str = None, executor: ColumnExecutor = None, on_progress=None) -> tuple[ColumnarData, list[str], list[str], pd.DataFrame]:
+    """
+    Coerce every column after the first (label) column to float, keeping only the label column and the
+    usable columns
+
+    float64 columns need no coercion and are kept without copying when float64 is kept. The other columns are
+    coerced straight into their column of a float64 matrix, the usable ones are then copied out (converted to
+    float_dtype) unless every one of them is usable and float64 is kept.
+
+        Parameters:
+            data_df (pd.DataFrame): loaded data, not modified
+            float_dtype (str): key of FLOAT_DTYPES, None stores float32 only when no value changes
+            executor (ColumnExecutor): coerces columns in parallel on large data, None coerces them serially
+            on_progress (function): called with (completed column count, column count), see ColumnExecutor.run
+
+        Returns:
+            columnar_data (ColumnarData): label column and usable columns
+            usable_columns (list[str]): columns with enough NON-na values
+            unusable_columns (list[str])
+            coercion_df (pd.DataFrame): per column counts of missing values, parse failures and valid values
+    """
+
+    if executor is None:
+        executor = ColumnExecutor(max_workers=1)
+
+    row_count = data_df.shape[0]
+    coerced_columns = [column_name for column_name in data_df.columns[1:] if data_df[column_name].dtype != np.float64]
+    coerced_indexes = {column_name: j for j, column_name in enumerate(coerced_columns)}
+
+    matrix, parse_failure_counts = executor.coerce_columns([data_df[column_name] for column_name in coerced_columns], on_progress)
+
+    coercion_rows = []
+    usable_columns = []
+    usable_values = []
+    float32_exact = True
+    values = None
+    for column_name in data_df.columns[1:]:
+        if column_name in coerced_indexes:
+            j = coerced_indexes[column_name]
+            values, parse_failure_count = matrix[:, j], parse_failure_counts[j]
+        else:
+            values, parse_failure_count = data_df[column_name].to_numpy(), 0
+
+        coercion_row = get_coercion_row(data_df[column_name], pd.Series(values, copy=False), parse_failure_count, row_count)
+        coercion_rows.append(coercion_row)
+
+        if coercion_row["usable"]:
+            if float_dtype is None and float32_exact:
+                float32_exact = is_float32_exact(values)
+
+            usable_columns.append(column_name)
+            usable_values.append(values)
+
+    if float_dtype is None:
+        float_dtype = "float32" if float32_exact else "float64"
+
+    # copy out the columns that aren't kept as they are, so the space of the unusable columns is given back,
+    # a view would keep the whole matrix (and its shared memory block) alive
+    keep_float64 = FLOAT_DTYPES[float_dtype] == np.float64
+    keep_matrix = keep_float64 and (len(coerced_columns) == sum(column_name in coerced_indexes for column_name in usable_columns))
+    copied_indexes = [
+        i for i, column_name in enumerate(usable_columns)
+        if not (keep_matrix if column_name in coerced_indexes else keep_float64)
+    ]
+
+    columns = list(usable_values)
+    # in shared memory when the statistics of every row will be calculated in parallel
+    copied_values = executor.empty((row_count, len(copied_indexes)), FLOAT_DTYPES[float_dtype], "statistics")
+    for k, i in enumerate(copied_indexes):
+        copied_values[:, k] = usable_values[i]
+        columns[i] = copied_values[:, k]
+
+    del matrix, usable_values, values
+
+    labels = pd.Categorical(data_df.iloc[:, 0])
+    columnar_data = ColumnarData(labels, data_df.columns[0], columns, usable_columns)
+
+    coercion_df = pd.DataFrame(coercion_rows, columns=["column", "dtype", "missing", "parse_failures", "valid", "valid_fraction", "usable"])
+    unusable_columns = list(coercion_df.loc[~coercion_df["usable"], "column"])
+
+    return columnar_data, usable_columns, unusable_columns, coercion_df
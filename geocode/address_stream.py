@@ -0,0 +1,64 @@
+import numpy as np
+
+import pandas as pd
+
+class UniqueHashSet:
+    '''
+    Compact set of 64 bit hashes held in a sorted numpy array, 8 bytes per entry instead of the ~100 bytes
+    of a python set of strings, used to de-duplicate very large address files
+
+    Two different addresses collide with probability ~n^2 / 2^65 (about 3 in a million for 10 million
+    addresses), a collision drops the second address.
+    '''
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        '''
+        Add hashes to the set, returns a mask of the hashes that weren't already in it (only the first of any
+        repeats within hashes is marked as new)
+
+        args:
+            hashes (np.ndarray): uint64 hashes
+        '''
+
+        is_new = np.zeros(len(hashes), dtype=bool)
+
+        # first occurrence of each hash in this batch
+        unique_hashes, first_indices = np.unique(hashes, return_index=True)
+
+        # drop the hashes already in the set
+        positions = np.searchsorted(self.hashes, unique_hashes)
+        is_seen = np.zeros(len(unique_hashes), dtype=bool)
+        in_range = positions < len(self.hashes)
+        is_seen[in_range] = self.hashes[positions[in_range]] == unique_hashes[in_range]
+
+        is_new[first_indices[~is_seen]] = True
+
+        new_hashes = unique_hashes[~is_seen]
+        if len(new_hashes) > 0:
+            self.hashes = np.insert(self.hashes, np.searchsorted(self.hashes, new_hashes), new_hashes)
+
+        return is_new
+
+def iter_unique_addresses(file_path: str, column_name: str, chunk_rows: int):
+    '''
+    Yield the unique addresses of a csv file in file order, reading chunk_rows rows of the address column at
+    a time so memory use doesn't grow with the size of the file
+
+    args:
+        file_path (str): path to address data file
+        column_name (str): name of column containing data
+        chunk_rows (int): rows read at a time
+    '''
+
+    unique_hashes = UniqueHashSet()
+    for chunk_df in pd.read_csv(file_path, usecols=[column_name], dtype={column_name: str}, chunksize=chunk_rows):
+        addresses = chunk_df[column_name].dropna()
+        is_new = unique_hashes.add_new(pd.util.hash_pandas_object(addresses, index=False).to_numpy())
+
+        yield from addresses[is_new]
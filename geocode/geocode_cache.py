@@ -0,0 +1,156 @@
+import json
+import sqlite3
+import threading
+import time
+
+class GeocodeCache:
+    '''
+    Persistent geocode result cache stored in a SQLite file
+
+    Results are keyed on the service provider and the cleaned address (unidecode, lower case, location hint
+    added) so repeated runs only send new addresses to the remote API. Empty results are cached too
+    (negative caching) with a shorter time to live. Once the cache holds more than max_entries results the
+    least recently used are removed.
+    '''
+
+    DEFAULT_TTL_SECONDS = 90 * 24 * 60 * 60
+    DEFAULT_NEGATIVE_TTL_SECONDS = 24 * 60 * 60
+    DEFAULT_MAX_ENTRIES = 1_000_000
+
+    def __init__(self, file_path: str, ttl_seconds: int = None, negative_ttl_seconds: int = None, max_entries: int = None):
+        self.file_path = file_path
+
+        if ttl_seconds is None:
+            self.ttl_seconds = self.DEFAULT_TTL_SECONDS
+        else:
+            self.ttl_seconds = ttl_seconds
+
+        if negative_ttl_seconds is None:
+            self.negative_ttl_seconds = self.DEFAULT_NEGATIVE_TTL_SECONDS
+        else:
+            self.negative_ttl_seconds = negative_ttl_seconds
+
+        if max_entries is None:
+            self.max_entries = self.DEFAULT_MAX_ENTRIES
+        else:
+            self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # one connection shared by the worker threads, access is serialised by self.lock
+        self.connection = sqlite3.connect(self.file_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS results (
+                provider TEXT NOT NULL,
+                address TEXT NOT NULL,
+                result TEXT NOT NULL,
+                is_negative INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (provider, address)
+            )
+            '''
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self.connection.commit()
+
+        self.entry_count = self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get(self, provider: str, address: str) -> list[dict]:
+        '''
+        Return the cached result for an address, or None if it isn't cached or has expired
+
+        args:
+            provider (str): service provider name
+            address (str): cleaned address text
+        '''
+
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT result, is_negative, created FROM results WHERE provider = ? AND address = ?',
+                (provider, address)
+            ).fetchone()
+
+            if row is not None:
+                result, is_negative, created = row
+                ttl_seconds = self.negative_ttl_seconds if is_negative else self.ttl_seconds
+                if now - created <= ttl_seconds:
+                    self.connection.execute(
+                        'UPDATE results SET last_used = ? WHERE provider = ? AND address = ?',
+                        (now, provider, address)
+                    )
+                    self.connection.commit()
+                    self.hits += 1
+                    return json.loads(result)
+
+            self.misses += 1
+
+        return None
+
+    def put(self, provider: str, address: str, result: list[dict]):
+        '''
+        Store the result for an address, an empty result is stored as a negative entry
+
+        args:
+            provider (str): service provider name
+            address (str): cleaned address text
+            result (list[dict]): geocoded candidates for the address
+        '''
+
+        now = time.time()
+        with self.lock:
+            is_new = self.connection.execute(
+                'SELECT 1 FROM results WHERE provider = ? AND address = ?',
+                (provider, address)
+            ).fetchone() is None
+
+            self.connection.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (provider, address, json.dumps(result), int(len(result) == 0), now, now)
+            )
+            self.entry_count += is_new
+            if self.entry_count > self.max_entries:
+                self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        '''
+        Remove the least recently used entries above max_entries, the caller must hold self.lock
+        '''
+
+        cursor = self.connection.execute(
+            'DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY last_used LIMIT ?)',
+            (self.entry_count - self.max_entries,)
+        )
+        self.entry_count -= cursor.rowcount
+
+    def remove_expired(self) -> int:
+        '''
+        Delete expired entries and return the number removed
+        '''
+
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                'DELETE FROM results WHERE (is_negative = 0 AND created < ?) OR (is_negative = 1 AND created < ?)',
+                (now - self.ttl_seconds, now - self.negative_ttl_seconds)
+            )
+            self.entry_count -= cursor.rowcount
+            self.connection.commit()
+
+        return cursor.rowcount
+
+    def get_hit_ratio(self) -> float:
+        lookup_count = self.hits + self.misses
+
+        return self.hits / lookup_count if lookup_count > 0 else 0.0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,245 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from geocoder import Geocoder
+
+class GeocodeJob:
+    '''
+    A list of addresses geocoded in the background by a GeocodeJobRunner
+
+    Progress counts and result rows are updated by the runner's worker threads as lookups finish, so
+    progress and partial results can be read while the job runs.
+    '''
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    CANCELLED = 'cancelled'
+    FINISHED = 'finished'
+
+    def __init__(self, addresses: list[str], location_hint: str = None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.addresses = addresses
+
+        if location_hint is None:
+            self.location_hint = ''
+        else:
+            self.location_hint = f', {location_hint}'
+
+        self.status = self.QUEUED
+        self.created_time = time.time()
+        self.start_time = None
+        self.end_time = None
+
+        self.completed_count = 0
+        self.found_count = 0
+        self.error_count = 0
+        self.rows = []
+
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def is_done(self) -> bool:
+        return self.status in [self.CANCELLED, self.FINISHED]
+
+    def cancel(self):
+        '''
+        Stop submitting lookups, those already in flight still finish and are kept
+        '''
+
+        self.cancel_event.set()
+
+    def add_result(self, rows: list[dict]):
+        '''
+        Record a finished lookup, rows is None if the lookup failed (every provider was throttled or
+        unreachable) or raised an exception
+        '''
+
+        with self.lock:
+            self.completed_count += 1
+            if rows is None:
+                self.error_count += 1
+            elif rows != []:
+                self.found_count += 1
+                self.rows.extend(rows)
+
+    def get_progress(self) -> dict:
+        '''
+        Return the status, counts, addresses per second and estimated seconds left
+        '''
+
+        with self.lock:
+            completed_count = self.completed_count
+            found_count = self.found_count
+            error_count = self.error_count
+
+        if self.start_time is None:
+            elapsed_seconds = 0
+        else:
+            elapsed_seconds = (self.end_time or time.time()) - self.start_time
+
+        addresses_per_second = completed_count / elapsed_seconds if elapsed_seconds > 0 else 0
+        remaining_count = len(self.addresses) - completed_count
+        if self.is_done:
+            eta_seconds = 0
+        elif addresses_per_second > 0:
+            eta_seconds = remaining_count / addresses_per_second
+        else:
+            eta_seconds = None
+
+        return {
+            'status': self.status,
+            'total': len(self.addresses),
+            'completed': completed_count,
+            'found': found_count,
+            'errors': error_count,
+            'elapsed_seconds': elapsed_seconds,
+            'addresses_per_second': addresses_per_second,
+            'eta_seconds': eta_seconds
+        }
+
+    def get_results_df(self) -> pd.DataFrame:
+        '''
+        Return the result rows so far
+        '''
+
+        with self.lock:
+            rows = list(self.rows)
+
+        return pd.DataFrame(rows, columns=Geocoder.RESULT_COLUMNS)
+
+class GeocodeJobRunner:
+    '''
+    Runs geocoding jobs in the background on one thread pool shared by every job
+
+    Lookups go through a single Geocoder, so every job shares its providers' rate limiters, cache and local
+    index, and the number of threads doesn't grow with the number of jobs. Each job has a dispatcher thread
+    that keeps at most max_in_flight_per_job of its lookups queued on the pool, so concurrent jobs take turns
+    rather than running one after the other.
+    '''
+
+    # finished jobs kept for their results, the oldest are dropped first
+    MAX_DONE_JOBS = 32
+
+    # window of the requests per second measurement
+    RATE_WINDOW_SECONDS = 10
+
+    def __init__(self, geocoder: Geocoder, max_threads: int = None, max_in_flight_per_job: int = None):
+        self.geocoder = geocoder
+
+        if max_threads is None:
+            self.max_threads = self.geocoder.max_threads
+        else:
+            self.max_threads = max_threads
+
+        if max_in_flight_per_job is None:
+            self.max_in_flight_per_job = self.max_threads
+        else:
+            self.max_in_flight_per_job = max_in_flight_per_job
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix='geocode')
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+        # (time, requests sent by every provider) samples
+        self.request_samples = deque()
+
+    def submit(self, addresses: list[str], location_hint: str = None) -> GeocodeJob:
+        '''
+        Start geocoding addresses in the background and return the job
+
+        args:
+            addresses (list[str]): address texts, repeats are geocoded once
+            location_hint (str): location hint added to every address of the job
+        '''
+
+        job = GeocodeJob(list(dict.fromkeys(addresses)), location_hint)
+
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self.remove_done_jobs_locked()
+
+        threading.Thread(target=self.dispatch, args=(job,), name=f'geocode-job-{job.job_id}', daemon=True).start()
+
+        return job
+
+    def get_job(self, job_id: str) -> GeocodeJob:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def remove_done_jobs_locked(self):
+        done_jobs = sorted((job for job in self.jobs.values() if job.is_done), key=lambda job: job.end_time)
+        for job in done_jobs[:max(0, len(done_jobs) - self.MAX_DONE_JOBS)]:
+            del self.jobs[job.job_id]
+
+    def geocode(self, job: GeocodeJob, address: str) -> list[dict]:
+        '''
+        Geocode one address of a job, returns the result rows or None if the lookup failed
+        '''
+
+        address_clean = self.geocoder.clean_address(f'{address}{job.location_hint}')
+        result = self.geocoder.geocode_address(address_clean)
+
+        # record_result turns a failed lookup into no rows, keep it None so the job counts it as an error
+        if result is None:
+            return None
+
+        return self.geocoder.record_result(address, address_clean, result)
+
+    def dispatch(self, job: GeocodeJob):
+        '''
+        Submit the job's lookups to the shared pool, at most max_in_flight_per_job at a time, and wait for them
+        '''
+
+        in_flight = threading.BoundedSemaphore(self.max_in_flight_per_job)
+
+        def on_done(future):
+            job.add_result(future.result() if future.exception() is None else None)
+            in_flight.release()
+
+        job.start_time = time.time()
+        job.status = GeocodeJob.RUNNING
+
+        for address in job.addresses:
+            in_flight.acquire()
+            if job.cancel_event.is_set():
+                in_flight.release()
+                break
+
+            self.executor.submit(self.geocode, job, address).add_done_callback(on_done)
+
+        # every permit back means every lookup has finished
+        for _ in range(self.max_in_flight_per_job):
+            in_flight.acquire()
+
+        job.end_time = time.time()
+        job.status = GeocodeJob.CANCELLED if job.cancel_event.is_set() else GeocodeJob.FINISHED
+
+    def get_requests_per_second(self) -> float:
+        '''
+        Requests sent to the providers per second by every job, over the last RATE_WINDOW_SECONDS
+        '''
+
+        now = time.time()
+        request_count = sum(provider.rate_limiter.request_count for provider in self.geocoder.providers)
+
+        with self.lock:
+            self.request_samples.append((now, request_count))
+            while (len(self.request_samples) > 2) and (self.request_samples[1][0] < now - self.RATE_WINDOW_SECONDS):
+                self.request_samples.popleft()
+
+            start_time, start_count = self.request_samples[0]
+
+        if now - start_time <= 0:
+            return 0
+
+        return (request_count - start_count) / (now - start_time)
+
+    def get_active_job_count(self) -> int:
+        with self.lock:
+            return sum(not job.is_done for job in self.jobs.values())
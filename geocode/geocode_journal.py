@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+class GeocodeJournal:
+    '''
+    Append only journal of completed geocoding lookups
+
+    Each completed address is written as a json line holding the cleaned address and its result rows.
+    Lines are flushed to disk every save_count addresses, so a crashed run loses at most save_count
+    lookups and can be resumed by skipping the addresses already in the journal.
+    '''
+
+    DEFAULT_EXPORT_CHUNK_ROWS = 100_000
+
+    def __init__(self, file_path: str, save_count: int, columns: list[str]):
+        self.file_path = file_path
+        self.save_count = save_count
+        self.columns = columns
+
+        self.file = None
+        self.pending_count = 0
+        self.record_count = 0
+        self.lock = threading.Lock()
+
+    def open(self, resume: bool = False) -> set[str]:
+        '''
+        Open the journal for writing, returns the cleaned addresses already completed when resuming
+
+        args:
+            resume (bool): keep the existing journal, otherwise it is cleared
+        '''
+
+        completed = set()
+        if resume and os.path.exists(self.file_path):
+            for address, _ in self.read_records():
+                completed.add(address)
+
+            # a crash can leave a partly written last line, start the next record on a new line
+            with open(self.file_path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b'\n'
+                else:
+                    needs_newline = False
+
+            self.file = open(self.file_path, 'a', encoding='utf-8')
+            if needs_newline:
+                self.file.write('\n')
+        else:
+            self.file = open(self.file_path, 'w', encoding='utf-8')
+
+        self.pending_count = 0
+        self.record_count = len(completed)
+
+        return completed
+
+    def record(self, address: str, rows: list[dict]):
+        '''
+        Append the result rows of a completed address, flushing to disk every save_count records
+
+        args:
+            address (str): cleaned address text
+            rows (list[dict]): result rows of the address
+        '''
+
+        line = json.dumps({'address': address, 'rows': rows}) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.pending_count += 1
+            self.record_count += 1
+            if self.pending_count >= self.save_count:
+                self.flush_locked()
+
+    def flush_locked(self):
+        '''
+        Write buffered records to disk, the caller must hold self.lock
+        '''
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending_count = 0
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.flush_locked()
+                self.file.close()
+                self.file = None
+
+    def read_records(self):
+        '''
+        Yield (cleaned address, result rows) for every complete line in the journal
+        '''
+
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # partly written line from a crashed run
+                    continue
+
+                yield record['address'], record['rows']
+
+    def read_data_frame_chunks(self, chunk_rows: int = None):
+        '''
+        Yield the journal's result rows as data frames of about chunk_rows rows
+
+        args:
+            chunk_rows (int): rows per data frame
+        '''
+
+        if chunk_rows is None:
+            chunk_rows = self.DEFAULT_EXPORT_CHUNK_ROWS
+
+        rows = []
+        chunk_count = 0
+        for _, address_rows in self.read_records():
+            rows.extend(address_rows)
+            if len(rows) >= chunk_rows:
+                yield pd.DataFrame(rows, columns=self.columns)
+                rows = []
+                chunk_count += 1
+
+        # always yield at least one (possibly empty) data frame
+        if (rows != []) or (chunk_count == 0):
+            yield pd.DataFrame(rows, columns=self.columns)
+
+    def read_data_frame(self) -> pd.DataFrame:
+        return pd.concat(list(self.read_data_frame_chunks()), ignore_index=True)
+
+    def export_csv(self, file_path: str, chunk_rows: int = None):
+        '''
+        Write the journal's result rows to a csv file a chunk at a time, so memory use doesn't grow with
+        the number of addresses
+
+        args:
+            file_path (str): path of saved file
+            chunk_rows (int): rows held in memory at once
+        '''
+
+        for i, chunk_df in enumerate(self.read_data_frame_chunks(chunk_rows)):
+            chunk_df.to_csv(file_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
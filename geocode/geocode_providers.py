@@ -0,0 +1,373 @@
+from abc import ABC, abstractmethod
+import asyncio
+from enum import auto, Enum
+import math
+import os
+import threading
+from urllib.parse import quote
+
+import aiohttp
+
+import requests
+
+from rate_limiter import RateLimiter
+
+class ServiceProvider(Enum):
+    GEOCODEMAPS = auto()
+    POSITIONSTACK = auto()
+    MAPTILER = auto()
+
+class Provider(ABC):
+    '''
+    Base class of the geocoding service providers
+
+    A provider builds request urls and converts responses to result rows (see RESULT_COLUMNS). Each provider
+    has its own rate limiter and a limit on the number of requests in flight, so the quotas of several
+    providers add up when work is spread across them. Subclasses set the class constants and implement
+    build_url and parse_results.
+    '''
+
+    # importance is the provider's own score of the result, higher is better
+    RESULT_COLUMNS = ['address', 'place_id', 'osm_id', 'lat', 'long', 'display_name', 'class', 'type', 'importance']
+
+    SERVICE_PROVIDER = None
+    BASE_URL = None
+    # environment variable holding the api key
+    API_KEY_ENVIRONMENT_VARIABLE = None
+
+    # allowed requests per second
+    DEFAULT_REQUESTS_PER_SECOND = 1
+
+    # the rate limiter sets the throughput, the requests in flight only need to cover the latency at that rate
+    MIN_CONCURRENCY = 2
+    EXPECTED_MAX_LATENCY_SECONDS = 2
+
+    MAX_RETRIES = 5
+    REQUEST_TIMEOUT_SECONDS = 30
+
+    # a missing or invalid api key, or a used up plan, fails every request rather than missing the address
+    FAILURE_STATUS_CODES = (401, 402, 403)
+
+    def __init__(self, base_url: str = None, api_key: str = None, requests_per_second: float = None, max_concurrency: int = None):
+        if base_url is None:
+            self.base_url = self.BASE_URL
+        else:
+            self.base_url = base_url
+
+        if (api_key is None) and (self.API_KEY_ENVIRONMENT_VARIABLE is not None):
+            self.api_key = os.environ.get(self.API_KEY_ENVIRONMENT_VARIABLE, '')
+        else:
+            self.api_key = api_key
+
+        if requests_per_second is None:
+            self.requests_per_second = self.DEFAULT_REQUESTS_PER_SECOND
+        else:
+            self.requests_per_second = requests_per_second
+
+        if max_concurrency is None:
+            self.max_concurrency = max(self.MIN_CONCURRENCY, math.ceil(self.requests_per_second * self.EXPECTED_MAX_LATENCY_SECONDS))
+        else:
+            self.max_concurrency = max_concurrency
+
+        self.rate_limiter = RateLimiter(self.requests_per_second)
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.async_semaphore = None
+        self.thread_local = threading.local()
+
+        # requests waiting for or holding the rate limiter, used to spread work across providers
+        self.queued_count = 0
+        self.queued_count_lock = threading.Lock()
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.failure_count = 0
+
+    @property
+    def name(self) -> str:
+        return self.SERVICE_PROVIDER.name
+
+    @abstractmethod
+    def build_url(self, address: str) -> str:
+        pass
+
+    @abstractmethod
+    def parse_results(self, address: str, json_data) -> list[dict]:
+        '''
+        Convert the json data of a 200 response to result rows, returns None if it isn't a list of results
+        (e.g. an error message) so the lookup fails instead of being cached as a miss
+        '''
+
+        pass
+
+    def get_session(self) -> requests.Session:
+        '''
+        Return the calling thread's session, sessions keep connections to the provider alive between requests
+        '''
+
+        if not hasattr(self.thread_local, 'session'):
+            self.thread_local.session = requests.Session()
+
+        return self.thread_local.session
+
+    def send_request(self, url: str, max_wait_seconds: float = None) -> requests.Response:
+        '''
+        Send a rate limited request, retrying with back off when the provider throttles (429) or fails (5xx)
+
+        Returns the response, or None if every attempt was throttled or failed
+
+        args:
+            url (str): request url
+            max_wait_seconds (float): give up rather than wait longer than this for the rate limiter
+        '''
+
+        for _ in range(self.MAX_RETRIES + 1):
+            if not self.rate_limiter.acquire(max_wait_seconds):
+                return None
+
+            try:
+                response = self.get_session().get(url, timeout=self.REQUEST_TIMEOUT_SECONDS)
+            except requests.RequestException:
+                self.rate_limiter.on_throttled()
+                continue
+
+            if (response.status_code == 429) or (response.status_code >= 500):
+                self.rate_limiter.on_throttled(response.headers.get('Retry-After'))
+                continue
+
+            self.rate_limiter.on_success()
+            return response
+
+        return None
+
+    async def send_request_async(self, session: aiohttp.ClientSession, url: str, max_wait_seconds: float = None) -> tuple[int, object]:
+        '''
+        Async version of send_request, returns the status code and json data of the response (None unless a
+        200 response has a json body), or (None, None) if every attempt was throttled or failed
+
+        args:
+            session (aiohttp.ClientSession): session holding the connection pool
+            url (str): request url
+            max_wait_seconds (float): give up rather than wait longer than this for the rate limiter
+        '''
+
+        for _ in range(self.MAX_RETRIES + 1):
+            if not await self.rate_limiter.acquire_async(max_wait_seconds):
+                return None, None
+
+            try:
+                async with session.get(url) as response:
+                    if (response.status == 429) or (response.status >= 500):
+                        self.rate_limiter.on_throttled(response.headers.get('Retry-After'))
+                        continue
+
+                    self.rate_limiter.on_success()
+                    if response.status != 200:
+                        return response.status, None
+
+                    try:
+                        return response.status, await response.json(content_type=None)
+                    except ValueError:
+                        # e.g. an html or empty body from a proxy, handled like a non-200 response
+                        return response.status, None
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.rate_limiter.on_throttled()
+
+        return None, None
+
+    def count_result(self, result: list[dict]) -> list[dict]:
+        if result is None:
+            self.failure_count += 1
+        elif result == []:
+            self.miss_count += 1
+        else:
+            self.hit_count += 1
+
+        return result
+
+    def geocode(self, address: str, max_wait_seconds: float = None) -> list[dict]:
+        '''
+        Geocode a cleaned address, returns the result rows ([] if nothing was found) or None if the provider
+        couldn't be reached or rejected the request (see FAILURE_STATUS_CODES and parse_results)
+
+        args:
+            address (str): cleaned address text
+            max_wait_seconds (float): give up rather than wait longer than this for the rate limiter
+        '''
+
+        self.update_queued_count(1)
+        try:
+            with self.semaphore:
+                response = self.send_request(self.build_url(address), max_wait_seconds)
+        finally:
+            self.update_queued_count(-1)
+
+        json_data = None
+        if (response is not None) and (response.status_code == 200):
+            try:
+                json_data = response.json()
+            except ValueError:
+                # e.g. an html or empty body from a proxy, handled like a non-200 response
+                json_data = None
+
+        if (response is None) or (response.status_code in self.FAILURE_STATUS_CODES):
+            result = None
+        elif json_data is None:
+            result = []
+        else:
+            result = self.parse_results(address, json_data)
+
+        return self.count_result(result)
+
+    async def geocode_async(self, session: aiohttp.ClientSession, address: str, max_wait_seconds: float = None) -> list[dict]:
+        '''
+        Async version of geocode
+
+        args:
+            session (aiohttp.ClientSession): session holding the connection pool
+            address (str): cleaned address text
+            max_wait_seconds (float): give up rather than wait longer than this for the rate limiter
+        '''
+
+        # semaphores belong to an event loop, create it on first use in the running loop
+        if self.async_semaphore is None:
+            self.async_semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.update_queued_count(1)
+        try:
+            async with self.async_semaphore:
+                status_code, json_data = await self.send_request_async(session, self.build_url(address), max_wait_seconds)
+        finally:
+            self.update_queued_count(-1)
+
+        if (status_code is None) or (status_code in self.FAILURE_STATUS_CODES):
+            result = None
+        elif (status_code != 200) or (json_data is None):
+            result = []
+        else:
+            result = self.parse_results(address, json_data)
+
+        return self.count_result(result)
+
+    def update_queued_count(self, change: int):
+        with self.queued_count_lock:
+            self.queued_count += change
+
+    def get_wait_seconds(self) -> float:
+        '''
+        Estimated wait before this provider could send another request, used to spread work across providers
+        '''
+
+        return self.rate_limiter.get_wait_seconds() + self.queued_count / self.rate_limiter.rate
+
+class GeocodeMapsProvider(Provider):
+    '''
+    https://geocode.maps.co/, nominatim (OpenStreetMap) search results
+    '''
+
+    SERVICE_PROVIDER = ServiceProvider.GEOCODEMAPS
+    BASE_URL = 'https://geocode.maps.co/search?q={}'
+    API_KEY_ENVIRONMENT_VARIABLE = 'GEOCODEMAPS_API_KEY'
+
+    def build_url(self, address: str) -> str:
+        url = self.base_url.format(quote(address))
+        if self.api_key:
+            url = f'{url}&api_key={self.api_key}'
+
+        return url
+
+    def parse_results(self, address: str, json_data: list) -> list[dict]:
+        if not isinstance(json_data, list):
+            return None
+
+        return [
+            {
+                'address': address,
+                'place_id': row['place_id'],
+                'osm_id': row['osm_id'],
+                'lat': row['lat'],
+                'long': row['lon'],
+                'display_name': row['display_name'],
+                'class': row['class'],
+                'type': row['type'],
+                'importance': row.get('importance'),
+            } for row in json_data
+        ]
+
+class PositionstackProvider(Provider):
+    '''
+    https://positionstack.com/, forward geocoding
+    '''
+
+    SERVICE_PROVIDER = ServiceProvider.POSITIONSTACK
+    BASE_URL = 'http://api.positionstack.com/v1/forward?access_key={}&query={}'
+    API_KEY_ENVIRONMENT_VARIABLE = 'POSITIONSTACK_API_KEY'
+
+    def build_url(self, address: str) -> str:
+        return self.base_url.format(self.api_key, quote(address))
+
+    def parse_results(self, address: str, json_data: dict) -> list[dict]:
+        if not (isinstance(json_data, dict) and isinstance(json_data.get('data'), list)):
+            return None
+
+        return [
+            {
+                'address': address,
+                'place_id': None,
+                'osm_id': None,
+                'lat': row['latitude'],
+                'long': row['longitude'],
+                'display_name': row['label'],
+                'class': None,
+                'type': row['type'],
+                'importance': row.get('confidence'),
+            } for row in json_data['data']
+        ]
+
+class MaptilerProvider(Provider):
+    '''
+    https://www.maptiler.com/, geocoding api (GeoJSON features)
+    '''
+
+    SERVICE_PROVIDER = ServiceProvider.MAPTILER
+    BASE_URL = 'https://api.maptiler.com/geocoding/{}.json?key={}'
+    API_KEY_ENVIRONMENT_VARIABLE = 'MAPTILER_API_KEY'
+
+    def build_url(self, address: str) -> str:
+        return self.base_url.format(quote(address, safe=''), self.api_key)
+
+    def parse_results(self, address: str, json_data: dict) -> list[dict]:
+        if not (isinstance(json_data, dict) and isinstance(json_data.get('features'), list)):
+            return None
+
+        return [
+            {
+                'address': address,
+                'place_id': feature['id'],
+                'osm_id': feature.get('properties', {}).get('ref'),
+                'lat': feature['center'][1],
+                'long': feature['center'][0],
+                'display_name': feature['place_name'],
+                'class': feature.get('properties', {}).get('kind'),
+                'type': feature['place_type'][0],
+                'importance': feature.get('relevance'),
+            } for feature in json_data['features']
+        ]
+
+PROVIDER_CLASSES = {
+    provider_class.SERVICE_PROVIDER: provider_class
+    for provider_class in [GeocodeMapsProvider, PositionstackProvider, MaptilerProvider]
+}
+
+def create_provider(service_provider: ServiceProvider, **kwargs) -> Provider:
+    '''
+    Create the provider for a ServiceProvider
+
+    args:
+        service_provider (ServiceProvider): provider to create
+        kwargs: base_url, api_key, requests_per_second, max_concurrency
+    '''
+
+    if service_provider not in PROVIDER_CLASSES:
+        raise ValueError(f'Unsupported service provider used ({service_provider}).')
+
+    return PROVIDER_CLASSES[service_provider](**kwargs)
@@ -1,19 +1,25 @@
-from enum import auto, Enum
+import asyncio
 import json
 import os
-from concurrent.futures import ThreadPoolExecutor
-import multiprocessing as mp
+from concurrent.futures import as_completed, FIRST_COMPLETED, ThreadPoolExecutor, wait
 import sys
-import time
 
-import requests
+import aiohttp
 
 import pandas as pd
 
+import pyarrow as pa
+import pyarrow.parquet as pq
+
 from  unidecode import unidecode
 
-class ServiceProvider(Enum):
-    GEOCODEMAPS = auto()
+from address_stream import iter_unique_addresses
+from geocode_cache import GeocodeCache
+from geocode_journal import GeocodeJournal
+from geocode_providers import create_provider, Provider, ServiceProvider
+from local_index import LocalGeocodeIndex
+from result_ranking import rank_results
+from spatial_index import SpatialIndex
 
 class Geocoder:
     '''
@@ -25,24 +31,52 @@ class Geocoder:
     DEFAULT_ADDRESS_FILE_PATH = os.path.join(os.path.dirname(__file__), 'addresses.csv')
     DEFAULT_ADDRESS_FILE_COLUMN_NAME = 'address'
 
-    DEFAULT_MAX_THREADS = mp.cpu_count()
+    DEFAULT_CACHE_FILE_PATH = os.path.join(os.path.dirname(__file__), 'geocode_cache.sqlite')
+    DEFAULT_JOURNAL_FILE_PATH = os.path.join(os.path.dirname(__file__), 'geocode_journal.jsonl')
+    # earlier output files, indexed so addresses geocoded before don't need a request
+    DEFAULT_LOCAL_INDEX_FILE_PATHS = [os.path.join(os.path.dirname(__file__), 'geocoded_addresses*.csv')]
+
+    MIN_THREADS = 2
+
+    # longest wait for a throttled or failing provider before falling back to the next provider
+    FALLBACK_WAIT_SECONDS = 5
 
     DEFAULT_SAVE_COUNT = 15
 
-    DEFAULT_WAIT_TIME_MEDIUM_SECONDS = 3
-    DEFAULT_WAIT_TIME_SHORT_SECONDS = 1
+    # candidates kept per address by export_ranked_results
+    DEFAULT_TOP_K = 1
+
+    # streaming mode, rows of the address file read at a time and addresses queued for the threads
+    DEFAULT_CHUNK_ROWS = 100_000
+    DEFAULT_MAX_QUEUE_SIZE = 10_000
 
-    BASE_URLS = {
-        ServiceProvider.GEOCODEMAPS: 'https://geocode.maps.co/search?q={}'
-    }
+    # async mode, connections to the providers and lookups in flight
+    DEFAULT_MAX_CONNECTIONS = 100
+    DEFAULT_MAX_IN_FLIGHT = 1_000
 
-    def __init__(self, location_hint:str = None, service_provider: ServiceProvider = ServiceProvider.GEOCODEMAPS, address_file_path: str = None, address_file_column_name: str = None, save_count: int = None, max_threads: int = None, wait_time: int = None):
+    # address_original is the address as it appears in the address file, the match columns are only set for
+    # results from the local index
+    RESULT_COLUMNS = ['address_original'] + Provider.RESULT_COLUMNS + LocalGeocodeIndex.MATCH_COLUMNS
+
+    def __init__(self, location_hint:str = None, bounding_box: tuple[float, float, float, float] = None, service_provider: ServiceProvider = ServiceProvider.GEOCODEMAPS, service_providers: list[ServiceProvider] = None, providers: list[Provider] = None, addresses: list[str] = None, address_file_path: str = None, address_file_column_name: str = None, save_count: int = None, max_threads: int = None, requests_per_second: float = None, cache_file_path: str = None, use_cache: bool = True, journal_file_path: str = None, use_journal: bool = True, resume: bool = False, streaming: bool = False, chunk_rows: int = None, max_queue_size: int = None, local_index_file_paths: list[str] = None, use_local_index: bool = True, approximate_local_index: bool = False):
         if location_hint is None:
             self.location_hint = ''
         else:
             self.location_hint = f', {location_hint}'
-        self.service_provider = service_provider
-        self.base_url = self.BASE_URLS[self.service_provider]
+
+        # (south, north, west, east) of the location hint's area, ranked results outside it are dropped
+        self.bounding_box = bounding_box
+
+        # providers in order of preference, misses and errors fall back to the next provider
+        if providers is not None:
+            self.providers = providers
+        else:
+            if service_providers is None:
+                service_providers = [service_provider]
+
+            self.providers = [create_provider(service_provider_, requests_per_second=requests_per_second) for service_provider_ in service_providers]
+
+        self.service_provider = self.providers[0].SERVICE_PROVIDER
 
         if address_file_path is None:
             self.address_file_path = self.DEFAULT_ADDRESS_FILE_PATH
@@ -54,24 +88,66 @@ class Geocoder:
         else:
             self.address_file_column_name = address_file_column_name
 
-        self.addresses = self.load_address_data(self.address_file_path, self.address_file_column_name)
+        if chunk_rows is None:
+            self.chunk_rows = self.DEFAULT_CHUNK_ROWS
+        else:
+            self.chunk_rows = chunk_rows
+
+        if max_queue_size is None:
+            self.max_queue_size = self.DEFAULT_MAX_QUEUE_SIZE
+        else:
+            self.max_queue_size = max_queue_size
+
+        # when streaming the address file is read while geocoding, a chunk at a time
+        self.streaming = streaming
+        if addresses is not None:
+            self.addresses = addresses
+        elif self.streaming:
+            self.addresses = None
+        else:
+            self.addresses = self.load_address_data(self.address_file_path, self.address_file_column_name)
 
         if save_count is None:
             self.save_count = self.DEFAULT_SAVE_COUNT
         else:
             self.save_count = save_count
 
+        # enough threads to keep every provider at its concurrency limit
         if max_threads is None:
-            self.max_threads = self.DEFAULT_MAX_THREADS
+            self.max_threads = max(self.MIN_THREADS, sum(provider.max_concurrency for provider in self.providers))
         else:
             self.max_threads = max_threads
 
-        if wait_time is None:
-            self.wait_time = self.DEFAULT_WAIT_TIME_SHORT_SECONDS
+        if not use_cache:
+            self.cache = None
+        elif cache_file_path is None:
+            self.cache = GeocodeCache(self.DEFAULT_CACHE_FILE_PATH)
+        else:
+            self.cache = GeocodeCache(cache_file_path)
+
+        if not use_journal:
+            self.journal = None
+        elif journal_file_path is None:
+            self.journal = GeocodeJournal(self.DEFAULT_JOURNAL_FILE_PATH, self.save_count, self.RESULT_COLUMNS)
         else:
-            self.wait_time = wait_time
+            self.journal = GeocodeJournal(journal_file_path, self.save_count, self.RESULT_COLUMNS)
+
+        self.resume = resume
+
+        if not use_local_index:
+            self.local_index = None
+        else:
+            # prefix and fuzzy matches can be a different address, they are only used when asked for
+            self.local_index = LocalGeocodeIndex(Provider.RESULT_COLUMNS, approximate=approximate_local_index)
+            if local_index_file_paths is None:
+                self.local_index.build_from_files(self.DEFAULT_LOCAL_INDEX_FILE_PATHS)
+            else:
+                self.local_index.build_from_files(local_index_file_paths)
+
+        self.request_count = 0
 
-        print(f'Geocoder initialised with location hint: {self.location_hint}, max threads: {self.max_threads}, wait time: {self.wait_time} second(s).')
+        provider_text = ', '.join(f'{provider.name} ({provider.requests_per_second} request(s) per second)' for provider in self.providers)
+        print(f'Geocoder initialised with location hint: {self.location_hint}, max threads: {self.max_threads}, providers: {provider_text}.')
 
     def load_address_data(self, file_path: str, column_name: str) -> list[str]:
         '''
@@ -84,74 +160,380 @@ class Geocoder:
 
         print(f'loading addresses from {file_path}, using column "{column_name}".')
 
-        address_df = pd.read_csv(file_path)
-        addresses = list(set(address_df[column_name].values))
+        address_df = pd.read_csv(file_path, usecols=[column_name], dtype={column_name: str})
+        # unique addresses in file order
+        addresses = list(address_df[column_name].dropna().unique())
         
         return addresses
+
+    def iter_address_data(self) -> iter:
+        '''
+        Yield the unique addresses of the address file in file order, reading it a chunk at a time
+        '''
+
+        print(f'streaming addresses from {self.address_file_path}, using column "{self.address_file_column_name}", {self.chunk_rows:,} rows at a time.')
+
+        return iter_unique_addresses(self.address_file_path, self.address_file_column_name, self.chunk_rows)
     
-    def geocode_single_address_geocode_maps(self, address: str) -> dict:
+    def clean_address(self, address: str) -> str:
         '''
-        Geocode a single address string
+        Add the location hint to an address and normalise it, the cleaned address is also the cache key
 
-        args:            
+        args:
             address (str): address text
         '''
-        
-        url = self.base_url.format(address)
-        response = requests.get(url)
-        if response.status_code != 200:
-            result = {}
-        else:
-            json_data  = response.json()
-            result = [
-                {
-                    'address': address.replace('%20', ' '),
-                    'place_id': row['place_id'],
-                    'osm_id': row['osm_id'],
-                    'lat': row['lat'],
-                    'long': row['lon'],
-                    'display_name': row['display_name'],
-                    'class': row['class'],
-                    'type': row['type'],
-                } for row in json_data
-            ]
+
+        return unidecode(f'{address}{self.location_hint}').lower().strip()
+
+    def get_cached_result(self, provider: Provider, address_clean: str) -> list[dict]:
+        '''
+        Return a provider's cached result for a cleaned address, or None if there isn't one
+
+        args:
+            provider (Provider): provider that made the lookup
+            address_clean (str): cleaned address text
+        '''
+
+        if self.cache is None:
+            return None
+
+        return self.cache.get(provider.name, address_clean)
+
+    def store_result(self, provider: Provider, address_clean: str, result: list[dict]) -> list[dict]:
+        '''
+        Count the request and cache its result, returns the result rows or None if the request failed
+
+        args:
+            provider (Provider): provider that made the lookup
+            address_clean (str): cleaned address text
+            result (list[dict]): result rows, None if the provider couldn't be reached
+        '''
+
+        self.request_count += 1
+
+        if result is None:
+            # throttled, unreachable or rejected, don't cache the miss
+            print(f'failed to geocode "{address_clean}" with {provider.name}, throttled, unreachable or rejected.')
+            return None
+
+        if self.cache is not None:
+            self.cache.put(provider.name, address_clean, result)
 
         return result
 
-    
-    def geocode_multi_thread_worker(self, address: str) -> dict:
+    def get_providers_to_try(self, address_clean: str) -> tuple[list[dict], list[Provider]]:
         '''
-        Geocode a single address string
+        Check the local index then each provider's cached result, returns the first result with rows (or
+        None) and the providers without a cached result
+
+        args:
+            address_clean (str): cleaned address text
+        '''
+
+        if self.local_index is not None:
+            result = self.local_index.lookup(address_clean)
+            if result is not None:
+                return result, []
+
+        providers_to_try = []
+        for provider in self.providers:
+            result = self.get_cached_result(provider, address_clean)
+            if result is None:
+                providers_to_try.append(provider)
+            elif result != []:
+                return result, []
+
+        return None, providers_to_try
+
+    def choose_provider(self, providers: list[Provider]) -> Provider:
+        '''
+        Choose the provider that can send a request soonest, so work is spread across the providers' quotas
+
+        Preference order breaks ties, so a single fast provider is used first.
+        '''
+
+        return min(providers, key=lambda provider: provider.get_wait_seconds())
+
+    def geocode_address(self, address_clean: str) -> list[dict]:
+        '''
+        Geocode a cleaned address, falling back to the other providers on misses and errors
+
+        Returns the result rows, [] if no provider found the address, or None if a provider that might have
+        found it couldn't be reached
+
+        args:
+            address_clean (str): cleaned address text
+        '''
+
+        result, providers_to_try = self.get_providers_to_try(address_clean)
+        if result is not None:
+            return result
+
+        is_failed = False
+        deferred_providers = set()
+        while providers_to_try != []:
+            provider = self.choose_provider(providers_to_try)
+            providers_to_try.remove(provider)
+
+            is_last = providers_to_try == []
+            max_wait_seconds = None if is_last else self.FALLBACK_WAIT_SECONDS
+            result = provider.geocode(address_clean, max_wait_seconds)
+            if (result is None) and (not is_last) and (provider not in deferred_providers):
+                # throttled or down, try the other providers first and come back to it
+                deferred_providers.add(provider)
+                providers_to_try.append(provider)
+                continue
+
+            result = self.store_result(provider, address_clean, result)
+            if result:
+                return result
+
+            is_failed = is_failed or (result is None)
+
+        return None if is_failed else []
+
+    async def geocode_address_async(self, session: aiohttp.ClientSession, address_clean: str) -> list[dict]:
+        '''
+        Async version of geocode_address
+
+        args:
+            session (aiohttp.ClientSession): session holding the connection pool
+            address_clean (str): cleaned address text
+        '''
+
+        result, providers_to_try = self.get_providers_to_try(address_clean)
+        if result is not None:
+            return result
+
+        is_failed = False
+        deferred_providers = set()
+        while providers_to_try != []:
+            provider = self.choose_provider(providers_to_try)
+            providers_to_try.remove(provider)
+
+            is_last = providers_to_try == []
+            max_wait_seconds = None if is_last else self.FALLBACK_WAIT_SECONDS
+            result = await provider.geocode_async(session, address_clean, max_wait_seconds)
+            if (result is None) and (not is_last) and (provider not in deferred_providers):
+                # throttled or down, try the other providers first and come back to it
+                deferred_providers.add(provider)
+                providers_to_try.append(provider)
+                continue
+
+            result = self.store_result(provider, address_clean, result)
+            if result:
+                return result
+
+            is_failed = is_failed or (result is None)
+
+        return None if is_failed else []
+
+    def record_result(self, address: str, address_clean: str, result: list[dict]) -> list[dict]:
+        '''
+        Add the original address to the result rows of a completed lookup and write them to the journal,
+        failed lookups (None) aren't recorded so a resumed run retries them
+
+        Returns the result rows when running without a journal, with a journal the rows are read back from it
+        so the workers don't hold them in memory
+
+        args:
+            address (str): address text from the address file
+            address_clean (str): cleaned address text
+            result (list[dict]): result rows, None if the lookup failed
+        '''
+
+        if result is None:
+            return []
+
+        result = [{'address_original': address, **row} for row in result]
+
+        if self.journal is not None:
+            self.journal.record(address_clean, result)
+            return []
+
+        return result
+
+    def geocode_multi_thread_worker(self, address: str) -> list[dict]:
+        '''
+        Geocode a single address string, using the cached result if there is one
 
         args:            
             address (str): address text
         '''
 
-        # add location hint to address        
-        augmented_address = f'{address}{self.location_hint}'
+        address_clean = self.clean_address(address)
 
-        # clean address string
-        address_clean = unidecode(augmented_address).lower().strip().replace(' ', '%20')
+        return self.record_result(address, address_clean, self.geocode_address(address_clean))
 
-        if self.service_provider == ServiceProvider.GEOCODEMAPS:
-            result = self.geocode_single_address_geocode_maps(address_clean)
-        else:
-            raise ValueError(f'Unsupported service provider used ({self.service_provider}).')
-        
-        time.sleep(self.wait_time)
-        
-        return result
-    
-    def geocode_addresses(self) -> pd.DataFrame:
-        # multi-threaded geocoding
-        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-            results = executor.map(self.geocode_multi_thread_worker, self.addresses)
+    async def geocode_async_worker(self, session: aiohttp.ClientSession, address: str) -> list[dict]:
+        '''
+        Async version of geocode_multi_thread_worker
+
+        args:
+            session (aiohttp.ClientSession): session holding the connection pool
+            address (str): address text
+        '''
 
+        address_clean = self.clean_address(address)
+
+        return self.record_result(address, address_clean, await self.geocode_address_async(session, address_clean))
+
+    def start_run(self) -> iter:
+        '''
+        Open the journal and return the addresses to geocode (a generator when streaming), skipping those
+        already completed when resuming
+        '''
+
+        addresses = self.iter_address_data() if self.addresses is None else self.addresses
+
+        if self.journal is None:
+            return addresses
+
+        completed = self.journal.open(self.resume)
+        if completed == set():
+            return addresses
+
+        print(f'resuming from {self.journal.file_path}, skipping {len(completed):,} completed address(es).')
+
+        return (address for address in addresses if self.clean_address(address) not in completed)
+
+    def map_bounded(self, executor: ThreadPoolExecutor, function, addresses: iter):
+        '''
+        Yield function(address) for each address as the lookups complete, with at most max_queue_size
+        addresses submitted to the executor at once so addresses are only read as fast as they are geocoded
+
+        args:
+            executor (ThreadPoolExecutor): thread pool
+            function (function): worker called with each address
+            addresses (iter): addresses, can be a generator
+        '''
+
+        pending = set()
+        for address in addresses:
+            if len(pending) >= self.max_queue_size:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+            pending.add(executor.submit(function, address))
+
+        for future in as_completed(pending):
+            yield future.result()
+
+    def finish_run(self, results, collect_results: bool):
+        '''
+        Wait for the results, close the journal, combine the result rows of every address into self.df and
+        report the cache and request counts
+
+        args:
+            results (iterable[list[dict]]): result rows of each address geocoded in this run
+            collect_results (bool): build self.df, otherwise the results are only kept in the journal
+        '''
+
+        # results are consumed even when they aren't kept so exceptions raised by the workers surface here
         all_results = []
         for result in results:
             all_results.extend(result)            
-        
-        self.df = pd.DataFrame(all_results)
+
+        if self.journal is not None:
+            self.journal.close()
+
+        if not collect_results:
+            self.df = None
+        elif self.journal is not None:
+            # the journal also holds the addresses completed before a resume
+            self.df = self.journal.read_data_frame()
+        else:
+            self.df = pd.DataFrame(all_results, columns=self.RESULT_COLUMNS)
+
+        if self.local_index is not None:
+            print(f'local index ({len(self.local_index):,} addresses) exact: {self.local_index.exact_hits:,}, prefix: {self.local_index.prefix_hits:,}, fuzzy: {self.local_index.fuzzy_hits:,}, misses: {self.local_index.misses:,}.')
+
+        if self.cache is not None:
+            print(f'cache hits: {self.cache.hits:,}, misses: {self.cache.misses:,}, hit ratio: {self.cache.get_hit_ratio():.1%}, network requests: {self.request_count:,}.')
+
+        for provider in self.providers:
+            print(f'{provider.name}: requests sent: {provider.rate_limiter.request_count:,}, throttled or failed: {provider.rate_limiter.throttle_count:,}, found: {provider.hit_count:,}, not found: {provider.miss_count:,}, failed: {provider.failure_count:,}.')
+
+    def geocode_addresses(self, collect_results: bool = True) -> pd.DataFrame:
+        '''
+        Geocode the addresses across a thread pool, completed lookups are written to the journal as they finish
+
+        args:
+            collect_results (bool): build self.df, set to False for very large jobs and use export_results
+        '''
+
+        addresses = self.start_run()
+        try:
+            # multi-threaded geocoding
+            with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
+                results = self.map_bounded(executor, self.geocode_multi_thread_worker, addresses)
+
+                self.finish_run(results, collect_results)
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+
+    def geocode_addresses_async(self, max_connections: int = None, max_in_flight: int = None, collect_results: bool = True) -> pd.DataFrame:
+        '''
+        Geocode the addresses on an asyncio event loop, the same results as geocode_addresses without a thread
+        per request
+
+        args:
+            max_connections (int): size of the keep-alive connection pool
+            max_in_flight (int): maximum number of lookups started but not finished
+            collect_results (bool): build self.df, set to False for very large jobs and use export_results
+        '''
+
+        if max_connections is None:
+            max_connections = self.DEFAULT_MAX_CONNECTIONS
+
+        if max_in_flight is None:
+            max_in_flight = self.DEFAULT_MAX_IN_FLIGHT
+
+        addresses = self.start_run()
+        try:
+            results = asyncio.run(self.geocode_addresses_coroutine(addresses, max_connections, max_in_flight))
+
+            self.finish_run(results, collect_results)
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+
+    async def geocode_addresses_coroutine(self, addresses: iter, max_connections: int, max_in_flight: int) -> list[list[dict]]:
+        connector = aiohttp.TCPConnector(limit=max_connections)
+        timeout = aiohttp.ClientTimeout(total=max(provider.REQUEST_TIMEOUT_SECONDS for provider in self.providers))
+
+        # semaphores belong to the event loop they are first used in
+        for provider in self.providers:
+            provider.async_semaphore = asyncio.Semaphore(provider.max_concurrency)
+
+        results = []
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            # only max_in_flight lookups are created at once, so addresses are read as they are geocoded
+            tasks = set()
+            for address in addresses:
+                if len(tasks) >= max_in_flight:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    results.extend(task.result() for task in done)
+
+                tasks.add(asyncio.create_task(self.geocode_async_worker(session, address)))
+
+            if tasks:
+                done, _ = await asyncio.wait(tasks)
+                results.extend(task.result() for task in done)
+
+        return results
+
+    def build_spatial_index(self, cell_degrees: float = None) -> SpatialIndex:
+        '''
+        Build a spatial index of the results, query row ids are positions in self.df
+
+        args:
+            cell_degrees (float): size of the index grid cells
+        '''
+
+        return SpatialIndex.from_data_frame(self.df, cell_degrees=cell_degrees)
 
     def save_data(self, file_path: str):
         '''
@@ -162,7 +544,62 @@ class Geocoder:
         '''
         self.df.to_csv(file_path, index=False)
 
-def process_args(args: list) -> tuple[str, int, int]:
+    def iter_result_chunks(self):
+        '''
+        Yield the results as data frames, a chunk of the journal at a time when there is one, every row of an
+        address is in the same chunk
+        '''
+
+        if self.journal is not None:
+            yield from self.journal.read_data_frame_chunks()
+        else:
+            yield self.df
+
+    def export_ranked_results(self, file_path: str, top_k: int = None, bounding_box: tuple[float, float, float, float] = None):
+        '''
+        Rank the candidates of each address (see result_ranking.rank_results) and save the best top_k as a
+        parquet file with numeric lat/long, a chunk at a time
+
+        args:
+            file_path (str): path of saved parquet file
+            top_k (int): candidates kept per address
+            bounding_box (tuple): (south, north, west, east), defaults to the location hint's bounding box
+        '''
+
+        if top_k is None:
+            top_k = self.DEFAULT_TOP_K
+
+        if bounding_box is None:
+            bounding_box = self.bounding_box
+
+        writer = None
+        try:
+            for chunk_df in self.iter_result_chunks():
+                table = pa.Table.from_pandas(rank_results(chunk_df, top_k, bounding_box), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(file_path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def export_results(self, file_path: str):
+        '''
+        Save every result in the journal to disk without loading them all into memory
+
+        args:
+            file_path (str): path of saved file
+        '''
+
+        if self.journal is None:
+            raise ValueError('export_results needs the journal, use save_data when running without one.')
+
+        self.journal.export_csv(file_path)
+
+def process_args(args: list) -> tuple[str, int, float, str, str, str, bool, list, bool, bool, bool, int, tuple]:
     '''
     process command line arguments used to call the module
 
@@ -170,16 +607,41 @@ def process_args(args: list) -> tuple[str, int, int]:
         args (list): command line arguments list from sys.argv
     '''
 
-    USAGE = 'python geocoder.py [-h|--hint] location_hint [-t|--t] max_threads [-w|--wait] wait_time'
+    USAGE = 'python geocoder.py [-h|--hint] location_hint [-t|--t] max_threads [-r|--rate] requests_per_second [-c|--cache] cache_file_path|none [-m|--mode] threads|async [-j|--journal] journal_file_path|none [-p|--providers] geocodemaps,positionstack,maptiler [-k|--top-k] top_k [-b|--bbox] south,north,west,east [--resume] [--stream] [--no-local-index] [--approximate-local-index]'
 
     location_hint = None
     max_threads = None
-    wait_time = None
+    requests_per_second = None
+    cache_file_path = None
+    mode = 'threads'
+    journal_file_path = None
+    resume = False
+    service_providers = None
+    streaming = False
+    use_local_index = True
+    approximate_local_index = False
+    top_k = None
+    bounding_box = None
     
     if len(sys.argv) > 1:
         args = sys.argv[1:]    
     
     while True:        
+        if args[0] in ['--resume', '--stream', '--no-local-index', '--approximate-local-index']:
+            # flags without a value
+            if args[0] == '--resume':
+                resume = True
+            elif args[0] == '--stream':
+                streaming = True
+            elif args[0] == '--approximate-local-index':
+                approximate_local_index = True
+            else:
+                use_local_index = False
+            args = args[1:]
+            if len(args) == 0:
+                break
+            continue
+
         if (args[0] == '-h') or (args[0] == '--hint'):
             location_hint = args[1]            
         elif (args[0] == '-t') or (args[0] == '-threads'):
@@ -190,11 +652,49 @@ def process_args(args: list) -> tuple[str, int, int]:
                 print(USAGE)
                 print('Exiting.')
                 sys.exit(1)
-        elif (args[0] == '-w') or (args[0] == '--wait'):
+        elif (args[0] == '-r') or (args[0] == '--rate'):
             try:
-                wait_time = int(args[1])
+                requests_per_second = float(args[1])
             except ValueError:
-                print(f'unable to process argument value "{args[1]}" for wait time.')
+                print(f'unable to process argument value "{args[1]}" for requests per second.')
+                print(USAGE)
+                print('Exiting.')
+                sys.exit(1)
+        elif (args[0] == '-c') or (args[0] == '--cache'):
+            cache_file_path = args[1]
+        elif (args[0] == '-m') or (args[0] == '--mode'):
+            if args[1] not in ['threads', 'async']:
+                print(f'unable to process argument value "{args[1]}" for mode.')
+                print(USAGE)
+                print('Exiting.')
+                sys.exit(1)
+            mode = args[1]
+        elif (args[0] == '-j') or (args[0] == '--journal'):
+            journal_file_path = args[1]
+        elif (args[0] == '-k') or (args[0] == '--top-k'):
+            try:
+                top_k = int(args[1])
+            except ValueError:
+                print(f'unable to process argument value "{args[1]}" for top k.')
+                print(USAGE)
+                print('Exiting.')
+                sys.exit(1)
+        elif (args[0] == '-b') or (args[0] == '--bbox'):
+            try:
+                bounding_box = tuple(float(value) for value in args[1].split(','))
+            except ValueError:
+                bounding_box = None
+
+            if (bounding_box is None) or (len(bounding_box) != 4):
+                print(f'unable to process argument value "{args[1]}" for bounding box.')
+                print(USAGE)
+                print('Exiting.')
+                sys.exit(1)
+        elif (args[0] == '-p') or (args[0] == '--providers'):
+            try:
+                service_providers = [ServiceProvider[name.strip().upper()] for name in args[1].split(',')]
+            except KeyError:
+                print(f'unable to process argument value "{args[1]}" for providers.')
                 print(USAGE)
                 print('Exiting.')
                 sys.exit(1)
@@ -206,14 +706,30 @@ def process_args(args: list) -> tuple[str, int, int]:
 
     #print('l', location_hint)
     #print('t', max_threads)
-    #print('w', wait_time)
+    #print('r', requests_per_second)
 
-    return location_hint, max_threads, wait_time
+    return location_hint, max_threads, requests_per_second, cache_file_path, mode, journal_file_path, resume, service_providers, streaming, use_local_index, approximate_local_index, top_k, bounding_box
 
 if __name__ == '__main__':
 
-    location_hint, max_threads, wait_time = process_args(sys.argv)
+    location_hint, max_threads, requests_per_second, cache_file_path, mode, journal_file_path, resume, service_providers, streaming, use_local_index, approximate_local_index, top_k, bounding_box = process_args(sys.argv)
+
+    use_cache = (cache_file_path is None) or (cache_file_path.lower() != 'none')
+    use_journal = (journal_file_path is None) or (journal_file_path.lower() != 'none')
+    gc = Geocoder(location_hint=location_hint, bounding_box=bounding_box, service_providers=service_providers, max_threads=max_threads, requests_per_second=requests_per_second, cache_file_path=cache_file_path, use_cache=use_cache, journal_file_path=journal_file_path, use_journal=use_journal, resume=resume, streaming=streaming, use_local_index=use_local_index, approximate_local_index=approximate_local_index)
+
+    # with a journal the results are streamed to disk and exported from it, memory use stays flat
+    if mode == 'async':
+        gc.geocode_addresses_async(collect_results=not use_journal)
+    else:
+        gc.geocode_addresses(collect_results=not use_journal)
+
+    output_file_path = os.path.join(os.path.dirname(__file__), 'geocoded_addresses.csv')
+    if use_journal:
+        gc.export_results(output_file_path)
+    else:
+        gc.save_data(output_file_path)
 
-    gc = Geocoder(location_hint=location_hint, max_threads=max_threads, wait_time=wait_time)
-    gc.geocode_addresses()
-    gc.save_data(os.path.join(os.path.dirname(__file__), 'geocoded_addresses.csv'))
+    # best candidates per address in a compact columnar file
+    if (top_k is not None) or (bounding_box is not None):
+        gc.export_ranked_results(os.path.join(os.path.dirname(__file__), 'geocoded_addresses.parquet'), top_k)
@@ -0,0 +1,293 @@
+from bisect import bisect_left
+import glob
+import math
+import re
+
+import numpy as np
+
+import pandas as pd
+
+from  unidecode import unidecode
+
+# normalised addresses only hold spaces, letters and digits, a trigram is coded as a base 37 number
+CHARACTERS = ' abcdefghijklmnopqrstuvwxyz0123456789'
+CHARACTER_CODES = {character: i for i, character in enumerate(CHARACTERS)}
+TRIGRAM_CODE_COUNT = len(CHARACTERS) ** 3
+
+class LocalGeocodeIndex:
+    '''
+    In memory index of previously geocoded addresses, built from earlier geocoder output files
+
+    Addresses are normalised (unidecode, lower case, punctuation removed) and looked up by exact match. With
+    approximate matching on, an address without an exact match is looked up by prefix on the sorted addresses
+    and then by shared trigrams, these can return the position of a different address (e.g. house 125 for
+    house 12), so every returned row is labelled with its match_type and matched_address. Only addresses
+    without a match need a request to a remote provider.
+
+    The result rows of each address are held as columns of numpy arrays, address i owns rows
+    row_starts[i] to row_starts[i + 1], so the index stays small for large output files.
+    '''
+
+    DEFAULT_MIN_SIMILARITY = 0.8
+    DEFAULT_MIN_PREFIX_LENGTH = 12
+
+    EXACT = 'exact'
+    PREFIX = 'prefix'
+    FUZZY = 'fuzzy'
+    APPROXIMATE_MATCH_TYPES = [PREFIX, FUZZY]
+
+    # added to each returned row, matched_address is the normalised indexed address the rows belong to
+    MATCH_COLUMNS = ['match_type', 'matched_address']
+
+    def __init__(self, columns: list[str], approximate: bool = False, min_similarity: float = None, min_prefix_length: int = None):
+        self.columns = columns
+        self.approximate = approximate
+
+        if min_similarity is None:
+            self.min_similarity = self.DEFAULT_MIN_SIMILARITY
+        else:
+            self.min_similarity = min_similarity
+
+        if min_prefix_length is None:
+            self.min_prefix_length = self.DEFAULT_MIN_PREFIX_LENGTH
+        else:
+            self.min_prefix_length = min_prefix_length
+
+        self.addresses = []
+        self.address_ids = {}
+        self.row_starts = np.zeros(1, dtype=np.int64)
+        self.row_values = {column: np.empty(0, dtype=object) for column in self.columns}
+
+        # ids of the addresses containing trigram code c are posting_ids[posting_starts[c]:posting_starts[c + 1]]
+        # (sorted), trigram_counts holds the number of distinct trigrams of each address
+        self.posting_ids = np.empty(0, dtype=np.int32)
+        self.posting_starts = np.zeros(TRIGRAM_CODE_COUNT + 1, dtype=np.int64)
+        self.trigram_counts = np.empty(0, dtype=np.int32)
+
+        self.exact_hits = 0
+        self.prefix_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    @staticmethod
+    def normalise(address: str) -> str:
+        '''
+        Normalise an address for matching, ascii, lower case, words separated by single spaces
+        '''
+
+        return ' '.join(re.sub(r'[^a-z0-9]+', ' ', unidecode(address).lower()).split())
+
+    @staticmethod
+    def get_trigrams(address: str) -> set[int]:
+        '''
+        Return the codes of the trigrams of a normalised address
+        '''
+
+        codes = [CHARACTER_CODES[character] for character in f'  {address} ']
+
+        return {(codes[i] * len(CHARACTERS) + codes[i + 1]) * len(CHARACTERS) + codes[i + 2] for i in range(len(codes) - 2)}
+
+    def build_postings(self):
+        '''
+        Build the trigram posting lists of self.addresses, vectorised over one array of every address'
+        characters
+        '''
+
+        padded = [f'  {address} ' for address in self.addresses]
+        lengths = np.array([len(address) for address in padded], dtype=np.int64)
+        starts = np.cumsum(lengths) - lengths
+
+        character_table = np.zeros(256, dtype=np.int64)
+        character_table[np.frombuffer(CHARACTERS.encode('ascii'), dtype=np.uint8)] = np.arange(len(CHARACTERS))
+        codes = character_table[np.frombuffer(''.join(padded).encode('ascii'), dtype=np.uint8)]
+        trigram_codes = (codes[:-2] * len(CHARACTERS) + codes[1:-1]) * len(CHARACTERS) + codes[2:]
+
+        # drop the trigrams spanning two addresses, then the repeats within an address
+        position_ids = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)[:-2]
+        is_inside = np.arange(len(trigram_codes)) - starts[position_ids] <= lengths[position_ids] - 3
+        keys = np.sort(position_ids[is_inside] * TRIGRAM_CODE_COUNT + trigram_codes[is_inside])
+        keys = keys[np.append(True, keys[1:] != keys[:-1])]
+
+        address_ids = (keys // TRIGRAM_CODE_COUNT).astype(np.int32)
+        key_codes = keys % TRIGRAM_CODE_COUNT
+
+        # keys are sorted by address id, a stable sort on the trigram code keeps each posting list sorted
+        self.posting_ids = address_ids[np.argsort(key_codes, kind='stable')]
+        self.posting_starts = np.append(0, np.cumsum(np.bincount(key_codes, minlength=TRIGRAM_CODE_COUNT)))
+        self.trigram_counts = np.bincount(address_ids, minlength=len(padded)).astype(np.int32)
+
+    def build(self, result_df: pd.DataFrame):
+        '''
+        Build the index from geocoder result rows, rows without a position are ignored, as are rows that
+        came from an approximate match so they can't become exact matches
+
+        args:
+            result_df (pd.DataFrame): result rows with the address column and the index columns
+        '''
+
+        result_df = result_df.dropna(subset=['address', 'lat', 'long'])
+        if 'match_type' in result_df.columns:
+            result_df = result_df[~result_df['match_type'].isin(self.APPROXIMATE_MATCH_TYPES)]
+        result_df = result_df.copy()
+        # addresses repeat once per result row, normalise each once
+        normalised = {address: self.normalise(address) for address in result_df['address'].unique()}
+        result_df['address_normalised'] = result_df['address'].map(normalised)
+        result_df = result_df[result_df['address_normalised'] != ''].sort_values('address_normalised', kind='stable')
+
+        # rows are sorted by address, each address starts where the address changes
+        address_values = result_df['address_normalised'].to_numpy(dtype=object)
+        row_starts = np.flatnonzero(np.append(True, address_values[1:] != address_values[:-1]))
+
+        self.addresses = list(address_values[row_starts])
+        self.address_ids = {address: i for i, address in enumerate(self.addresses)}
+        self.row_starts = np.append(row_starts, len(result_df)).astype(np.int64)
+
+        # missing values become None, as in the provider results
+        values_df = result_df.reindex(columns=self.columns).astype(object)
+        values_df = values_df.where(values_df.notna(), None)
+        self.row_values = {column: values_df[column].to_numpy(dtype=object) for column in self.columns}
+
+        self.build_postings()
+
+    def build_from_files(self, file_paths: list[str]):
+        '''
+        Build the index from geocoder output csv files, missing files are skipped
+
+        args:
+            file_paths (list[str]): csv file paths or glob patterns
+        '''
+
+        dfs = []
+        for file_path in sorted({path for pattern in file_paths for path in glob.glob(pattern)}):
+            try:
+                # hand edited output files can mix encodings
+                df = pd.read_csv(file_path, usecols=lambda column: (column in self.columns) or (column == 'match_type'), dtype=str, encoding_errors='replace')
+            except pd.errors.EmptyDataError:
+                continue
+
+            if {'address', 'lat', 'long'}.issubset(df.columns):
+                dfs.append(df.apply(lambda values: values.str.strip()))
+            else:
+                print(f'skipping {file_path}, not a geocoder output file.')
+
+        self.build(pd.concat(dfs, ignore_index=True) if dfs != [] else pd.DataFrame(columns=self.columns))
+
+    def get_rows(self, address_id: int, address: str, match_type: str) -> list[dict]:
+        '''
+        Return the result rows of an indexed address, with the address column set to the looked up address
+        and the MATCH_COLUMNS added
+
+        args:
+            address_id (int): position of the address in self.addresses
+            address (str): looked up address text
+            match_type (str): EXACT, PREFIX or FUZZY
+        '''
+
+        rows = []
+        for i in range(self.row_starts[address_id], self.row_starts[address_id + 1]):
+            row = {column: self.row_values[column][i] for column in self.columns}
+            row['address'] = address
+            row['match_type'] = match_type
+            row['matched_address'] = self.addresses[address_id]
+            rows.append(row)
+
+        return rows
+
+    def find_prefix(self, address: str) -> int:
+        '''
+        Return the id of the first indexed address that starts with address, or None
+        '''
+
+        if len(address) < self.min_prefix_length:
+            return None
+
+        i = bisect_left(self.addresses, address)
+        if (i < len(self.addresses)) and self.addresses[i].startswith(address):
+            return i
+
+        return None
+
+    def find_similar(self, address: str) -> int:
+        '''
+        Return the id of the indexed address sharing the most trigrams with address (jaccard similarity of at
+        least min_similarity), or None
+
+        A match has to share at least min_shared of the query's trigrams, so it contains one of the
+        len(postings) - min_shared + 1 rarest of them. Only the addresses in those short posting lists, and
+        of a compatible trigram count, are scored.
+        '''
+
+        trigrams = self.get_trigrams(address)
+        trigram_count = len(trigrams)
+        postings = [self.posting_ids[self.posting_starts[trigram]:self.posting_starts[trigram + 1]] for trigram in trigrams]
+        postings = sorted((ids for ids in postings if len(ids) > 0), key=len)
+
+        min_shared = math.ceil(self.min_similarity * trigram_count)
+        if (min_shared == 0) or (len(postings) < min_shared):
+            return None
+
+        candidate_ids = np.sort(np.concatenate(postings[:len(postings) - min_shared + 1]))
+        candidate_ids = candidate_ids[np.append(True, candidate_ids[1:] != candidate_ids[:-1])]
+        candidate_counts = self.trigram_counts[candidate_ids]
+        is_compatible = (candidate_counts >= self.min_similarity * trigram_count) & (candidate_counts * self.min_similarity <= trigram_count)
+        candidate_ids = candidate_ids[is_compatible]
+
+        # posting lists are sorted, count the candidates found in each and drop those that can't reach
+        # min_shared with the posting lists left
+        shared_counts = np.zeros(len(candidate_ids), dtype=np.int32)
+        for i, ids in enumerate(postings):
+            if len(candidate_ids) == 0:
+                return None
+
+            positions = np.minimum(np.searchsorted(ids, candidate_ids), len(ids) - 1)
+            shared_counts += ids[positions] == candidate_ids
+
+            is_possible = shared_counts + (len(postings) - i - 1) >= min_shared
+            candidate_ids = candidate_ids[is_possible]
+            shared_counts = shared_counts[is_possible]
+
+        if len(candidate_ids) == 0:
+            return None
+
+        similarities = shared_counts / (trigram_count + self.trigram_counts[candidate_ids] - shared_counts)
+
+        best = np.argmax(similarities)
+        if similarities[best] < self.min_similarity:
+            return None
+
+        return int(candidate_ids[best])
+
+    def lookup(self, address: str) -> list[dict]:
+        '''
+        Return the result rows of the indexed address matching address, or None if there isn't a match
+
+        Only exact matches are returned unless the index was created with approximate on, then the closest
+        prefix or fuzzy match is returned, see the match_type and matched_address of the rows.
+
+        args:
+            address (str): address text
+        '''
+
+        address_normalised = self.normalise(address)
+
+        address_id = self.address_ids.get(address_normalised)
+        if address_id is not None:
+            self.exact_hits += 1
+            return self.get_rows(address_id, address, self.EXACT)
+
+        if self.approximate:
+            address_id = self.find_prefix(address_normalised)
+            if address_id is not None:
+                self.prefix_hits += 1
+                return self.get_rows(address_id, address, self.PREFIX)
+
+            address_id = self.find_similar(address_normalised)
+            if address_id is not None:
+                self.fuzzy_hits += 1
+                return self.get_rows(address_id, address, self.FUZZY)
+
+        self.misses += 1
+        return None
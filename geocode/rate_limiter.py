@@ -0,0 +1,180 @@
+import asyncio
+from email.utils import parsedate_to_datetime
+import threading
+import time
+
+class RateLimiter:
+    '''
+    Token bucket rate limiter shared by all of the threads (or coroutines) calling a service provider
+
+    Tokens are added at requests_per_second up to burst_size, each request takes one token. When the
+    provider throttles (HTTP 429) or fails (5xx) every caller is paused, for the Retry-After time if the
+    provider sent one and otherwise for an exponentially growing back off, and the rate is halved. The
+    rate then recovers additively with each successful request up to the configured rate.
+    '''
+
+    DEFAULT_BURST_SIZE = 1
+
+    INITIAL_BACKOFF_SECONDS = 1
+    MAX_BACKOFF_SECONDS = 60
+
+    # minimum rate as a fraction of the configured rate after repeated throttling
+    MIN_RATE_FRACTION = 0.1
+    # fraction of the configured rate recovered after each successful request
+    RATE_RECOVERY_FRACTION = 0.05
+
+    def __init__(self, requests_per_second: float, burst_size: int = None):
+        if requests_per_second <= 0:
+            raise ValueError(f'requests_per_second must be positive ({requests_per_second}).')
+
+        self.max_rate = requests_per_second
+        self.rate = requests_per_second
+
+        if burst_size is None:
+            self.burst_size = self.DEFAULT_BURST_SIZE
+        else:
+            self.burst_size = burst_size
+
+        self.tokens = self.burst_size
+        self.last_refill_time = time.monotonic()
+        self.paused_until = 0.0
+        self.backoff_seconds = self.INITIAL_BACKOFF_SECONDS
+
+        self.request_count = 0
+        self.throttle_count = 0
+        self.lock = threading.Lock()
+
+    def refill(self, now: float):
+        '''
+        Add the tokens earned since the last refill, the caller must hold self.lock
+        '''
+
+        if now > self.last_refill_time:
+            self.tokens = min(self.burst_size, self.tokens + (now - self.last_refill_time) * self.rate)
+            self.last_refill_time = now
+
+    def try_acquire(self) -> float:
+        '''
+        Take a token if one is available, otherwise return the number of seconds to wait before trying again
+        '''
+
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+
+            if now < self.paused_until:
+                return self.paused_until - now
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                self.request_count += 1
+                return 0.0
+            else:
+                return (1 - self.tokens) / self.rate
+
+    def get_wait_seconds(self) -> float:
+        '''
+        Seconds until a token is available, without taking it
+        '''
+
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+
+            if now < self.paused_until:
+                return self.paused_until - now
+
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self, timeout_seconds: float = None) -> bool:
+        '''
+        Block until a request can be sent, returns False without waiting if that would take longer than
+        timeout_seconds
+
+        args:
+            timeout_seconds (float): longest wait, None to wait as long as needed
+        '''
+
+        deadline = None if timeout_seconds is None else time.monotonic() + timeout_seconds
+
+        wait_seconds = self.try_acquire()
+        while wait_seconds > 0:
+            if (deadline is not None) and (time.monotonic() + wait_seconds > deadline):
+                return False
+
+            time.sleep(wait_seconds)
+            wait_seconds = self.try_acquire()
+
+        return True
+
+    async def acquire_async(self, timeout_seconds: float = None) -> bool:
+        '''
+        Async version of acquire, waits without blocking the event loop
+        '''
+
+        deadline = None if timeout_seconds is None else time.monotonic() + timeout_seconds
+
+        wait_seconds = self.try_acquire()
+        while wait_seconds > 0:
+            if (deadline is not None) and (time.monotonic() + wait_seconds > deadline):
+                return False
+
+            await asyncio.sleep(wait_seconds)
+            wait_seconds = self.try_acquire()
+
+        return True
+
+    def on_success(self):
+        '''
+        Record a successful request, recovering the rate and resetting the back off
+        '''
+
+        with self.lock:
+            self.backoff_seconds = self.INITIAL_BACKOFF_SECONDS
+            self.rate = min(self.max_rate, self.rate + self.RATE_RECOVERY_FRACTION * self.max_rate)
+
+    def on_throttled(self, retry_after: str = None):
+        '''
+        Record a throttled or failed request, pausing all callers and reducing the rate
+
+        args:
+            retry_after (str): value of the Retry-After header, seconds or an HTTP date
+        '''
+
+        pause_seconds = parse_retry_after(retry_after)
+
+        with self.lock:
+            self.throttle_count += 1
+            if pause_seconds is None:
+                pause_seconds = self.backoff_seconds
+                self.backoff_seconds = min(self.MAX_BACKOFF_SECONDS, 2 * self.backoff_seconds)
+
+            now = time.monotonic()
+            self.refill(now)
+            # requests in flight when the pause started fail together, only reduce the rate once for them
+            if now >= self.paused_until:
+                self.rate = max(self.MIN_RATE_FRACTION * self.max_rate, self.rate / 2)
+            self.paused_until = max(self.paused_until, now + pause_seconds)
+            # no burst when the pause ends
+            self.tokens = 0
+            self.last_refill_time = self.paused_until
+
+def parse_retry_after(retry_after: str) -> float:
+    '''
+    Convert a Retry-After header value to seconds, returns None if the value is missing or invalid
+
+    args:
+        retry_after (str): delay in seconds or an HTTP date
+    '''
+
+    if retry_after is None:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
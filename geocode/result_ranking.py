@@ -0,0 +1,124 @@
+import numpy as np
+
+import pandas as pd
+
+# lower is better, a result's type priority is used when its type is listed, otherwise its class priority
+# (0 when neither is listed), so broad areas and roads rank below the places they contain
+DEFAULT_CLASS_PRIORITIES = {
+    'boundary': 2,
+    'landuse': 2,
+    'natural': 2,
+    'highway': 1,
+    'railway': 1,
+}
+
+DEFAULT_TYPE_PRIORITIES = {
+    'administrative': 2,
+    'postcode': 2,
+    'country': 2,
+    'region': 2,
+}
+
+def to_number(values: pd.Series, dtype: str) -> pd.Series:
+    '''
+    Convert a column to a numeric dtype, values that aren't numbers become missing
+    '''
+
+    try:
+        # a direct cast is much faster when every value parses
+        return values.astype(dtype)
+    except (TypeError, ValueError):
+        return pd.to_numeric(values, errors='coerce').astype(dtype)
+
+def to_columnar(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Convert geocoder result rows (strings as returned by the providers) to compact column types, numeric
+    lat/long and ids, categorical class and type
+
+    args:
+        df (pd.DataFrame): geocoder results
+    '''
+
+    df = df.copy()
+
+    for column_name in ['lat', 'long', 'importance']:
+        if column_name in df.columns:
+            df[column_name] = to_number(df[column_name], 'float64')
+
+    for column_name in ['place_id', 'osm_id']:
+        if column_name in df.columns:
+            df[column_name] = to_number(df[column_name], 'Int64')
+
+    for column_name in ['class', 'type']:
+        if column_name in df.columns:
+            df[column_name] = df[column_name].astype('category')
+
+    return df
+
+def get_priorities(values: pd.Series, priorities: dict) -> np.ndarray:
+    '''
+    Look up the priority of each value of a categorical column, nan when it isn't listed
+    '''
+
+    categories = values.cat.categories
+    category_priorities = np.array([priorities.get(category, np.nan) for category in categories] + [np.nan], dtype=np.float64)
+
+    # missing values have code -1, the trailing nan
+    return category_priorities[values.cat.codes.to_numpy()]
+
+def rank_results(df: pd.DataFrame, top_k: int = 1, bounding_box: tuple[float, float, float, float] = None, group_column_name: str = None, class_priorities: dict = None, type_priorities: dict = None) -> pd.DataFrame:
+    '''
+    Keep the top_k candidates of each address, ranked by class/type priority, then importance, then the
+    provider's own order
+
+    Returns the kept rows in compact column types (see to_columnar) with a rank column (1 is best)
+
+    args:
+        df (pd.DataFrame): geocoder results, every candidate of an address
+        top_k (int): candidates kept per address
+        bounding_box (tuple): (south, north, west, east) in degrees, candidates outside are dropped
+        group_column_name (str): column identifying the address, address_original when present
+        class_priorities (dict): class -> priority, lower is better
+        type_priorities (dict): type -> priority, lower is better, overrides the class priority
+    '''
+
+    if group_column_name is None:
+        group_column_name = 'address_original' if 'address_original' in df.columns else 'address'
+
+    if class_priorities is None:
+        class_priorities = DEFAULT_CLASS_PRIORITIES
+
+    if type_priorities is None:
+        type_priorities = DEFAULT_TYPE_PRIORITIES
+
+    df = to_columnar(df).reset_index(drop=True)
+
+    if bounding_box is not None:
+        south, north, west, east = bounding_box
+        is_inside_long = (df['long'] >= west) & (df['long'] <= east) if west <= east else (df['long'] >= west) | (df['long'] <= east)
+        df = df[(df['lat'] >= south) & (df['lat'] <= north) & is_inside_long]
+
+    # addresses as integer codes in order of first appearance, grouping and sorting on them is much faster
+    # than on the address text
+    groups = pd.factorize(df[group_column_name])[0]
+
+    # rows of an address are in the provider's order
+    provider_order = df.groupby(groups, sort=False).cumcount().to_numpy()
+
+    priority = get_priorities(df['type'], type_priorities)
+    priority = np.where(np.isnan(priority), get_priorities(df['class'], class_priorities), priority)
+    priority = np.nan_to_num(priority, nan=0)
+
+    importance = df['importance'].to_numpy(dtype=np.float64, na_value=np.nan) if 'importance' in df.columns else np.full(len(df), np.nan)
+    importance = np.nan_to_num(importance, nan=-np.inf)
+
+    # last key is the primary sort key
+    order = np.lexsort((provider_order, -importance, priority, groups))
+    df = df.iloc[order]
+    ranks = df.groupby(groups[order], sort=False).cumcount().to_numpy() + 1
+
+    is_kept = ranks <= top_k
+    df = df[is_kept]
+    df.insert(df.columns.get_loc(group_column_name) + 1, 'rank', ranks[is_kept].astype(np.int32))
+
+    return df.reset_index(drop=True)
@@ -0,0 +1,313 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat_1: np.ndarray, long_1: np.ndarray, lat_2: np.ndarray, long_2: np.ndarray) -> np.ndarray:
+    '''
+    Great circle distance in km between arrays of points given in degrees
+    '''
+
+    lat_1, long_1, lat_2, long_2 = (np.radians(values) for values in (lat_1, long_1, lat_2, long_2))
+    a = np.sin((lat_2 - lat_1) / 2) ** 2 + np.cos(lat_1) * np.cos(lat_2) * np.sin((long_2 - long_1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+class SpatialIndex:
+    '''
+    Spatial index of geocoded points for nearest place and within radius queries
+
+    Points are bucketed in a grid of cell_degrees x cell_degrees cells and stored sorted by cell key
+    (lat cell * long cell count + long cell), so the cells of a grid row within a longitude range are one
+    contiguous run of points found with searchsorted. Queries take arrays of points and are vectorised over
+    the whole batch, distances are haversine distances in km.
+
+    The index is only a few flat arrays, save writes them as .npy files and load memory maps them, so a
+    saved index is opened without being rebuilt or read into memory.
+    '''
+
+    DEFAULT_CELL_DEGREES = 0.1
+
+    # candidate points compared at once, bounds the memory used by a query batch
+    MAX_CANDIDATES = 5_000_000
+
+    FILE_NAMES = ['keys', 'lat', 'long', 'row_ids']
+
+    def __init__(self, lat: np.ndarray, long: np.ndarray, row_ids: np.ndarray = None, cell_degrees: float = None):
+        '''
+        args:
+            lat (np.ndarray): point latitudes in degrees
+            long (np.ndarray): point longitudes in degrees
+            row_ids (np.ndarray): id returned for each point, defaults to the point's position
+            cell_degrees (float): size of the grid cells, about the typical query radius works best
+        '''
+
+        if cell_degrees is None:
+            self.cell_degrees = self.DEFAULT_CELL_DEGREES
+        else:
+            self.cell_degrees = cell_degrees
+
+        lat = np.asarray(lat, dtype=np.float64)
+        long = np.asarray(long, dtype=np.float64)
+
+        if row_ids is None:
+            row_ids = np.arange(len(lat), dtype=np.int64)
+        else:
+            row_ids = np.asarray(row_ids, dtype=np.int64)
+
+        keys = self.get_keys(lat, long)
+        order = np.argsort(keys, kind='stable')
+
+        self.keys = keys[order]
+        self.lat = lat[order]
+        self.long = long[order]
+        self.row_ids = row_ids[order]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def lat_cell_count(self) -> int:
+        return int(np.ceil(180 / self.cell_degrees))
+
+    @property
+    def long_cell_count(self) -> int:
+        return int(np.ceil(360 / self.cell_degrees))
+
+    def get_lat_cells(self, lat: np.ndarray) -> np.ndarray:
+        return np.clip(np.floor((lat + 90) / self.cell_degrees), 0, self.lat_cell_count - 1).astype(np.int64)
+
+    def get_keys(self, lat: np.ndarray, long: np.ndarray) -> np.ndarray:
+        long_cells = np.floor((long + 180) / self.cell_degrees).astype(np.int64) % self.long_cell_count
+
+        return self.get_lat_cells(lat) * self.long_cell_count + long_cells
+
+    @classmethod
+    def from_data_frame(cls, df: pd.DataFrame, lat_column_name: str = 'lat', long_column_name: str = 'long', cell_degrees: float = None):
+        '''
+        Build the index from geocoder output, the row ids returned by queries are positions in df and rows
+        without a position are left out
+
+        args:
+            df (pd.DataFrame): geocoder results
+            lat_column_name (str): name of latitude column
+            long_column_name (str): name of longitude column
+            cell_degrees (float): size of the grid cells
+        '''
+
+        lat = pd.to_numeric(df[lat_column_name], errors='coerce').to_numpy(dtype=np.float64)
+        long = pd.to_numeric(df[long_column_name], errors='coerce').to_numpy(dtype=np.float64)
+        is_valid = ~(np.isnan(lat) | np.isnan(long))
+
+        return cls(lat[is_valid], long[is_valid], np.flatnonzero(is_valid), cell_degrees)
+
+    def save(self, directory: str):
+        '''
+        Write the index arrays to a directory, see load
+
+        args:
+            directory (str): path of the index directory, created if needed
+        '''
+
+        os.makedirs(directory, exist_ok=True)
+        for name in self.FILE_NAMES:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump({'cell_degrees': self.cell_degrees, 'point_count': len(self)}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        '''
+        Open an index written by save
+
+        args:
+            directory (str): path of the index directory
+            mmap (bool): memory map the arrays rather than reading them into memory
+        '''
+
+        with open(os.path.join(directory, 'index.json')) as f:
+            meta = json.load(f)
+
+        index = cls.__new__(cls)
+        index.cell_degrees = meta['cell_degrees']
+        for name in cls.FILE_NAMES:
+            setattr(index, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None))
+
+        return index
+
+    def get_candidate_ranges(self, lat: np.ndarray, long: np.ndarray, radius_km: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Return the runs of points that can be within radius_km of each query point, as the query of each
+        run and its start and end positions
+
+        Each query covers the grid rows of its latitude range, and in each row one longitude range (two
+        when it wraps around the antimeridian, every cell when the circle reaches a pole).
+        '''
+
+        angles = np.minimum(np.asarray(radius_km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi) * np.ones(len(lat))
+        lat_radians = np.radians(lat)
+
+        lat_min = np.degrees(lat_radians - angles)
+        lat_max = np.degrees(lat_radians + angles)
+
+        # widest longitude of a circle of the angular radius that stays clear of the poles
+        with np.errstate(divide='ignore', invalid='ignore'):
+            long_angles = np.degrees(np.arcsin(np.clip(np.sin(angles) / np.cos(lat_radians), -1, 1)))
+
+        long_cell_count = self.long_cell_count
+        long_min_cells = np.floor((long - long_angles + 180) / self.cell_degrees).astype(np.int64)
+        long_max_cells = np.floor((long + long_angles + 180) / self.cell_degrees).astype(np.int64)
+
+        is_full = (lat_min <= -90) | (lat_max >= 90) | (angles >= np.pi / 2) | (long_max_cells - long_min_cells + 1 >= long_cell_count)
+
+        # split a wrapping range into [min, last cell] and [first cell, max]
+        long_min_cells = long_min_cells % long_cell_count
+        long_max_cells = long_max_cells % long_cell_count
+        is_wrapped = ~is_full & (long_max_cells < long_min_cells)
+
+        ranges_1 = (np.where(is_full, 0, long_min_cells), np.where(is_full | is_wrapped, long_cell_count - 1, long_max_cells))
+        ranges_2 = (np.zeros(len(lat), dtype=np.int64), np.where(is_wrapped, long_max_cells, -1))
+
+        # one entry per (query, grid row)
+        lat_min_cells = self.get_lat_cells(np.maximum(lat_min, -90))
+        row_counts = self.get_lat_cells(np.minimum(lat_max, 90)) - lat_min_cells + 1
+        row_queries = np.repeat(np.arange(len(lat)), row_counts)
+        row_starts = np.cumsum(row_counts) - row_counts
+        rows = lat_min_cells[row_queries] + np.arange(len(row_queries)) - row_starts[row_queries]
+
+        starts = []
+        ends = []
+        for long_min_cells_, long_max_cells_ in [ranges_1, ranges_2]:
+            row_keys = rows * long_cell_count
+            start = np.searchsorted(self.keys, row_keys + long_min_cells_[row_queries], side='left')
+            end = np.searchsorted(self.keys, row_keys + long_max_cells_[row_queries], side='right')
+            starts.append(start)
+            ends.append(np.maximum(start, end))
+
+        return np.concatenate([row_queries, row_queries]), np.concatenate(starts), np.concatenate(ends)
+
+    def iter_candidates(self, lat: np.ndarray, long: np.ndarray, radius_km: np.ndarray):
+        '''
+        Yield (query, point position, distance in km) arrays of the points within radius_km of the query
+        points, a batch of at most about MAX_CANDIDATES candidates at a time
+
+        Query points without a finite position (e.g. failed geocodes) have no candidates.
+        '''
+
+        lat = np.asarray(lat, dtype=np.float64)
+        long = np.asarray(long, dtype=np.float64)
+        radius_km = np.asarray(radius_km, dtype=np.float64) * np.ones(len(lat))
+
+        finite_queries = np.flatnonzero(np.isfinite(lat) & np.isfinite(long))
+        queries, starts, ends = self.get_candidate_ranges(lat[finite_queries], long[finite_queries], radius_km[finite_queries])
+        queries = finite_queries[queries]
+        counts = ends - starts
+        queries, starts, counts = queries[counts > 0], starts[counts > 0], counts[counts > 0]
+
+        batches = (np.cumsum(counts) - counts) // self.MAX_CANDIDATES
+        batch_starts = np.flatnonzero(np.append(True, batches[1:] != batches[:-1]))
+        for batch_start, batch_end in zip(batch_starts, np.append(batch_starts[1:], len(batches))):
+            batch_counts = counts[batch_start:batch_end]
+            offsets = np.cumsum(batch_counts) - batch_counts
+
+            candidate_queries = np.repeat(queries[batch_start:batch_end], batch_counts)
+            positions = np.repeat(starts[batch_start:batch_end] - offsets, batch_counts) + np.arange(batch_counts.sum())
+
+            distances = haversine_km(lat[candidate_queries], long[candidate_queries], self.lat[positions], self.long[positions])
+            is_inside = distances <= radius_km[candidate_queries]
+
+            yield candidate_queries[is_inside], positions[is_inside], distances[is_inside]
+
+    def query_radius(self, lat: np.ndarray, long: np.ndarray, radius_km) -> pd.DataFrame:
+        '''
+        Find every point within radius_km of each query point
+
+        Returns a data frame of query (position in lat and long), row_id and distance_km, sorted by query
+        then distance
+
+        args:
+            lat (np.ndarray): query latitudes in degrees
+            long (np.ndarray): query longitudes in degrees
+            radius_km (float or np.ndarray): search radius, one for all queries or one per query
+        '''
+
+        queries = []
+        row_ids = []
+        distances = []
+        for candidate_queries, positions, candidate_distances in self.iter_candidates(lat, long, radius_km):
+            queries.append(candidate_queries)
+            row_ids.append(self.row_ids[positions])
+            distances.append(candidate_distances)
+
+        if queries == []:
+            return pd.DataFrame({'query': np.empty(0, dtype=np.int64), 'row_id': np.empty(0, dtype=np.int64), 'distance_km': np.empty(0)})
+
+        result_df = pd.DataFrame({'query': np.concatenate(queries), 'row_id': np.concatenate(row_ids), 'distance_km': np.concatenate(distances)})
+
+        return result_df.sort_values(['query', 'distance_km'], ignore_index=True)
+
+    def query_nearest(self, lat: np.ndarray, long: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Find the nearest point to each query point
+
+        Searches a radius of one cell, then doubles it for the queries with nothing inside until every
+        query has a point. The nearest point inside the radius is the nearest overall.
+
+        Returns the row ids and distances in km of the nearest points (-1 and inf for an empty index, -1 and
+        nan for a query without a finite position, e.g. a failed geocode)
+
+        args:
+            lat (np.ndarray): query latitudes in degrees
+            long (np.ndarray): query longitudes in degrees
+        '''
+
+        lat = np.asarray(lat, dtype=np.float64)
+        long = np.asarray(long, dtype=np.float64)
+
+        is_finite = np.isfinite(lat) & np.isfinite(long)
+
+        best_positions = np.full(len(lat), -1, dtype=np.int64)
+        best_distances = np.where(is_finite, np.inf, np.nan)
+        if len(self) == 0:
+            return best_positions, best_distances
+
+        unresolved = np.flatnonzero(is_finite)
+        radius_km = np.radians(self.cell_degrees) * EARTH_RADIUS_KM
+        while len(unresolved) > 0:
+            for candidate_queries, positions, distances in self.iter_candidates(lat[unresolved], long[unresolved], radius_km):
+                # every candidate of the batch can be outside the radius
+                if len(candidate_queries) == 0:
+                    continue
+
+                # closest candidate of each query in this batch
+                order = np.lexsort((distances, candidate_queries))
+                is_first = np.append(True, candidate_queries[order][1:] != candidate_queries[order][:-1])
+                first = order[is_first]
+
+                queries = unresolved[candidate_queries[first]]
+                is_closer = distances[first] < best_distances[queries]
+                best_positions[queries[is_closer]] = positions[first][is_closer]
+                best_distances[queries[is_closer]] = distances[first][is_closer]
+
+            unresolved = unresolved[best_positions[unresolved] < 0]
+            radius_km *= 2
+
+        return np.where(is_finite, self.row_ids[best_positions], -1), best_distances
+
+if __name__ == '__main__':
+    # python spatial_index.py geocoded_addresses.csv index_directory [cell_degrees]
+    if len(sys.argv) < 3:
+        print('usage: python spatial_index.py geocoded_file_path index_directory [cell_degrees]')
+        sys.exit(1)
+
+    cell_degrees = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    index = SpatialIndex.from_data_frame(pd.read_csv(sys.argv[1], encoding_errors='replace'), cell_degrees=cell_degrees)
+    index.save(sys.argv[2])
+
+    print(f'indexed {len(index):,} points from {sys.argv[1]} in {sys.argv[2]}.')
@@ -0,0 +1,350 @@
+"""
+Headless indexing pipeline: load -> coerce -> choose transformations -> normalise -> score -> rank
+
+The Visual Indexer page runs the same pipeline (columnar_data.compact_columns, then utils.index_columns)
+interactively, this module runs it without streamlit so files can be indexed in batches from the command
+line:
+
+    python indexer.py input_path settings.json [-o output_dir] [-f parquet|csv] [-w max_workers]
+
+input_path is a csv/xlsx/parquet/feather file or a directory of them. The settings json can contain any of:
+
+    {
+        "weights": {"column name": 100},
+        "polarities": {"column name": "lower is better"},
+        "transformations": {"column name": "log"},
+        "use_column": {"column name": false},
+        "selection_policy": "lowest skew",
+        "precision": "float64",
+        "sheet_name": "Sheet1",
+        "row_number": 1,
+        "column_number": 1
+    }
+
+Columns missing from the settings use DEFAULT_WEIGHT, DEFAULT_POLARITY and the automatically selected
+transformation. precision is a key of columnar_data.FLOAT_DTYPES, by default values are stored as float32
+when no value changes, as in the Visual Indexer.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from columnar_data import compact_columns, FLOAT_DTYPES
+from utils import (
+    ARROW_FILE_EXTENSIONS,
+    calculate_matrix_statistics,
+    choose_transformations,
+    DEFAULT_SELECTION_POLICY,
+    index_columns,
+    POLARITY_OPTIONS,
+    read_arrow_file,
+    read_csv_file,
+    read_excel_sheet,
+    read_workbook_metadata,
+    SELECTION_POLICIES,
+    TRANSFORMATIONS,
+    VALID_FILE_EXTENSIONS
+)
+
+DEFAULT_WEIGHT = 100
+DEFAULT_POLARITY = POLARITY_OPTIONS[0]
+
+OUTPUT_FORMATS = ["parquet", "csv"]
+DEFAULT_OUTPUT_FORMAT = "parquet"
+OUTPUT_FILE_POSTFIX = "_index"
+
+OUTPUT_MIME_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv"
+}
+
+# rows of the index converted and written at a time
+OUTPUT_CHUNK_ROW_COUNT = 100_000
+
+DEFAULT_MAX_WORKERS = mp.cpu_count()
+
+def load_settings(file_path: str) -> dict:
+    """
+    Load and validate an index settings json file
+
+        Parameters:
+            file_path (str): path of the settings file
+
+        Returns:
+            settings (dict)
+    """
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        settings = json.load(f)
+
+    for column_name, polarity in settings.get("polarities", {}).items():
+        if polarity not in POLARITY_OPTIONS:
+            raise ValueError(f"Unsupported polarity '{polarity}' for column '{column_name}', use one of {POLARITY_OPTIONS}.")
+
+    for column_name, transformation in settings.get("transformations", {}).items():
+        if transformation not in TRANSFORMATIONS:
+            raise ValueError(f"Unsupported transformation '{transformation}' for column '{column_name}', use one of {list(TRANSFORMATIONS.keys())}.")
+
+    selection_policy = settings.get("selection_policy", DEFAULT_SELECTION_POLICY)
+    if selection_policy not in SELECTION_POLICIES:
+        raise ValueError(f"Unsupported selection policy '{selection_policy}', use one of {list(SELECTION_POLICIES.keys())}.")
+
+    precision = settings.get("precision")
+    if (precision is not None) and (precision not in FLOAT_DTYPES):
+        raise ValueError(f"Unsupported precision '{precision}', use one of {list(FLOAT_DTYPES.keys())}.")
+
+    return settings
+
+def load_data_file(file_path: str, sheet_name: str = None, row_number: int = 1, column_number: int = 1) -> pd.DataFrame:
+    """
+    Load a csv, xlsx, parquet or feather file from disk, parquet and feather files are memory mapped
+
+        Parameters:
+            file_path (str)
+            sheet_name (str): excel worksheet, defaults to the first worksheet
+            row_number (int): excel row holding the column names
+            column_number (int): first excel column to read
+
+        Returns:
+            data_df (pd.DataFrame)
+    """
+
+    file_extention = file_path.split(".")[-1].lower()
+    if file_extention not in VALID_FILE_EXTENSIONS:
+        raise ValueError(f"Unsupported file type '{file_extention}' ({file_path}).")
+
+    if file_extention in ARROW_FILE_EXTENSIONS:
+        return read_arrow_file(file_path, file_extention)
+
+    with open(file_path, "rb") as f:
+        if file_extention == "csv":
+            return read_csv_file(f)
+
+        if sheet_name is None:
+            sheet_name = list(read_workbook_metadata(f).keys())[0]
+
+        return read_excel_sheet(f, sheet_name, row_number, column_number)
+
+def build_index(data_df: pd.DataFrame, settings: dict) -> tuple[pd.DataFrame, dict]:
+    """
+    Run the indexing pipeline on loaded data
+
+        Parameters:
+            data_df (pd.DataFrame): label column followed by data columns
+            settings (dict): see the module docstring
+
+        Returns:
+            index_df (pd.DataFrame): label column, cell scores, score and rank
+            summary (dict): usable and unusable columns and the transformation, weight and polarity used
+                            for each column in the index
+    """
+
+    columnar_data, usable_columns, unusable_columns, _ = compact_columns(data_df, settings.get("precision"))
+
+    statistics_df = calculate_matrix_statistics(columnar_data.columns, usable_columns)
+    selection_policy = SELECTION_POLICIES[settings.get("selection_policy", DEFAULT_SELECTION_POLICY)]
+    transformations_to_use = choose_transformations(statistics_df, selection_policy)
+    transformations_to_use.update({
+        column_name: transformation
+        for column_name, transformation in settings.get("transformations", {}).items()
+        if column_name in transformations_to_use
+    })
+
+    use_column = settings.get("use_column", {})
+    columns_to_use = [column_name for column_name in usable_columns if use_column.get(column_name, True)]
+    if columns_to_use == []:
+        raise ValueError(f"No usable columns to index, could not use: {unusable_columns}.")
+
+    weights = {column_name: settings.get("weights", {}).get(column_name, DEFAULT_WEIGHT) for column_name in columns_to_use}
+    polarities = {column_name: settings.get("polarities", {}).get(column_name, DEFAULT_POLARITY) for column_name in columns_to_use}
+    transformations_selected = {column_name: transformations_to_use[column_name] for column_name in columns_to_use}
+
+    index_df = index_columns(columnar_data, transformations_selected, weights, polarities)
+
+    summary = {
+        "usable_columns": usable_columns,
+        "unusable_columns": unusable_columns,
+        "transformations": transformations_selected,
+        "weights": weights,
+        "polarities": polarities
+    }
+
+    return index_df, summary
+
+def write_index(index_df: pd.DataFrame, file_object, output_format: str = DEFAULT_OUTPUT_FORMAT, chunk_row_count: int = OUTPUT_CHUNK_ROW_COUNT):
+    """
+    Write an index data frame as parquet or csv, chunk_row_count rows at a time
+
+    Only one chunk is converted at a time, so the whole index is never held as one csv string or arrow table.
+
+        Parameters:
+            index_df (pd.DataFrame): output of build_index or utils.rescore_index
+            file_object (file-like): binary file object
+            output_format (str): one of OUTPUT_FORMATS
+            chunk_row_count (int): rows written at a time, one parquet row group per chunk
+    """
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format '{output_format}', use one of {OUTPUT_FORMATS}.")
+
+    # parquet columns need a single type, excel label columns can mix numbers and text, categorical labels
+    # are written as their values rather than repeating every category in each row group
+    label_column_name = index_df.columns[0]
+    label_column = index_df[label_column_name]
+    if isinstance(label_column.dtype, pd.CategoricalDtype):
+        label_dtype = str if label_column.cat.categories.dtype == object else label_column.cat.categories.dtype
+    elif label_column.dtype == object:
+        label_dtype = str
+    else:
+        label_dtype = label_column.dtype
+
+    writer = None
+    for start in range(0, max(1, len(index_df)), chunk_row_count):
+        chunk = index_df.iloc[start:start + chunk_row_count].astype({label_column_name: label_dtype})
+
+        if output_format == "parquet":
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(file_object, table.schema)
+
+            writer.write_table(table.cast(writer.schema))
+        else:
+            file_object.write(chunk.to_csv(index=False, header=start == 0).encode("utf-8"))
+
+    if writer is not None:
+        writer.close()
+
+def save_index(index_df: pd.DataFrame, file_path: str, output_format: str = DEFAULT_OUTPUT_FORMAT):
+    """
+    Save an index data frame as parquet (needs pyarrow) or csv
+    """
+
+    with open(file_path, "wb") as f:
+        write_index(index_df, f, output_format)
+
+def index_file(file_path: str, settings: dict, output_dir: str, output_format: str = DEFAULT_OUTPUT_FORMAT) -> str:
+    """
+    Load, index and save a single file
+
+        Parameters:
+            file_path (str): csv, xlsx, parquet or feather file
+            settings (dict): see the module docstring
+            output_dir (str): directory the index is saved to
+            output_format (str): one of OUTPUT_FORMATS
+
+        Returns:
+            output_file_path (str)
+    """
+
+    data_df = load_data_file(
+        file_path,
+        sheet_name=settings.get("sheet_name"),
+        row_number=settings.get("row_number", 1),
+        column_number=settings.get("column_number", 1)
+    )
+    index_df, _ = build_index(data_df, settings)
+
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+    output_file_path = os.path.join(output_dir, f"{file_name}{OUTPUT_FILE_POSTFIX}.{output_format}")
+    save_index(index_df, output_file_path, output_format)
+
+    return output_file_path
+
+def find_data_files(input_path: str) -> list[str]:
+    """
+    Return input_path if it is a file, otherwise the csv, xlsx, parquet and feather files in the input_path
+    directory, skipping index files (named "<name>OUTPUT_FILE_POSTFIX") saved there by an earlier run
+    """
+
+    if os.path.isfile(input_path):
+        return [input_path]
+
+    return sorted(
+        os.path.join(input_path, file_name) for file_name in os.listdir(input_path)
+        if (file_name.split(".")[-1].lower() in VALID_FILE_EXTENSIONS) and not os.path.splitext(file_name)[0].endswith(OUTPUT_FILE_POSTFIX)
+    )
+
+def index_files(file_paths: list[str], settings: dict, output_dir: str, output_format: str = DEFAULT_OUTPUT_FORMAT, max_workers: int = None) -> dict:
+    """
+    Index files in parallel across a process pool, a failing file doesn't stop the others
+
+        Parameters:
+            file_paths (list[str]): csv, xlsx, parquet or feather files
+            settings (dict): see the module docstring
+            output_dir (str): directory the indexes are saved to
+            output_format (str): one of OUTPUT_FORMATS
+            max_workers (int): number of processes, defaults to DEFAULT_MAX_WORKERS
+
+        Returns:
+            results (dict): output file path, or the exception raised, keyed by input file path
+    """
+
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=min(max_workers, max(1, len(file_paths)))) as executor:
+        futures = {
+            executor.submit(index_file, file_path, settings, output_dir, output_format): file_path
+            for file_path in file_paths
+        }
+
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                results[file_path] = future.result()
+                print(f"indexed {file_path} -> {results[file_path]}")
+            except Exception as e:
+                results[file_path] = e
+                print(f"failed to index {file_path}: {e}")
+
+    return results
+
+def process_args(args: list) -> argparse.Namespace:
+    """
+    Process the command line arguments used to call the module
+
+        Parameters:
+            args (list): command line arguments, without the program name
+
+        Returns:
+            args (argparse.Namespace)
+    """
+
+    parser = argparse.ArgumentParser(description="Build indexes for csv/xlsx/parquet/feather files without the streamlit app.")
+    parser.add_argument("input_path", help="csv/xlsx/parquet/feather file or directory of files")
+    parser.add_argument("settings_path", help="index settings json file")
+    parser.add_argument("-o", "--output", dest="output_dir", default=None, help="output directory, defaults to the input directory")
+    parser.add_argument("-f", "--format", dest="output_format", choices=OUTPUT_FORMATS, default=DEFAULT_OUTPUT_FORMAT)
+    parser.add_argument("-w", "--workers", dest="max_workers", type=int, default=DEFAULT_MAX_WORKERS)
+
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+    args = process_args(sys.argv[1:])
+
+    settings = load_settings(args.settings_path)
+    file_paths = find_data_files(args.input_path)
+
+    output_dir = args.output_dir
+    if output_dir is None:
+        output_dir = args.input_path if os.path.isdir(args.input_path) else os.path.dirname(os.path.abspath(args.input_path))
+
+    start_time = time.perf_counter()
+    results = index_files(file_paths, settings, output_dir, args.output_format, args.max_workers)
+    failure_count = sum(isinstance(result, Exception) for result in results.values())
+
+    print(f"indexed {len(results) - failure_count:,} of {len(results):,} file(s) in {time.perf_counter() - start_time:.1f} second(s).")
+
+    if failure_count > 0:
+        sys.exit(1)
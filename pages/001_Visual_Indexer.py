@@ -2,40 +2,120 @@ from io import BytesIO, StringIO
 
 import streamlit as st
 
-import matplotlib.pyplot as plt
-import seaborn as sns
+import plotly.graph_objects as go
 
 import numpy as np
 import pandas as pd
-from scipy.stats import skew, kurtosis
 
+from columnar_data import FLOAT_DTYPES, ColumnarData, compact_columns
+from indexer import DEFAULT_POLARITY, DEFAULT_WEIGHT, OUTPUT_FORMATS, OUTPUT_MIME_TYPES, write_index
+from parallel_columns import ColumnExecutor
+from stage_cache import StageCache, estimate_size, make_cache_key
+from streamlit_utils import load_file
 from utils import (
-    convert_to_float_or_nan,
-    load_file,
     TRANSFORMATIONS,
     USABLE_ROW_COUNT_LIMIT,
-    ORDER_REVERSING_TRANSFORMATIONS,
     POLARITY_OPTIONS,
-    get_column_name_raw,
     get_column_names_raw,
-    MAX_INDEX_CELL_SCORE,
-    MAX_INDEX_ROW_SCORE,
-    create_unique_string
+    apply_transformations,
+    calculate_histogram,
+    calculate_matrix_statistics,
+    STATISTICS_BLOCK_BYTES,
+    HISTOGRAM_BIN_COUNT,
+    JACKKNIFE_GROUP_COUNT,
+    PREVIEW_SAMPLE_ROW_COUNT,
+    sample_row_indexes,
+    choose_transformations,
+    DEFAULT_SELECTION_POLICY,
+    SELECTION_POLICIES,
+    index_columns,
+    normalise_transformed_column
 )
 
-def load_excel_sheet(file_object: dict, sheet_name: str) -> pd.DataFrame:
+# memory budget of the stage cache shared by all sessions
+STAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# number of columns shown on each page of the chart gallery
+CHART_COLUMNS_PER_PAGE = 4
+CHART_HEIGHT = 260
+
+# rows of each table shown on the page, the tables below the index settings are only computed for these rows
+DISPLAY_ROW_COUNT = 1_000
+
+PRECISION_OPTIONS = ["auto"] + list(FLOAT_DTYPES.keys())
+
+# multiple of the standard error shown either side of sampled statistics, a 95% confidence interval
+CONFIDENCE_Z = 1.96
+
+def create_histogram_chart(counts: np.ndarray, bin_edges: np.ndarray, title: str) -> go.Figure:
+    """
+    Plot a precomputed histogram
+
+        Parameters:
+            counts (np.ndarray): number of values in each bin
+            bin_edges (np.ndarray): edges of the bins
+            title (str): chart title
+
+        Returns:
+            fig (go.Figure)
+    """
+
+    fig = go.Figure(go.Bar(x=(bin_edges[:-1] + bin_edges[1:]) / 2, y=counts, width=np.diff(bin_edges), marker_line_width=0))
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=12)),
+        height=CHART_HEIGHT,
+        margin=dict(l=10, r=10, t=60, b=10),
+        bargap=0
+    )
+
+    return fig
+
+def sample_columnar_data(columnar_data: ColumnarData, sample_row_count: int) -> ColumnarData:
+    """
+    Random sample of sample_row_count rows, the same rows every time for the same data
+    """
+
+    return columnar_data.take(sample_row_indexes(len(columnar_data), sample_row_count))
+
+def create_progress_bar(text: str):
     """
-    Return a copy of the specified excel sheet as a pandas DataFrame
+    Create a progress bar that is only shown once work is reported, for the on_progress argument of the
+    parallel column functions
 
         Parameters:
-            file_object (dict): A dict of pd.DataFrames representing excel worksheets
-            sheet_name (str): The name of the excelw worksheet
-        
+            text (str): description of the work
+
         Returns:
-            workhseet (pd.DataFrame): A pandas DataFrame copy of specified sheet
+            placeholder (st.empty): call placeholder.empty() to remove the progress bar when the work is done
+            on_progress (function): takes (completed count, total count)
+    """
+
+    placeholder = st.empty()
+
+    def on_progress(completed_count: int, total_count: int):
+        placeholder.progress(completed_count / total_count, text=f"{text}: {completed_count:,} of {total_count:,}")
+
+    return placeholder, on_progress
+
+def export_index(index_df: pd.DataFrame, output_format: str) -> BytesIO:
+    """
+    Write the index for the download button, called only when the button is clicked
     """
 
-    pass
+    file_object = BytesIO()
+    write_index(index_df, file_object, output_format)
+    file_object.seek(0)
+
+    return file_object
+
+def write_table(data_df: pd.DataFrame, row_count: int):
+    """
+    Show the first DISPLAY_ROW_COUNT rows of a table of row_count rows
+    """
+
+    st.write(data_df.head(DISPLAY_ROW_COUNT))
+    if row_count > DISPLAY_ROW_COUNT:
+        st.caption(f"Showing the first {DISPLAY_ROW_COUNT:,} of {row_count:,} rows.")
 
 if __name__ == "__main__":
     ############### Page config ###############
@@ -44,129 +124,153 @@ if __name__ == "__main__":
         layout='wide'
     )
 
-    @st.cache_data
-    def load_file_(uploaded_file: bytes) -> pd.DataFrame:
+    @st.cache_resource
+    def get_stage_cache() -> StageCache:
         """
-        Wrapper for the load_file function in utils.py
+        Stage cache shared by all sessions, entries are keyed on the content hash of the upload
         """
-        
-        return load_file(uploaded_file)
-    
+
+        return StageCache(max_bytes=STAGE_CACHE_MAX_BYTES)
+
+    @st.cache_resource
+    def get_column_executor() -> ColumnExecutor:
+        """
+        Process pool shared by all sessions for the per-column work on large uploads
+        """
+
+        return ColumnExecutor()
+
+    stage_cache = get_stage_cache()
+    column_executor = get_column_executor()
+    cache_log = []
+
+    def run_stage(stage: str, key: str, function, *args):
+        """
+        Run a pipeline stage through the stage cache and record whether it was reused and its size
+        """
+
+        value, hit = stage_cache.get_or_compute(stage, key, function, *args)
+        size = stage_cache.get_size(stage, key)
+        cache_log.append({"stage": stage, "result": "hit" if hit else "miss", "key": key[:12], "size": estimate_size(value) if size is None else size})
+
+        return value
 
     st.title("Visual Indexer")
 
     ############### File upload ###############
 
-    st.markdown("""---""") 
+    st.markdown("""---""")
     st.subheader("File Upload")
-    uploaded_file = st.file_uploader(label="Upload your **excel** or **csv** file.")
+    uploaded_file = st.file_uploader(label="Upload your **excel**, **csv**, **parquet** or **feather** file.")
+    precision = st.selectbox(label="Value precision", options=PRECISION_OPTIONS, help="auto stores the values as float32 (half the memory of float64) when no value changes.")
 
     with st.spinner("Loading file"):
         data_df_original = load_file(uploaded_file)
-    
+
     if data_df_original is not None:
-        data_df_using = data_df_original.copy()
+        # the label column and usable columns are kept once, compactly, everything below views them
+        coerce_key = make_cache_key(data_df_original.attrs["cache_key"], USABLE_ROW_COUNT_LIMIT, precision)
+        progress_bar, on_progress = create_progress_bar("Converting columns")
+        columnar_data, usable_columns, unusable_columns, coercion_df = run_stage("coerce", coerce_key, compact_columns, data_df_original, None if precision == "auto" else precision, column_executor, on_progress)
+        progress_bar.empty()
+        loaded_size = estimate_size(data_df_original)
+
+        # nothing to chart or score, e.g. an excel sheet read from the wrong row or column
+        if usable_columns == []:
+            st.write(f"No usable columns found, a column needs at least {USABLE_ROW_COUNT_LIMIT:.0%} numeric values. Check the file, or the sheet, row and column it is read from.")
+            st.dataframe(coercion_df, hide_index=True)
+            st.stop()
     else:
-        data_df_using = None
-    
+        columnar_data = None
+
 
     ############### Charting ###############
-    if data_df_using is not None:
+    if columnar_data is not None:
         st.markdown("""---""")
-        st.subheader("Data Transformations")        
-        
-        data_row_count = data_df_using.shape[0]
-
-        with st.spinner("Creating charts"):
-            usable_columns = []
-            unusable_columns = []            
-            for column_name in data_df_using.columns[1:]:
-                data_df_using[column_name] =  data_df_using[column_name].apply(convert_to_float_or_nan)
-
-                # determine whether column contains enought NON-na values
-                if data_df_using[column_name].dropna().shape[0] >= USABLE_ROW_COUNT_LIMIT:
-                    usable_columns.append(column_name)
-                else:
-                    unusable_columns.append(column_name)            
-
-            column_count = len(usable_columns)
-            row_count = len(TRANSFORMATIONS.keys())
-
-            progress_text = "Applying Transformations for Charts"
-            progress_bar = st.progress(0, text=progress_text)
-
-            fig, ax = plt.subplots(nrows=row_count, ncols=column_count, figsize=(50, 50))
-            
-            axes = ax.ravel()
-            ax_num = 0
-            skews = {}
-            kurts = {}
-            for i, column_name in enumerate(usable_columns):
-                progress_bar.progress((i + 1) / len(usable_columns), text=progress_text)
-                column_data = data_df_using[column_name].dropna().astype(float)
-
-                skews[column_name] = []
-                kurts[column_name] = []
-                
-                for k, v in TRANSFORMATIONS.items():
-                    #data_df_using[column].apply(v).hist(ax=axes[ax_num])
-                    data = column_data.apply(v)
-                    data.hist(ax=axes[ax_num])
-
-                    data2 = data.dropna()
-                    skewness_ = skew(data2)
-                    kurtosis_ = kurtosis(data2)
-                    axes[ax_num].set_title(f"{column_name}_{k}\nskew: {skewness_:.3f}, kurtosis: {kurtosis_:.3f}, obs: {len(data):,}, obs used: {len(data2):,}")
-                    ax_num += 1
-
-                    skews[column_name].append(skewness_)
-                    kurts[column_name].append(kurtosis_)
-            
-            plt.tight_layout()
+        st.subheader("Data Transformations")
+
+        # preview mode: statistics, charts and the automated transformation choice use a sample of rows,
+        # the index always uses every row
+        preview_controls = st.columns([0.3, 0.7])
+        use_sample = preview_controls[0].toggle("Preview on a sample", value=True, help="Calculate the statistics and charts from a random sample of rows, the index uses every row.")
+        sample_row_count = preview_controls[1].number_input(label="Sample rows", min_value=1_000, value=PREVIEW_SAMPLE_ROW_COUNT, step=10_000, disabled=not use_sample)
+        is_sampled = use_sample and (len(columnar_data) > sample_row_count)
+
+        with st.spinner("Calculating statistics"):
+            if is_sampled:
+                preview_key = make_cache_key(coerce_key, sample_row_count)
+                preview_data = run_stage("sample", preview_key, sample_columnar_data, columnar_data, sample_row_count)
+                group_count = JACKKNIFE_GROUP_COUNT
+                st.caption(f"Statistics and charts use a random sample of {len(preview_data):,} of {len(columnar_data):,} rows, ± shows 95% confidence intervals.")
+            else:
+                preview_key = coerce_key
+                preview_data = columnar_data
+                group_count = None
+
+            statistics_key = make_cache_key(preview_key, list(TRANSFORMATIONS.keys()), group_count)
+            progress_bar, on_progress = create_progress_bar("Calculating statistics")
+            statistics_df = run_stage("statistics", statistics_key, column_executor.calculate_statistics, preview_data.columns, preview_data.column_names, STATISTICS_BLOCK_BYTES, group_count, on_progress)
+            progress_bar.empty()
 
             if unusable_columns != []:
                 st.write("Could not use the following column(s): " + ", ".join([f"'**{column_name}**'" for column_name in unusable_columns]))
-            
-            st.pyplot(fig)
 
-    if data_df_using is not None:
+            with st.expander("Column types"):
+                st.dataframe(coercion_df, hide_index=True)
+
+        # chart gallery, only the histograms of the columns on show are computed
+        page_count = max(1, int(np.ceil(len(usable_columns) / CHART_COLUMNS_PER_PAGE)))
+
+        gallery_controls = st.columns([0.7, 0.3])
+        chart_columns_selected = gallery_controls[0].multiselect(label="Chart columns", options=usable_columns, placeholder="Choose columns or browse by page")
+        page_number = gallery_controls[1].number_input(label=f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1, step=1, disabled=chart_columns_selected != [])
+
+        if chart_columns_selected != []:
+            chart_columns = chart_columns_selected
+        else:
+            chart_columns = usable_columns[(page_number - 1) * CHART_COLUMNS_PER_PAGE:page_number * CHART_COLUMNS_PER_PAGE]
+
+        statistics = statistics_df.set_index(["column", "transformation"])
+        for column_name in chart_columns:
+            chart_row = st.columns(len(TRANSFORMATIONS))
+            for i, k in enumerate(TRANSFORMATIONS.keys()):
+                histogram_key = make_cache_key(preview_key, column_name, k, HISTOGRAM_BIN_COUNT)
+                counts, bin_edges = run_stage("histogram", histogram_key, calculate_histogram, preview_data.get_column(column_name), k, HISTOGRAM_BIN_COUNT)
+
+                skewness_, kurtosis_, obs, obs_used = statistics.loc[(column_name, k), ["skew", "kurtosis", "obs", "obs_used"]]
+                if is_sampled:
+                    skew_error, kurtosis_error = CONFIDENCE_Z * statistics.loc[(column_name, k), ["skew_error", "kurtosis_error"]]
+                    title = f"{column_name}_{k}<br>skew: {skewness_:.3f} ± {skew_error:.3f}, kurtosis: {kurtosis_:.3f} ± {kurtosis_error:.3f}<br>sample obs: {obs:,}, obs used: {obs_used:,}"
+                else:
+                    title = f"{column_name}_{k}<br>skew: {skewness_:.3f}, kurtosis: {kurtosis_:.3f}<br>obs: {obs:,}, obs used: {obs_used:,}"
+                chart_row[i].plotly_chart(create_histogram_chart(counts, bin_edges, title), width="stretch", key=f"chart_{column_name}_{k}")
+
+    if columnar_data is not None:
         ############### Display raw data ###############
 
         st.write("---")
         st.subheader("Raw Data")
-        
-        st.write(data_df_using)
+
+        # first rows of the stored data, for building the tables shown on the page
+        display_df = columnar_data.head(DISPLAY_ROW_COUNT).to_data_frame()
+        write_table(display_df, len(columnar_data))
 
         ############### Display transformed data ###############
 
         st.write("---")
         st.subheader("Transformed Data (Automated)")
 
-        transformations_to_use = {}
-        for k, v in skews.items():
-            # use transformation with lowest skew
-            transformations_to_use[k] = list(TRANSFORMATIONS.keys())[np.argmin(np.abs(v))]
+        # use transformation with lowest skew by default
+        selection_policy = st.selectbox(label="Transformation selection", options=SELECTION_POLICIES.keys(), index=list(SELECTION_POLICIES.keys()).index(DEFAULT_SELECTION_POLICY))
+        transformations_automated = choose_transformations(statistics_df, SELECTION_POLICIES[selection_policy])
+        transformations_to_use = dict(transformations_automated)
 
-        #st.write(skews)
+        #st.write(statistics_df)
         #st.write(transformations_to_use)
 
-        progress_text = "Applying Transformations for Index"
-        progress_bar = st.progress(0, text=progress_text)
-
-        columns_to_copy = [data_df_using.columns[0]] + usable_columns
-        #st.write(columns_to_copy)
-
-        data_df_using_transformed = data_df_using[columns_to_copy].copy()
+        data_df_using_transformed = apply_transformations(display_df, usable_columns, transformations_automated)
 
-        column_names_transformed = [data_df_using_transformed.columns[0]]
-        for i, column_name in enumerate(data_df_using_transformed.columns[1:]):
-            progress_bar.progress((i + 1)/len(data_df_using_transformed.columns[1:]), text=progress_text)            
-            data_df_using_transformed[column_name] = data_df_using_transformed[column_name].apply(TRANSFORMATIONS[transformations_to_use[column_name]])
-            column_names_transformed.append(f"{column_name}___{transformations_to_use[column_name]}")
-
-        data_df_using_transformed.columns = column_names_transformed
-        
-        st.write(data_df_using_transformed)
+        write_table(data_df_using_transformed, len(columnar_data))
 
         ############### Index Settings ###############
 
@@ -175,10 +279,10 @@ if __name__ == "__main__":
 
         column_names_raw = get_column_names_raw(data_df_using_transformed.columns)
 
-        column_count = len(data_df_using_transformed.columns)        
-        weights = dict(zip(column_names_raw, [100] * column_count))
+        column_count = len(data_df_using_transformed.columns)
+        weights = dict(zip(column_names_raw, [DEFAULT_WEIGHT] * column_count))
         weights[""] = 0
-        polarities = dict(zip(column_names_raw, ["higher is better"] * column_count))
+        polarities = dict(zip(column_names_raw, [DEFAULT_POLARITY] * column_count))
         use_column = dict(zip(column_names_raw, [True] * column_count))
 
         #st.write(weights)
@@ -207,98 +311,87 @@ if __name__ == "__main__":
                 use_column[column_name] = row[4].checkbox(label=f"use_column_{column_name}", label_visibility="hidden", value=use_column[column_name])
 
             st.form_submit_button("Apply Settings")
-        
+
         #st.write(weights)
         #st.write(polarities)
         #st.write(use_column)
 
-        ############### Index Output ###############        
+        ############### Index Output ###############
 
         st.write("---")
         #st.subheader("Index Output")
 
-        # apply selected transformations
-        columns_new = []        
-        columns_new.append(data_df_using.iloc[:, 0])
+        # apply selected transformations, columns are transformed and normalised one at a time so only the
+        # columns whose transformation changed are recomputed, only the normalised columns are kept
+        columns_to_use = [column_name for column_name in usable_columns if use_column[column_name]]
+        if columns_to_use == []:
+            st.write("Select at least one column to use in the index.")
+            st.stop()
 
-        column_names_new = [data_df_using.columns[0]]
-        for column_name in usable_columns:
-            if use_column[column_name]:            
-                #column_name_raw = get_column_name_raw(column_name)
-                
-                column_name_new = f"{column_name}___{transformations_to_use[column_name]}"
-                column_names_new.append(column_name_new)
-                
-                column_data = data_df_using[column_name].apply(TRANSFORMATIONS[transformations_to_use[column_name]])
-                columns_new.append(column_data)
+        transformations_selected = {column_name: transformations_to_use[column_name] for column_name in columns_to_use}
 
-        data_df_using_transformed = pd.concat(columns_new, axis=1)
-        data_df_using_transformed.columns = column_names_new
+        def normalise_selected_columns(columnar_data: ColumnarData, column_names: list[str], transformations: dict) -> list[np.ndarray]:
+            column_keys = {column_name: make_cache_key(coerce_key, column_name, transformations[column_name]) for column_name in column_names}
 
-        st.subheader("Transformed Data (User Selected)")
-        st.write(data_df_using_transformed)
-
-        # create index columns        
-        #columns = [data_df_using_transformed.iloc[:, 0]]
-        columns = [list(data_df_using_transformed.iloc[:, 0])]
-        column_names = [data_df_using_transformed.columns[0]]
-        #st.write(data_df_using_transformed.iloc[:, 0].shape)
-        for column_name in data_df_using_transformed.columns[1:]:
-            column_name_raw = get_column_name_raw(column_name)
-            
-            column_data = []
-            col_max = data_df_using_transformed[column_name].max()
-            col_min = data_df_using_transformed[column_name].min()
-            col_range = col_max - col_min            
-
-            inversion_required = transformations_to_use[column_name_raw] in ORDER_REVERSING_TRANSFORMATIONS
-            higher_is_better = "higher" in polarities[column_name_raw].lower()
-
-            #st.write(column_name, col_min, col_max, col_range, inversion_required, higher_is_better)
-            
-            for item in data_df_using_transformed[column_name]:
-                value = MAX_INDEX_CELL_SCORE * ((item - col_min) / col_range)
-                if (higher_is_better and inversion_required) or (not(higher_is_better) and not(inversion_required)):                    
-                    value = MAX_INDEX_CELL_SCORE - value
-                
-                column_data.append(value)
-
-            columns.append(column_data)
-            column_names.append(column_name)
-            #columns.append(pd.Series(column_data, name=column_name))
-            #st.write(len(column_data), columns[-1].shape)
-
-        #index_df = pd.concat(columns, axis=1)
-        index_df = pd.DataFrame(np.array(columns).T, columns=column_names)
-        #st.write([col.shape[0] for col in columns])
-        #index_df = pd.DataFrame(columns, columns=[col.name for col in columns])        
-
-        # scores
-        weights_to_use = [weights[key] for key in weights.keys() if use_column[key]]
-        max_score = np.sum(10 * np.array(weights_to_use))
-        #st.write(max_score)
-        #st.write(weights_to_use)
-        #st.write(weights)
-        
-        row_scores = []
-        for _, row in index_df.iterrows():
-            sum = 0
-            for column_name in row.index[1:]:                
-                if (str(row[column_name]).lower() != 'nan') and str(row[column_name]).lower() != 'none':                    
-                    column_name_raw = get_column_name_raw(column_name)
-                    sum += float(row[column_name]) * weights[column_name_raw]                
-            
-            row_scores.append(sum)
-
-        score_column_name = f'score/{MAX_INDEX_ROW_SCORE:,.0f}'
-
-        index_df[score_column_name] = MAX_INDEX_ROW_SCORE * np.array(row_scores)/max_score
-        index_df['rank'] = index_df[score_column_name].rank(ascending=False)
-        
-        st.subheader("Index Data")
-        st.write(index_df)
+            # columns that aren't cached are normalised together, in parallel on large data
+            columns_to_normalise = [column_name for column_name in column_names if stage_cache.get_size("normalise column", column_keys[column_name]) is None]
+            progress_bar, on_progress = create_progress_bar("Normalising columns")
+            normalised_new = dict(zip(columns_to_normalise, column_executor.normalise_columns(
+                [columnar_data.get_values(column_name) for column_name in columns_to_normalise],
+                [transformations[column_name] for column_name in columns_to_normalise],
+                on_progress
+            )))
+            progress_bar.empty()
+
+            def get_normalised_column(column_name: str) -> np.ndarray:
+                if column_name in normalised_new:
+                    return normalised_new[column_name]
+
+                return normalise_transformed_column(columnar_data.get_column(column_name), transformations[column_name])
 
-             
+            return [run_stage("normalise column", column_keys[column_name], get_normalised_column, column_name) for column_name in column_names]
 
+        def run_index_stage(stage: str, key_parts: tuple, function, *args):
+            return run_stage(stage, make_cache_key(coerce_key, *key_parts), function, *args)
 
+        data_df_using_transformed = apply_transformations(display_df, columns_to_use, transformations_selected)
 
+        st.subheader("Transformed Data (User Selected)")
+        write_table(data_df_using_transformed, len(columnar_data))
+
+        # the same pipeline as the headless indexer, with its stages cached
+        index_df = index_columns(columnar_data, transformations_selected, weights, polarities, normalise_selected_columns, run_index_stage)
+
+        st.subheader("Index Data")
+        write_table(index_df, len(index_df))
+
+        download_controls = st.columns([0.2, 0.8], vertical_alignment="bottom")
+        download_format = download_controls[0].selectbox(label="Download format", options=OUTPUT_FORMATS)
+        download_controls[1].download_button(
+            label="Download Index",
+            data=lambda: export_index(index_df, download_format),
+            file_name=f"{uploaded_file.name.rsplit('.', 1)[0]}_index.{download_format}",
+            mime=OUTPUT_MIME_TYPES[download_format]
+        )
+
+    ############### Cache ###############
+
+    cache_log_df = pd.DataFrame(cache_log, columns=["stage", "result", "key", "size"])
+
+    with st.sidebar.expander("Memory"):
+        if columnar_data is not None:
+            # footprint of the data each stage of this run holds, stages run once per column are added up
+            memory_df = cache_log_df.groupby("stage", sort=False).agg(entries=("key", "size"), size=("size", "sum")).reset_index()
+            memory_df = pd.concat([pd.DataFrame([{"stage": "load", "entries": 1, "size": loaded_size}]), memory_df], ignore_index=True)
+            memory_df["size (MB)"] = memory_df.pop("size") / 1024 / 1024
+            st.dataframe(memory_df, hide_index=True)
+            st.write(f"Stored data: {len(columnar_data):,} rows x {len(usable_columns):,} columns, {columnar_data.nbytes / 1024 / 1024:,.1f} MB")
+            st.dataframe(columnar_data.get_memory_report(), hide_index=True)
+
+    with st.sidebar.expander("Cache"):
+        st.write("This run")
+        st.dataframe(pd.crosstab(cache_log_df["stage"], cache_log_df["result"]).reindex(columns=["hit", "miss"], fill_value=0))
+
+        st.write(f"Cached: {len(stage_cache.entries):,} entries, {stage_cache.total_bytes / 1024 / 1024:,.1f} of {stage_cache.max_bytes / 1024 / 1024:,.0f} MB")
+        st.write(f"Hits: {stage_cache.hits:,}, misses: {stage_cache.misses:,}, evictions: {stage_cache.evictions:,}")
+        st.dataframe(stage_cache.get_summary(), hide_index=True)
@@ -1,9 +1,155 @@
+from io import BytesIO
+import os
+import sys
+
 import streamlit as st
 
-st.set_page_config(
-    page_title = 'Geocoder'
-)
+import pandas as pd
+
+from utils import get_file_hash
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geocode"))
+from geocode_jobs import GeocodeJob, GeocodeJobRunner
+from geocode_providers import PROVIDER_CLASSES, ServiceProvider
+from geocoder import Geocoder
+
+# addresses accepted in one upload
+MAX_ADDRESS_COUNT = 100_000
+
+# result rows shown while a job runs, the full results are downloaded
+PREVIEW_ROW_COUNT = 200
+
+PROGRESS_REFRESH_SECONDS = 1
+
+@st.cache_resource
+def get_job_runner() -> GeocodeJobRunner:
+    """
+    Job runner shared by all sessions, one rate limited pool of threads whatever the number of users
+
+    geocode.maps.co is always used, the other providers are added when their api key is set
+    """
+
+    service_providers = [ServiceProvider.GEOCODEMAPS]
+    for service_provider, provider_class in PROVIDER_CLASSES.items():
+        if (service_provider != ServiceProvider.GEOCODEMAPS) and os.environ.get(provider_class.API_KEY_ENVIRONMENT_VARIABLE):
+            service_providers.append(service_provider)
+
+    geocoder = Geocoder(service_providers=service_providers, addresses=[], use_journal=False)
+
+    return GeocodeJobRunner(geocoder)
+
+@st.cache_data(max_entries=8)
+def load_address_file(file_hash: str, _file_bytes: bytes, file_extension: str) -> pd.DataFrame:
+    """
+    Read an uploaded csv or excel file as text columns, cached on the hash of the file contents
+    """
+
+    if file_extension == "csv":
+        return pd.read_csv(BytesIO(_file_bytes), dtype=str, encoding_errors="replace")
+
+    return pd.read_excel(BytesIO(_file_bytes), dtype=str)
+
+def format_seconds(seconds: float) -> str:
+    if seconds is None:
+        return "-"
+
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+def show_job(job_runner: GeocodeJobRunner, job: GeocodeJob, is_refreshing: bool):
+    """
+    Show a job's progress, throughput, eta and results, with a cancel button while it runs
+
+    is_refreshing is True when the fragment was started with run_every, the page is rerun once the job is
+    done so the fragment stops refreshing
+    """
+
+    progress = job.get_progress()
+
+    st.progress(progress["completed"] / max(1, progress["total"]), text=f"{progress['status'].capitalize()}: {progress['completed']:,} of {progress['total']:,} addresses")
+
+    metrics = st.columns(5)
+    metrics[0].metric("Found", f"{progress['found']:,}")
+    metrics[1].metric("Addresses per second", f"{progress['addresses_per_second']:,.1f}")
+    metrics[2].metric("Requests per second (all users)", f"{job_runner.get_requests_per_second():,.1f}")
+    metrics[3].metric("Elapsed", format_seconds(progress["elapsed_seconds"]))
+    metrics[4].metric("Time left", format_seconds(progress["eta_seconds"]))
+
+    if not job.is_done:
+        if st.button("Cancel", key=f"cancel_{job.job_id}"):
+            job.cancel()
+
+        active_job_count = job_runner.get_active_job_count()
+        if active_job_count > 1:
+            st.caption(f"{active_job_count:,} jobs are sharing the geocoding quota.")
+
+        st.dataframe(job.get_results_df().tail(PREVIEW_ROW_COUNT), hide_index=True)
+    else:
+        # the job finished between two refreshes, rerun the page to start the fragment without run_every
+        if is_refreshing:
+            st.rerun()
+
+        results_df = job.get_results_df()
+        st.dataframe(results_df, hide_index=True)
+        st.download_button(label="Download results", data=results_df.to_csv(index=False).encode("utf-8"), file_name=f"geocoded_addresses_{job.job_id}.csv", mime="text/csv")
+
+if __name__ == "__main__":
+    ############### Page config ###############
+    st.set_page_config(
+        page_title = "Geocoder",
+        layout="wide"
+    )
+
+    job_runner = get_job_runner()
+
+    # ids of this session's jobs, the jobs themselves are held by the shared runner
+    if "geocode_job_ids" not in st.session_state:
+        st.session_state["geocode_job_ids"] = []
+
+    st.title("Geocoder")
+
+    ############### File upload ###############
+
+    st.markdown("""---""")
+    st.subheader("Address Upload")
+    uploaded_file = st.file_uploader(label="Upload an **excel** or **csv** file with a column of addresses.", type=["csv", "xlsx"])
+
+    if uploaded_file is not None:
+        file_bytes = uploaded_file.getvalue()
+        address_df = load_address_file(get_file_hash(file_bytes), file_bytes, uploaded_file.name.split(".")[-1].lower())
+
+        with st.form("Geocoder Settings"):
+            column_name = st.selectbox(label="Address column", options=address_df.columns)
+            location_hint = st.text_input(label="Location hint (optional)", placeholder="e.g. portugal")
+            start = st.form_submit_button("Start Geocoding")
+
+        if start:
+            addresses = address_df[column_name].dropna().str.strip()
+            addresses = list(addresses[addresses != ""].unique())
+
+            if len(addresses) > MAX_ADDRESS_COUNT:
+                st.write(f"Too many addresses ({len(addresses):,}), the limit is {MAX_ADDRESS_COUNT:,}.")
+            elif addresses == []:
+                st.write(f"No addresses found in column '{column_name}'.")
+            else:
+                job = job_runner.submit(addresses, location_hint.strip() or None)
+                st.session_state["geocode_job_ids"].append(job.job_id)
+
+    ############### Jobs ###############
+
+    jobs = [job_runner.get_job(job_id) for job_id in st.session_state["geocode_job_ids"]]
+    jobs = [job for job in jobs if job is not None]
+
+    if jobs != []:
+        st.markdown("""---""")
+        st.subheader("Geocoding Jobs")
+
+        jobs = {job.job_id: job for job in jobs[::-1]}
+        job_id = st.selectbox(label="Job", options=jobs.keys(), format_func=lambda job_id: f"{job_id} ({len(jobs[job_id].addresses):,} addresses, started {pd.Timestamp(jobs[job_id].created_time, unit='s'):%H:%M:%S})")
+        job = jobs[job_id]
 
-st.title('Geocoder')
-st.write('The geocoder is not live yet. Check back later.')
-#st.sidebar.success('Select a page.')
\ No newline at end of file
+        # progress is redrawn on a timer without rerunning the page while the job runs
+        run_every = None if job.is_done else PROGRESS_REFRESH_SECONDS
+        st.fragment(run_every=run_every)(show_job)(job_runner, job, run_every is not None)
@@ -0,0 +1,368 @@
+"""
+Column-parallel execution of the Visual Indexer's per-column work across a process pool
+
+Numeric matrices are placed in shared memory, tasks only carry the name of the shared memory block and the
+offset, shape and strides of the columns they work on, so worker processes read their input and write their
+output in place instead of pickling copies of columns. Inputs below the measured size at which an operation
+gets faster in parallel (MIN_PARALLEL_CELL_COUNTS) run serially in the calling process.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import math
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+import os
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from utils import (
+    calculate_matrix_statistics,
+    coerce_column,
+    normalise_transformed_column,
+    STATISTICS_BLOCK_BYTES
+)
+
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+
+# inputs with fewer cells (rows x columns) than this are processed serially, None always runs serially.
+# Measured with benchmarks/parallel_columns_benchmark.py, serial work and the added cost of going parallel
+# per cell, at 300k and 1M rows x 12 columns:
+#   coerce (text columns only): object columns 100 ns serial, 370-470 ns added (pickling and unpickling
+#       the values), so parallel parsing is slower at any size. Arrow backed str columns are 195 ns serial
+#       and 100 ns added, only about 1.3x faster with 4 busy cores.
+#   statistics: 110 ns serial, 16 ns added plus about 0.05 s to dispatch the tasks, faster from about
+#       1.5M cells with 2 cores and 0.9M cells with 4.
+#   normalise: 13 ns serial, 21 ns added (copying columns into and out of shared memory), slower at any size.
+MIN_PARALLEL_CELL_COUNTS = {
+    "coerce": None,
+    "statistics": 2_000_000,
+    "normalise": None
+}
+
+# tasks per worker for work split into blocks of columns, so faster workers take more of the blocks
+TASKS_PER_WORKER = 4
+
+# (start address, size in bytes) of the shared memory blocks created by this process, keyed by block name
+shared_blocks = {}
+shared_blocks_lock = threading.Lock()
+
+def release_shared_block(shared_memory: SharedMemory):
+    with shared_blocks_lock:
+        shared_blocks.pop(shared_memory.name, None)
+
+    shared_memory.unlink()
+
+def create_shared_array(shape: tuple, dtype) -> np.ndarray:
+    """
+    Create a column-major array in a new shared memory block
+
+    The block is unlinked when the array and every view of it have been garbage collected, views can be
+    passed to workers with find_shared_array.
+
+        Parameters:
+            shape (tuple): shape of the array
+            dtype: numpy dtype of the array
+
+        Returns:
+            array (np.ndarray): uninitialised array
+    """
+
+    dtype = np.dtype(dtype)
+    shared_memory = SharedMemory(create=True, size=max(1, math.prod(shape) * dtype.itemsize))
+    array = np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf, order="F")
+
+    with shared_blocks_lock:
+        shared_blocks[shared_memory.name] = (array.__array_interface__["data"][0], shared_memory.size)
+
+    weakref.finalize(array, release_shared_block, shared_memory)
+
+    return array
+
+def find_shared_array(array: np.ndarray) -> dict:
+    """
+    Describe an array held in a shared memory block created by this process, so a worker can attach to it
+
+        Parameters:
+            array (np.ndarray): array or view of an array from create_shared_array
+
+        Returns:
+            reference (dict): name, offset, shape, strides and dtype for attach_shared_array, None if array
+                              isn't in shared memory
+    """
+
+    address = array.__array_interface__["data"][0]
+    with shared_blocks_lock:
+        for name, (start, size) in shared_blocks.items():
+            if start <= address < start + size:
+                return {"name": name, "offset": address - start, "shape": array.shape, "strides": array.strides, "dtype": array.dtype.str}
+
+    return None
+
+def attach_shared_array(reference: dict) -> tuple[SharedMemory, np.ndarray]:
+    """
+    Attach to an array described by find_shared_array, the array must be deleted before the block is closed
+    """
+
+    shared_memory = SharedMemory(name=reference["name"])
+    array = np.ndarray(reference["shape"], dtype=reference["dtype"], buffer=shared_memory.buf, offset=reference["offset"], strides=reference["strides"])
+
+    return shared_memory, array
+
+def coerce_column_task(column: pd.Series, output_reference: dict) -> int:
+    """
+    Worker task: coerce a column into a shared float64 column, returns the number of parse failures
+    """
+
+    shared_memory, output = attach_shared_array(output_reference)
+    try:
+        column_out, parse_failure_count = coerce_column(column)
+        output[:] = column_out.to_numpy(dtype=np.float64)
+    finally:
+        del output
+        shared_memory.close()
+
+    return parse_failure_count
+
+def statistics_task(column_references: list[dict], column_names: list[str], block_bytes: int, group_count: int) -> pd.DataFrame:
+    """
+    Worker task: calculate_matrix_statistics on shared columns
+    """
+
+    attached = [attach_shared_array(reference) for reference in column_references]
+    try:
+        statistics_df = calculate_matrix_statistics([column for _, column in attached], column_names, block_bytes, group_count)
+    finally:
+        shared_memories = [shared_memory for shared_memory, _ in attached]
+        del attached
+        for shared_memory in shared_memories:
+            shared_memory.close()
+
+    return statistics_df
+
+def normalise_column_task(column_reference: dict, transformation: str, output_reference: dict):
+    """
+    Worker task: transform and normalise a shared column into a shared output column
+    """
+
+    shared_memory, column = attach_shared_array(column_reference)
+    output_shared_memory, output = attach_shared_array(output_reference)
+    try:
+        output[:] = normalise_transformed_column(pd.Series(column, copy=False), transformation)
+    finally:
+        del column, output
+        shared_memory.close()
+        output_shared_memory.close()
+
+def split_range(count: int, part_count: int) -> list[tuple[int, int]]:
+    """
+    Split range(count) into at most part_count (start, stop) ranges of near equal length
+    """
+
+    part_count = max(1, min(count, part_count))
+    bounds = np.linspace(0, count, part_count + 1).round().astype(int)
+
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+class ColumnExecutor:
+    """
+    Runs per-column work (coercion, the transformation statistics and normalisation) on a process pool
+
+    The pool is started on first use and shared by every caller. Inputs with fewer cells than the operation's
+    entry in min_parallel_cell_counts (MIN_PARALLEL_CELL_COUNTS by default), or an executor with a single
+    worker, run serially in the calling process with the same results.
+    """
+
+    def __init__(self, max_workers: int = None, min_parallel_cell_counts: dict = None):
+        if max_workers is None:
+            max_workers = DEFAULT_MAX_WORKERS
+
+        self.max_workers = max_workers
+        self.min_parallel_cell_counts = {**MIN_PARALLEL_CELL_COUNTS, **(min_parallel_cell_counts or {})}
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def is_parallel(self, operation: str, row_count: int, column_count: int) -> bool:
+        """
+        True if an operation (a key of MIN_PARALLEL_CELL_COUNTS) on row_count x column_count cells runs on the pool
+        """
+
+        min_parallel_cell_count = self.min_parallel_cell_counts[operation]
+        if min_parallel_cell_count is None:
+            return False
+
+        return (self.max_workers > 1) and (column_count > 1) and (row_count * column_count >= min_parallel_cell_count)
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                # spawned workers don't inherit the threads of the streamlit server
+                self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp.get_context("spawn"))
+
+            return self.pool
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+
+    def empty(self, shape: tuple, dtype, operation: str) -> np.ndarray:
+        """
+        Column-major array, in shared memory when operation will be run on it in parallel
+        """
+
+        if self.is_parallel(operation, *shape):
+            return create_shared_array(shape, dtype)
+
+        return np.empty(shape, dtype=dtype, order="F")
+
+    def run(self, tasks: list[tuple], on_progress=None) -> list:
+        """
+        Run (function, *args) tasks on the pool, in any order, and return their results in task order
+
+            Parameters:
+                tasks (list[tuple]): module level function followed by its arguments
+                on_progress (function): called with (completed task count, task count) as tasks complete
+
+            Returns:
+                results (list)
+        """
+
+        try:
+            pool = self.get_pool()
+            futures = {pool.submit(*task): i for i, task in enumerate(tasks)}
+
+            results = [None] * len(tasks)
+            for completed_count, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if on_progress is not None:
+                    on_progress(completed_count, len(tasks))
+        except BrokenProcessPool:
+            # e.g. a worker ran out of memory, start a new pool next time
+            with self.lock:
+                self.pool = None
+            raise
+
+        return results
+
+    def to_shared(self, array: np.ndarray) -> tuple[dict, np.ndarray]:
+        """
+        Reference to an array in shared memory, copying it into shared memory when it isn't already
+
+            Returns:
+                reference (dict): see find_shared_array
+                array_shared (np.ndarray): must be kept until the tasks using the reference have finished
+        """
+
+        reference = find_shared_array(array)
+        if reference is None:
+            array_shared = create_shared_array(array.shape, array.dtype)
+            array_shared[...] = array
+            return find_shared_array(array_shared), array_shared
+
+        return reference, array
+
+    def coerce_columns(self, columns: list[pd.Series], on_progress=None) -> tuple[np.ndarray, list[int]]:
+        """
+        Coerce each column to float64, text columns are parsed in parallel
+
+        Numeric columns only need a cast and are converted in the calling process, pickling them to a worker
+        would take longer than the cast.
+
+            Parameters:
+                columns (list[pd.Series]): columns as loaded, not modified
+                on_progress (function): see run
+
+            Returns:
+                output (np.ndarray): column-major float64 array with a column for each column, in shared memory
+                                     when the text columns were parsed in parallel
+                parse_failure_counts (list[int]): see utils.coerce_column
+        """
+
+        row_count = columns[0].shape[0] if columns != [] else 0
+        text_indexes = [j for j, column in enumerate(columns) if not pd.api.types.is_numeric_dtype(column.dtype)]
+        text_index_set = set(text_indexes)
+        is_parallel = self.is_parallel("coerce", row_count, len(text_indexes))
+
+        if is_parallel:
+            output = create_shared_array((row_count, len(columns)), np.float64)
+        else:
+            output = np.empty((row_count, len(columns)), dtype=np.float64, order="F")
+
+        parse_failure_counts = [0] * len(columns)
+        for j, column in enumerate(columns):
+            if is_parallel and (j in text_index_set):
+                continue
+
+            column_out, parse_failure_counts[j] = coerce_column(column)
+            output[:, j] = column_out.to_numpy(dtype=np.float64)
+            if (on_progress is not None) and not is_parallel:
+                on_progress(j + 1, len(columns))
+
+        if is_parallel:
+            tasks = [(coerce_column_task, columns[j], find_shared_array(output[:, j])) for j in text_indexes]
+            for j, parse_failure_count in zip(text_indexes, self.run(tasks, on_progress)):
+                parse_failure_counts[j] = parse_failure_count
+
+        return output, parse_failure_counts
+
+    def calculate_statistics(self, columns: list[np.ndarray], column_names: list[str], block_bytes: int = STATISTICS_BLOCK_BYTES, group_count: int = None, on_progress=None) -> pd.DataFrame:
+        """
+        utils.calculate_matrix_statistics, with blocks of columns calculated in parallel
+
+        Columns that aren't in shared memory (e.g. float64 columns of the loaded data) are copied into it
+        """
+
+        if (columns == []) or not self.is_parallel("statistics", columns[0].shape[0], len(columns)):
+            return calculate_matrix_statistics(columns, column_names, block_bytes, group_count)
+
+        columns_shared = [self.to_shared(column) for column in columns]
+
+        tasks = []
+        for start, stop in split_range(len(column_names), self.max_workers * TASKS_PER_WORKER):
+            tasks.append((statistics_task, [reference for reference, _ in columns_shared[start:stop]], column_names[start:stop], block_bytes, group_count))
+
+        return pd.concat(self.run(tasks, on_progress), ignore_index=True)
+
+    def normalise_columns(self, columns: list[np.ndarray], transformations: list[str], on_progress=None) -> list[np.ndarray]:
+        """
+        utils.normalise_transformed_column for each column, the columns are normalised in parallel
+
+            Parameters:
+                columns (list[np.ndarray]): numeric columns of the same length
+                transformations (list[str]): transformation of each column
+
+            Returns:
+                normalised_columns (list[np.ndarray]): an array of its own for each column, so each can be
+                                                       cached (and evicted) separately
+        """
+
+        if columns == []:
+            return []
+
+        row_count = columns[0].shape[0]
+        if not self.is_parallel("normalise", row_count, len(columns)):
+            normalised_columns = []
+            for i, (column, transformation) in enumerate(zip(columns, transformations)):
+                normalised_columns.append(normalise_transformed_column(pd.Series(column, copy=False), transformation))
+                if on_progress is not None:
+                    on_progress(i + 1, len(columns))
+
+            return normalised_columns
+
+        output = create_shared_array((row_count, len(columns)), np.float64)
+
+        tasks = []
+        columns_shared = []
+        for i, (column, transformation) in enumerate(zip(columns, transformations)):
+            reference, column_shared = self.to_shared(column)
+            columns_shared.append(column_shared)
+            tasks.append((normalise_column_task, reference, transformation, find_shared_array(output[:, i])))
+
+        self.run(tasks, on_progress)
+
+        # views would keep the whole shared memory block alive for as long as any one column is cached
+        return [output[:, i].copy() for i in range(len(columns))]
@@ -0,0 +1,150 @@
+import hashlib
+import json
+from collections import OrderedDict
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+# default memory budget of a StageCache
+DEFAULT_STAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+def make_cache_key(*parts) -> str:
+    """
+    Create a cache key from json-like parts (strings, numbers, lists and dicts of these)
+
+        Parameters:
+            parts: e.g. a parent stage key followed by the parameters of the stage
+
+        Returns:
+            cache_key (str): sha256 hex digest of the parts
+    """
+
+    key_text = json.dumps(parts, sort_keys=True, default=str)
+
+    return hashlib.sha256(key_text.encode("utf-8")).hexdigest()
+
+def estimate_size(value) -> int:
+    """
+    Estimate the memory used by a cached value in bytes
+
+        Parameters:
+            value: DataFrame, Series, ndarray (or anything else with nbytes, e.g. ColumnarData), bytes
+                   or containers of these
+
+        Returns:
+            size (int): approximate size in bytes
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    elif isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    elif hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    elif isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    else:
+        return sys.getsizeof(value)
+
+class StageCache:
+    """
+    Memory bounded LRU cache for the results of pipeline stages
+
+    Entries are keyed on the stage name and a key built with make_cache_key from the key of the stage's input
+    (ultimately the content hash of the upload) and the stage's parameters. The least recently used entries
+    are evicted once the estimated size of all entries goes over max_bytes.
+
+    Cached values are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_STAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, stage: str, key: str, function, *args, **kwargs) -> tuple[object, bool]:
+        """
+        Return the cached value for (stage, key), calling function(*args, **kwargs) on a miss
+
+            Parameters:
+                stage (str): name of the stage
+                key (str): cache key of the stage's input and parameters
+                function (function): computes the stage result
+
+            Returns:
+                value: the stage result
+                hit (bool): True if the value came from the cache
+        """
+
+        entry_key = (stage, key)
+        with self.lock:
+            if entry_key in self.entries:
+                self.entries.move_to_end(entry_key)
+                self.hits += 1
+                return self.entries[entry_key][0], True
+
+            self.misses += 1
+
+        value = function(*args, **kwargs)
+        self.put(stage, key, value)
+
+        return value, False
+
+    def put(self, stage: str, key: str, value):
+        """
+        Store a value, evicting least recently used entries if the cache is over its memory budget
+        """
+
+        entry_key = (stage, key)
+        size = estimate_size(value)
+        with self.lock:
+            if entry_key in self.entries:
+                self.total_bytes -= self.entries.pop(entry_key)[1]
+
+            if size > self.max_bytes:
+                # larger than the whole cache, don't store it
+                return
+
+            self.entries[entry_key] = (value, size)
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_size(self, stage: str, key: str) -> int:
+        """
+        Return the estimated size of a cached value in bytes, None if it isn't cached
+        """
+
+        with self.lock:
+            entry = self.entries.get((stage, key))
+
+        return None if entry is None else entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def get_summary(self) -> pd.DataFrame:
+        """
+        Return the stage, size and recency order of every entry, least recently used first
+        """
+
+        with self.lock:
+            rows = [
+                {"stage": stage, "key": key[:12], "size (MB)": size / 1024 / 1024}
+                for (stage, key), (_, size) in self.entries.items()
+            ]
+
+        return pd.DataFrame(rows, columns=["stage", "key", "size (MB)"])
@@ -0,0 +1,143 @@
+"""
+Streamlit specific helpers, the functions in utils.py don't depend on streamlit
+"""
+from io import BytesIO
+
+import pandas as pd
+
+import streamlit as st
+
+from utils import (
+    ARROW_FILE_EXTENSIONS,
+    get_file_hash,
+    read_arrow_file,
+    read_csv_file,
+    read_excel_sheet,
+    read_workbook_metadata,
+    VALID_FILE_EXTENSIONS
+)
+
+# number of parsed files, worksheets and workbook metadata kept in the streamlit cache
+FILE_CACHE_MAX_ENTRIES = 32
+
+# parsed files and worksheets are kept as shared resources rather than st.cache_data, which would hand every
+# rerun of every session its own unpickled copy of the data, so they must not be modified
+
+def format_worksheet_name(sheet_name: str, dimensions: tuple[int, int]) -> str:
+    row_count, column_count = dimensions
+    if row_count is None or column_count is None:
+        return sheet_name
+
+    return f"{sheet_name} ({row_count:,} rows x {column_count:,} columns)"
+
+@st.cache_resource(max_entries=FILE_CACHE_MAX_ENTRIES)
+def load_csv_file(file_hash: str, _file_bytes: bytes) -> pd.DataFrame:
+    """
+    Cached read_csv_file, keyed on the hash of the file contents
+    """
+
+    return read_csv_file(BytesIO(_file_bytes))
+
+@st.cache_resource(max_entries=FILE_CACHE_MAX_ENTRIES)
+def load_arrow_file(file_hash: str, _file_bytes: bytes, file_extension: str) -> pd.DataFrame:
+    """
+    Cached read_arrow_file, keyed on the hash of the file contents
+    """
+
+    return read_arrow_file(_file_bytes, file_extension)
+
+@st.cache_data(max_entries=FILE_CACHE_MAX_ENTRIES)
+def load_workbook_metadata(file_hash: str, _file_bytes: bytes) -> dict[str, tuple[int, int]]:
+    """
+    Cached read_workbook_metadata, keyed on the hash of the file contents
+    """
+
+    return read_workbook_metadata(BytesIO(_file_bytes))
+
+@st.cache_resource(max_entries=FILE_CACHE_MAX_ENTRIES)
+def load_excel_sheet(file_hash: str, _file_bytes: bytes, sheet_name: str, row_number: int, column_number: int) -> pd.DataFrame:
+    """
+    Cached read_excel_sheet, keyed on the hash of the file contents, the worksheet and the start row and column
+    """
+
+    return read_excel_sheet(BytesIO(_file_bytes), sheet_name, row_number, column_number)
+
+def load_file(uploaded_file: bytes) -> pd.DataFrame:
+    """
+    Return the uploaded csv file or the specified excel sheet as a pandas DataFrame, shared with other
+    sessions loading the same data
+
+        Parameters:
+            uploaded_file (bytes):            
+        
+        Returns:
+            data_df (pd.DataFrame):
+    """
+
+    if uploaded_file is not None:
+        file_extention = uploaded_file.name.split(".")[-1]
+    else:
+        file_extention = ""
+
+    if file_extention == "":
+        # no data uploaded
+        data_df = None
+    elif file_extention not in VALID_FILE_EXTENSIONS:
+        # unsupported file type
+        st.write(f"Unsupported file type '{file_extention}'. Please upload an excel, csv, parquet or feather file.")
+        data_df = None
+    else:
+        # load csv, parquet, feather or excel file
+        try:
+            if file_extention == "csv":
+                file_bytes = uploaded_file.getvalue()
+                file_hash = get_file_hash(file_bytes)
+                data_df = load_csv_file(file_hash, file_bytes)
+                data_cache_key = file_hash
+            elif file_extention in ARROW_FILE_EXTENSIONS:
+                file_bytes = uploaded_file.getvalue()
+                file_hash = get_file_hash(file_bytes)
+                data_df = load_arrow_file(file_hash, file_bytes, file_extention)
+                data_cache_key = file_hash
+            else:
+                # get excel worksheet names and dimensions without parsing the worksheets
+                file_bytes = uploaded_file.getvalue()
+                file_hash = get_file_hash(file_bytes)
+                workbook_metadata = load_workbook_metadata(file_hash, file_bytes)
+
+                with st.form("Worksheet Selection"):
+                    column_widths = [0.8, 0.1, 0.1]
+                    header = st.columns(column_widths)
+                    header[0].subheader("Worksheet Name")
+                    header[1].subheader("Start Row")
+                    header[2].subheader("Start Column")
+
+                    row = st.columns(column_widths)                    
+                    sheet_name = row[0].selectbox(label="Select a worksheet", options=workbook_metadata.keys(), format_func=lambda x: format_worksheet_name(x, workbook_metadata[x]))
+                    row_number = row[1].slider(label=f"row number", label_visibility="hidden", min_value=1, max_value=50, value=1, step=1)
+                    column_number = row[2].slider(label=f"column number", label_visibility="hidden", min_value=1, max_value=50, value=1, step=1)
+                    #st.write(row_number)
+                    
+                    st.form_submit_button("Load Data")
+
+                # load excel worksheet
+                if sheet_name is not None and sheet_name != "":
+                    data_df = load_excel_sheet(file_hash, file_bytes, sheet_name, row_number, column_number)
+                    data_cache_key = f"{file_hash}|{sheet_name}|{row_number}|{column_number}"
+
+                    if len(data_df.columns) != len(set(data_df.columns)):
+                        # incorrectly formatted worksheet
+                        st.write(f"Unable to read data from '{sheet_name}' worksheet. Incorrectly formatted data.")
+                        data_df = None
+                else:
+                    data_df = None
+        except AttributeError as e:
+            st.write("Exception raised while loading file.")
+            st.write(e)
+            data_df = None
+
+        if data_df is not None:
+            # identifies the loaded data for the stage cache used by the pages
+            data_df.attrs["cache_key"] = data_cache_key
+
+    return data_df
@@ -0,0 +1,18 @@
+import os
+import sys
+
+# root modules are imported as in the app, geocode modules as in the geocoder (from their directory)
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_PATH)
+sys.path.insert(0, os.path.join(REPOSITORY_PATH, "geocode"))
+
+import pytest
+
+from parallel_columns import ColumnExecutor, MIN_PARALLEL_CELL_COUNTS
+
+@pytest.fixture(scope="session")
+def executor():
+    # parallel whatever the size of the data
+    executor = ColumnExecutor(max_workers=2, min_parallel_cell_counts={operation: 1 for operation in MIN_PARALLEL_CELL_COUNTS})
+    yield executor
+    executor.shutdown()
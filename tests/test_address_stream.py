@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from address_stream import iter_unique_addresses, UniqueHashSet
+
+def test_add_new():
+    hashes = UniqueHashSet()
+
+    np.testing.assert_array_equal(hashes.add_new(np.array([5, 3, 5, 9], dtype=np.uint64)), [True, True, False, True])
+    np.testing.assert_array_equal(hashes.add_new(np.array([9, 1, 1, 3, 2**64 - 1], dtype=np.uint64)), [False, True, False, False, True])
+    np.testing.assert_array_equal(hashes.add_new(np.array([], dtype=np.uint64)), [])
+
+    assert len(hashes) == 5
+    np.testing.assert_array_equal(hashes.hashes, [1, 3, 5, 9, 2**64 - 1])
+
+def test_add_new_matches_a_python_set():
+    rng = np.random.default_rng(0)
+    hashes = UniqueHashSet()
+    seen = set()
+
+    for _ in range(20):
+        batch = rng.integers(0, 500, 100).astype(np.uint64)
+        expected = []
+        for value in batch:
+            expected.append(int(value) not in seen)
+            seen.add(int(value))
+
+        np.testing.assert_array_equal(hashes.add_new(batch), expected)
+
+    assert len(hashes) == len(seen)
+
+@pytest.mark.parametrize('chunk_rows', [1, 4, 1_000])
+def test_iter_unique_addresses(tmp_path, chunk_rows):
+    addresses = ['rua 1', 'rua 2', 'rua 1', None, 'Rua 1', 'rua 3', 'rua 2', '', 'rua 4']
+    file_path = tmp_path / 'addresses.csv'
+    pd.DataFrame({'id': range(len(addresses)), 'address': addresses}).to_csv(file_path, index=False)
+
+    # first occurrences in file order, missing values skipped, no case folding
+    assert list(iter_unique_addresses(str(file_path), 'address', chunk_rows)) == ['rua 1', 'rua 2', 'Rua 1', 'rua 3', 'rua 4']
+
+def test_iter_unique_addresses_across_chunks(tmp_path):
+    file_path = tmp_path / 'addresses.csv'
+    pd.DataFrame({'address': [f'rua {i % 50}' for i in range(200)]}).to_csv(file_path, index=False)
+
+    addresses = iter_unique_addresses(str(file_path), 'address', 10)
+
+    assert next(addresses) == 'rua 0'
+    assert len(list(addresses)) == 49
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_data import compact_columns, get_owner
+from parallel_columns import find_shared_array, shared_blocks
+
+ROW_COUNT = 20_000
+
+def create_data() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    columns = {"label": pd.array([f"area {i % 500}" for i in range(ROW_COUNT)], dtype="str")}
+    for i in range(4):
+        values = rng.lognormal(size=ROW_COUNT)
+        values[rng.random(ROW_COUNT) < 0.05] = np.nan
+        columns[f"float {i}"] = values
+
+    columns["text"] = pd.array(["n/a"] * ROW_COUNT, dtype="str")
+    columns["numbers as text"] = pd.array([f"{i:_}" for i in range(ROW_COUNT)], dtype="str").astype(object)
+    columns["integers"] = rng.integers(0, 10, ROW_COUNT)
+
+    return pd.DataFrame(columns)
+
+@pytest.mark.parametrize("float_dtype", [None, "float64", "float32"])
+def test_parallel_matches_serial(executor, float_dtype):
+    data_df = create_data()
+
+    serial = compact_columns(data_df, float_dtype)
+    parallel = compact_columns(data_df, float_dtype, executor=executor)
+
+    assert parallel[1] == serial[1]
+    assert parallel[2] == serial[2] == ["text"]
+    pd.testing.assert_frame_equal(parallel[3], serial[3])
+    assert parallel[0].dtype == serial[0].dtype
+    np.testing.assert_array_equal(np.column_stack(parallel[0].columns), np.column_stack(serial[0].columns))
+    pd.testing.assert_series_equal(parallel[0].get_labels(), serial[0].get_labels())
+
+def test_float64_columns_are_not_copied():
+    data_df = create_data()
+
+    columnar_data = compact_columns(data_df, "float64")[0]
+
+    for i in range(4):
+        assert np.shares_memory(columnar_data.get_values(f"float {i}"), data_df[f"float {i}"].to_numpy())
+
+    assert not np.shares_memory(columnar_data.get_values("integers"), data_df["integers"].to_numpy())
+
+def test_float32_converts_float64_columns():
+    data_df = create_data()
+
+    columnar_data = compact_columns(data_df, "float32")[0]
+
+    assert {column.dtype for column in columnar_data.columns} == {np.dtype(np.float32)}
+    assert get_owner(columnar_data.get_values("float 0")) is get_owner(columnar_data.get_values("integers"))
+
+def test_unusable_columns_are_not_kept(executor):
+    data_df = create_data()
+    coerced_usable_count = 2
+
+    columnar_data = compact_columns(data_df, "float64")[0]
+    values = get_owner(columnar_data.get_values("integers"))
+    assert values.shape == (ROW_COUNT, coerced_usable_count)
+    assert values.flags.f_contiguous
+
+    # the shared memory block of the parallel result only holds the usable coerced columns
+    columnar_data = compact_columns(data_df, "float64", executor=executor)[0]
+    values = get_owner(columnar_data.get_values("integers"))
+    assert values.flags.f_contiguous
+    _, block_size = shared_blocks[find_shared_array(values)["name"]]
+    assert values.nbytes <= block_size < values.nbytes + ROW_COUNT * 8
@@ -0,0 +1,102 @@
+import types
+
+import pytest
+
+import geocode_cache
+from geocode_cache import GeocodeCache
+
+ROWS = [{'address': 'lisboa', 'lat': '38.7', 'long': '-9.1'}]
+
+@pytest.fixture
+def clock(monkeypatch):
+    # the cache reads time.time() for entry ages, replaced so tests step it instead of sleeping
+    clock = types.SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(geocode_cache, 'time', types.SimpleNamespace(time=lambda: clock.now))
+
+    return clock
+
+@pytest.fixture
+def create_cache(tmp_path):
+    caches = []
+
+    def create(**kwargs) -> GeocodeCache:
+        cache = GeocodeCache(str(tmp_path / 'geocode_cache.sqlite'), **kwargs)
+        caches.append(cache)
+
+        return cache
+
+    yield create
+
+    for cache in caches:
+        cache.close()
+
+def test_get_put(create_cache, clock):
+    cache = create_cache()
+
+    assert cache.get('GEOCODEMAPS', 'lisboa') is None
+    cache.put('GEOCODEMAPS', 'lisboa', ROWS)
+
+    assert cache.get('GEOCODEMAPS', 'lisboa') == ROWS
+    # entries are per provider
+    assert cache.get('MAPTILER', 'lisboa') is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_results_persist(create_cache, clock):
+    create_cache().put('GEOCODEMAPS', 'lisboa', ROWS)
+
+    cache = create_cache()
+
+    assert cache.entry_count == 1
+    assert cache.get('GEOCODEMAPS', 'lisboa') == ROWS
+
+def test_ttl(create_cache, clock):
+    cache = create_cache(ttl_seconds=100, negative_ttl_seconds=10)
+    cache.put('GEOCODEMAPS', 'lisboa', ROWS)
+    cache.put('GEOCODEMAPS', 'nowhere', [])
+
+    clock.now += 10
+    assert cache.get('GEOCODEMAPS', 'lisboa') == ROWS
+    assert cache.get('GEOCODEMAPS', 'nowhere') == []
+
+    # negative entries expire first
+    clock.now += 1
+    assert cache.get('GEOCODEMAPS', 'lisboa') == ROWS
+    assert cache.get('GEOCODEMAPS', 'nowhere') is None
+
+    # using an entry doesn't extend its life
+    clock.now += 90
+    assert cache.get('GEOCODEMAPS', 'lisboa') is None
+
+def test_remove_expired(create_cache, clock):
+    cache = create_cache(ttl_seconds=100, negative_ttl_seconds=10)
+    cache.put('GEOCODEMAPS', 'lisboa', ROWS)
+    cache.put('GEOCODEMAPS', 'nowhere', [])
+
+    clock.now += 11
+    assert cache.remove_expired() == 1
+    assert cache.entry_count == 1
+
+    clock.now += 90
+    assert cache.remove_expired() == 1
+    assert cache.entry_count == 0
+
+def test_lru_eviction(create_cache, clock):
+    cache = create_cache(max_entries=2)
+    cache.put('GEOCODEMAPS', 'a', ROWS)
+    clock.now += 1
+    cache.put('GEOCODEMAPS', 'b', ROWS)
+    clock.now += 1
+    # a is now more recently used than b
+    cache.get('GEOCODEMAPS', 'a')
+    clock.now += 1
+    # replacing an entry doesn't add one
+    cache.put('GEOCODEMAPS', 'a', ROWS)
+    assert cache.entry_count == 2
+
+    clock.now += 1
+    cache.put('GEOCODEMAPS', 'c', ROWS)
+
+    assert cache.entry_count == 2
+    assert cache.get('GEOCODEMAPS', 'b') is None
+    assert cache.get('GEOCODEMAPS', 'a') == ROWS
+    assert cache.get('GEOCODEMAPS', 'c') == ROWS
@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_geocode_server import StubGeocodeServer
+from geocode_jobs import GeocodeJob, GeocodeJobRunner
+from geocode_providers import GeocodeMapsProvider
+from geocoder import Geocoder
+
+TIMEOUT_SECONDS = 10
+
+class BlockingGeocoder(Geocoder):
+    '''
+    Geocoder whose lookups wait until released, recording the lookups in flight
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(providers=[GeocodeMapsProvider(api_key='test')], addresses=[], use_cache=False, use_journal=False, use_local_index=False, **kwargs)
+
+        self.release_event = threading.Event()
+        self.in_flight = []
+        self.max_in_flight_count = 0
+        self.in_flight_lock = threading.Lock()
+
+    def geocode_address(self, address_clean: str) -> list[dict]:
+        with self.in_flight_lock:
+            self.in_flight.append(address_clean)
+            self.max_in_flight_count = max(self.max_in_flight_count, len(self.in_flight))
+
+        self.release_event.wait(TIMEOUT_SECONDS)
+
+        with self.in_flight_lock:
+            self.in_flight.remove(address_clean)
+
+        if 'error' in address_clean:
+            raise RuntimeError(address_clean)
+
+        return [{'address': address_clean, 'lat': '38.7', 'long': '-9.1'}]
+
+def wait_until(condition, timeout_seconds: float = TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout_seconds
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+@pytest.fixture
+def create_runner():
+    runners = []
+
+    def create(geocoder: Geocoder, **kwargs) -> GeocodeJobRunner:
+        runner = GeocodeJobRunner(geocoder, **kwargs)
+        runners.append(runner)
+
+        return runner
+
+    yield create
+
+    for runner in runners:
+        if isinstance(runner.geocoder, BlockingGeocoder):
+            runner.geocoder.release_event.set()
+
+        runner.executor.shutdown(wait=True)
+
+def test_job_against_a_provider(create_runner):
+    server = StubGeocodeServer(miss_fraction=0.25)
+    server.start()
+    try:
+        provider = GeocodeMapsProvider(base_url=server.base_url, api_key='test', requests_per_second=1_000)
+        geocoder = Geocoder(providers=[provider], addresses=[], location_hint='Lisboa', use_cache=False, use_journal=False, use_local_index=False)
+        runner = create_runner(geocoder)
+
+        addresses = [f'Rua {i}' for i in range(20)]
+        job = runner.submit(addresses + addresses[:5], location_hint='Portugal')
+        wait_until(lambda: job.is_done)
+    finally:
+        server.shutdown()
+
+    progress = job.get_progress()
+    assert progress['status'] == GeocodeJob.FINISHED
+    # repeats are geocoded once
+    assert (progress['total'], progress['completed'], progress['errors']) == (20, 20, 0)
+    assert 0 < progress['found'] < 20
+    assert progress['eta_seconds'] == 0
+    assert provider.rate_limiter.request_count == 20
+
+    results_df = job.get_results_df()
+    assert list(results_df.columns) == Geocoder.RESULT_COLUMNS
+    assert results_df['address_original'].nunique() == progress['found']
+    # the job's location hint comes before the geocoder's
+    assert results_df['address'].str.endswith(', portugal, lisboa').all()
+    assert runner.get_job(job.job_id) is job
+
+def test_failed_lookups_are_errors(create_runner):
+    server = StubGeocodeServer(error_status=500)
+    server.start()
+    try:
+        provider = GeocodeMapsProvider(base_url=server.base_url, api_key='test', requests_per_second=1_000)
+        provider.MAX_RETRIES = 0
+        geocoder = Geocoder(providers=[provider], addresses=[], use_cache=False, use_journal=False, use_local_index=False)
+        job = create_runner(geocoder).submit([f'rua {i}' for i in range(5)])
+        wait_until(lambda: job.is_done)
+    finally:
+        server.shutdown()
+
+    progress = job.get_progress()
+    assert (progress['completed'], progress['found'], progress['errors']) == (5, 0, 5)
+    assert job.get_results_df().empty
+
+def test_lookups_in_flight_are_limited_per_job(create_runner):
+    geocoder = BlockingGeocoder()
+    runner = create_runner(geocoder, max_threads=4, max_in_flight_per_job=2)
+
+    first_job = runner.submit([f'first {i}' for i in range(6)])
+    second_job = runner.submit([f'second {i}' for i in range(6)])
+
+    # both jobs run at once, each with at most 2 lookups on the shared pool
+    wait_until(lambda: len(geocoder.in_flight) == 4)
+    assert sorted(address.split()[0] for address in geocoder.in_flight) == ['first', 'first', 'second', 'second']
+    assert runner.get_active_job_count() == 2
+    assert first_job.get_progress()['eta_seconds'] is None
+
+    geocoder.release_event.set()
+    wait_until(lambda: first_job.is_done and second_job.is_done)
+
+    assert geocoder.max_in_flight_count == 4
+    assert first_job.get_progress()['found'] == second_job.get_progress()['found'] == 6
+    assert runner.get_active_job_count() == 0
+
+def test_exceptions_are_errors(create_runner):
+    geocoder = BlockingGeocoder()
+    geocoder.release_event.set()
+
+    job = create_runner(geocoder).submit(['rua 1', 'error', 'rua 2'])
+    wait_until(lambda: job.is_done)
+
+    progress = job.get_progress()
+    assert (progress['completed'], progress['found'], progress['errors']) == (3, 2, 1)
+
+def test_cancel(create_runner):
+    geocoder = BlockingGeocoder()
+    runner = create_runner(geocoder, max_threads=2, max_in_flight_per_job=2)
+
+    job = runner.submit([f'rua {i}' for i in range(10)])
+    wait_until(lambda: len(geocoder.in_flight) == 2)
+    job.cancel()
+    geocoder.release_event.set()
+    wait_until(lambda: job.is_done)
+
+    progress = job.get_progress()
+    # lookups in flight when the job was cancelled finish and are kept, no more are submitted
+    assert progress['status'] == GeocodeJob.CANCELLED
+    assert progress['completed'] == 2
+    assert len(job.get_results_df()) == progress['completed']
+
+def test_oldest_done_jobs_are_removed(create_runner):
+    geocoder = BlockingGeocoder()
+    geocoder.release_event.set()
+    runner = create_runner(geocoder)
+    runner.MAX_DONE_JOBS = 2
+
+    jobs = []
+    for i in range(4):
+        jobs.append(runner.submit([f'rua {i}']))
+        wait_until(lambda: jobs[-1].is_done)
+
+    assert [runner.get_job(job.job_id) for job in jobs] == [None, jobs[1], jobs[2], jobs[3]]
@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+
+from benchmarks.stub_geocode_server import StubGeocodeServer
+from geocode_journal import GeocodeJournal
+from geocode_providers import GeocodeMapsProvider
+from geocoder import Geocoder
+
+COLUMNS = ['address_original', 'address', 'lat', 'long']
+
+def create_rows(address: str, row_count: int = 1) -> list[dict]:
+    return [{'address_original': address.upper(), 'address': address, 'lat': i, 'long': -i} for i in range(row_count)]
+
+def test_records_are_saved_every_save_count(tmp_path):
+    file_path = tmp_path / 'journal.jsonl'
+    journal = GeocodeJournal(str(file_path), save_count=2, columns=COLUMNS)
+    journal.open()
+
+    journal.record('a', create_rows('a'))
+    assert file_path.read_text() == ''
+
+    journal.record('b', create_rows('b'))
+    assert len(file_path.read_text().splitlines()) == 2
+
+    journal.record('c', [])
+    journal.close()
+    assert len(file_path.read_text().splitlines()) == 3
+
+def test_resume_after_a_crash(tmp_path):
+    file_path = tmp_path / 'journal.jsonl'
+    journal = GeocodeJournal(str(file_path), save_count=1, columns=COLUMNS)
+    journal.open()
+    journal.record('a', create_rows('a', 2))
+    journal.record('b', [])
+    journal.close()
+
+    # a crash part way through writing a record
+    with open(file_path, 'a', encoding='utf-8') as f:
+        f.write('{"address": "c", "rows": [{"addr')
+
+    journal = GeocodeJournal(str(file_path), save_count=1, columns=COLUMNS)
+    assert journal.open(resume=True) == {'a', 'b'}
+    assert journal.record_count == 2
+    journal.record('c', create_rows('c'))
+    journal.close()
+
+    assert [address for address, _ in journal.read_records()] == ['a', 'b', 'c']
+    pd.testing.assert_frame_equal(journal.read_data_frame(), pd.DataFrame(create_rows('a', 2) + create_rows('c'), columns=COLUMNS))
+
+def test_open_without_resume_clears_the_journal(tmp_path):
+    file_path = tmp_path / 'journal.jsonl'
+    journal = GeocodeJournal(str(file_path), save_count=1, columns=COLUMNS)
+    journal.open()
+    journal.record('a', create_rows('a'))
+    journal.close()
+
+    assert journal.open() == set()
+    journal.close()
+
+    # an empty journal still gives a data frame with the result columns
+    assert list(journal.read_data_frame().columns) == COLUMNS
+    assert journal.read_data_frame().empty
+
+@pytest.mark.parametrize('chunk_rows', [1, 3, 100])
+def test_export_csv(tmp_path, chunk_rows):
+    journal = GeocodeJournal(str(tmp_path / 'journal.jsonl'), save_count=10, columns=COLUMNS)
+    journal.open()
+    for address in 'abcde':
+        journal.record(address, create_rows(address, 2))
+    journal.close()
+
+    journal.export_csv(str(tmp_path / 'results.csv'), chunk_rows)
+
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'results.csv'), journal.read_data_frame(), check_dtype=False)
+
+def test_geocoder_resume_skips_completed_addresses(tmp_path):
+    server = StubGeocodeServer()
+    server.start()
+    try:
+        addresses = [f'rua {i}, lisboa' for i in range(12)]
+
+        def run(addresses: list[str], resume: bool) -> Geocoder:
+            provider = GeocodeMapsProvider(base_url=server.base_url, api_key='test', requests_per_second=1_000)
+            gc = Geocoder(providers=[provider], addresses=addresses, journal_file_path=str(tmp_path / 'journal.jsonl'), save_count=1, resume=resume, use_cache=False, use_local_index=False)
+            gc.geocode_addresses()
+
+            return gc
+
+        run(addresses[:5], resume=False)
+        gc = run(addresses, resume=True)
+    finally:
+        server.shutdown()
+
+    assert gc.providers[0].rate_limiter.request_count == 7
+    # the results of both runs are read back from the journal
+    assert sorted(gc.df['address_original'].unique()) == sorted(addresses)
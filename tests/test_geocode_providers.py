@@ -0,0 +1,160 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+import aiohttp
+import pytest
+
+from benchmarks.stub_geocode_server import StubGeocodeServer
+from geocode_providers import GeocodeMapsProvider, MaptilerProvider, PositionstackProvider, Provider
+from geocoder import Geocoder
+
+ROWS = [{'place_id': 1, 'osm_id': 2, 'lat': '38.7', 'lon': '-9.1', 'display_name': 'Lisboa', 'class': 'place', 'type': 'city', 'importance': 0.9}]
+
+# response body by requested address
+BODIES = {
+    'json': ('application/json', json.dumps(ROWS)),
+    'html': ('text/html', '<html><body>Bad gateway</body></html>'),
+    'empty': ('application/json', ''),
+}
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        content_type, body = BODIES[self.path.rsplit('=', 1)[-1]]
+        body = body.encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope='module')
+def provider():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield GeocodeMapsProvider(base_url=f'http://127.0.0.1:{server.server_port}/search?q={{}}', api_key='', requests_per_second=1_000)
+
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize('address, expected_count', [('json', 1), ('html', 0), ('empty', 0)])
+def test_geocode(provider, address, expected_count):
+    result = provider.geocode(address)
+
+    assert len(result) == expected_count
+
+async def geocode_async(provider: Provider, address: str) -> list[dict]:
+    async with aiohttp.ClientSession() as session:
+        return await provider.geocode_async(session, address)
+
+@pytest.mark.parametrize('address, expected_count', [('json', 1), ('html', 0), ('empty', 0)])
+def test_geocode_async(provider, address, expected_count):
+    result = asyncio.run(geocode_async(provider, address))
+
+    assert len(result) == expected_count
+
+ADDRESS_COUNT = 24
+
+@pytest.fixture
+def start_servers():
+    servers = []
+
+    def start(*server_kwargs: dict) -> list[StubGeocodeServer]:
+        for kwargs in server_kwargs:
+            server = StubGeocodeServer(seed=len(servers), **kwargs)
+            server.start()
+            servers.append(server)
+
+        return servers
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def create_geocoder(servers: list[StubGeocodeServer], requests_per_second: float, cache_file_path: str = None) -> Geocoder:
+    providers = []
+    for provider_class, server in zip([GeocodeMapsProvider, PositionstackProvider, MaptilerProvider], servers):
+        base_url = {
+            GeocodeMapsProvider: server.base_url,
+            PositionstackProvider: server.positionstack_base_url,
+            MaptilerProvider: server.maptiler_base_url
+        }[provider_class]
+
+        provider = provider_class(base_url=base_url, api_key='test', requests_per_second=requests_per_second)
+        # fail fast on a provider that is down
+        if server.error_status is not None:
+            provider.MAX_RETRIES = 0
+
+        providers.append(provider)
+
+    addresses = [f'rua {i}, lisboa' for i in range(ADDRESS_COUNT)]
+
+    return Geocoder(providers=providers, addresses=addresses, use_cache=cache_file_path is not None, cache_file_path=cache_file_path, use_journal=False, use_local_index=False)
+
+@pytest.mark.parametrize('mode', ['threads', 'async'])
+def test_work_is_spread_across_providers(start_servers, mode):
+    gc = create_geocoder(start_servers({}, {}, {}), requests_per_second=20)
+
+    if mode == 'async':
+        gc.geocode_addresses_async()
+    else:
+        gc.geocode_addresses()
+
+    assert gc.df['address_original'].nunique() == ADDRESS_COUNT
+    assert list(gc.df.columns) == Geocoder.RESULT_COLUMNS
+    # one provider alone would take over a second for every address
+    assert all(provider.rate_limiter.request_count > 0 for provider in gc.providers)
+    assert sum(provider.hit_count for provider in gc.providers) == ADDRESS_COUNT
+
+def test_misses_fall_back_to_the_next_provider(start_servers):
+    gc = create_geocoder(start_servers({'miss_fraction': 0.5}, {'miss_fraction': 0.5}, {}), requests_per_second=1_000)
+
+    gc.geocode_addresses()
+
+    assert gc.df['address_original'].nunique() == ADDRESS_COUNT
+    assert sum(provider.miss_count for provider in gc.providers) > 0
+
+def test_provider_that_is_down_falls_back(start_servers):
+    gc = create_geocoder(start_servers({'error_status': 500}, {}, {}), requests_per_second=1_000)
+
+    gc.geocode_addresses()
+
+    assert gc.df['address_original'].nunique() == ADDRESS_COUNT
+    assert gc.providers[0].failure_count > 0
+    assert gc.providers[0].hit_count == 0
+
+@pytest.mark.parametrize('status_code', [401, 403])
+def test_rejected_requests_are_failures_not_misses(start_servers, tmp_path, status_code):
+    gc = create_geocoder(start_servers({'error_status': status_code}), requests_per_second=1_000, cache_file_path=str(tmp_path / 'cache.sqlite'))
+    provider = gc.providers[0]
+
+    assert provider.geocode('rua 1, lisboa') is None
+    assert asyncio.run(geocode_async(provider, 'rua 1, lisboa')) is None
+    assert (provider.failure_count, provider.miss_count) == (2, 0)
+
+    # a failed lookup isn't cached as an address that doesn't exist
+    gc.geocode_addresses()
+    assert gc.df.empty
+    assert gc.cache.get(provider.name, gc.clean_address('rua 1, lisboa')) is None
+
+@pytest.mark.parametrize('provider_class, json_data', [
+    (GeocodeMapsProvider, {'error': 'invalid key'}),
+    (PositionstackProvider, {'error': {'code': 'invalid_access_key'}}),
+    (MaptilerProvider, {'message': 'Invalid key'}),
+    (MaptilerProvider, []),
+])
+def test_error_payloads_are_failures(provider_class, json_data):
+    assert provider_class(api_key='test').parse_results('rua 1, lisboa', json_data) is None
+
+def test_providers_must_implement_requests():
+    with pytest.raises(TypeError):
+        Provider()
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_data import compact_columns
+from indexer import build_index, find_data_files, index_file, OUTPUT_FILE_POSTFIX
+from utils import index_columns, RANK_COLUMN_NAME, SCORE_COLUMN_NAME
+
+EXAMPLE_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example_data", "index_data_csv.csv")
+
+def create_data(row_count: int = 1_000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data_df = pd.DataFrame({"label": [f"row {i}" for i in range(row_count)]})
+    for i in range(4):
+        values = rng.lognormal(size=row_count)
+        values[rng.random(row_count) < 0.05] = np.nan
+        data_df[f"column {i}"] = values
+
+    return data_df
+
+def test_rerun_skips_index_outputs(tmp_path):
+    data_df = create_data()
+    data_df.to_csv(tmp_path / "data.csv", index=False)
+    data_df.to_parquet(tmp_path / "more data.parquet", index=False)
+
+    for output_format in ["parquet", "csv"]:
+        for file_path in find_data_files(str(tmp_path)):
+            index_file(file_path, {}, str(tmp_path), output_format)
+
+    assert find_data_files(str(tmp_path)) == [str(tmp_path / "data.csv"), str(tmp_path / "more data.parquet")]
+    assert sorted(os.listdir(tmp_path)) == sorted([
+        "data.csv", f"data{OUTPUT_FILE_POSTFIX}.csv", f"data{OUTPUT_FILE_POSTFIX}.parquet",
+        "more data.parquet", f"more data{OUTPUT_FILE_POSTFIX}.csv", f"more data{OUTPUT_FILE_POSTFIX}.parquet"
+    ])
+
+def test_explicit_index_file_is_indexed(tmp_path):
+    file_path = tmp_path / f"data{OUTPUT_FILE_POSTFIX}.csv"
+    create_data().to_csv(file_path, index=False)
+
+    assert find_data_files(str(file_path)) == [str(file_path)]
+
+def test_build_index_uses_the_shared_pipeline():
+    data_df = pd.read_csv(EXAMPLE_FILE_PATH)
+    settings = {"weights": {data_df.columns[1]: 30}, "polarities": {data_df.columns[2]: "lower is better"}}
+
+    index_df, summary = build_index(data_df, settings)
+
+    columnar_data = compact_columns(data_df)[0]
+    expected_df = index_columns(columnar_data, summary["transformations"], summary["weights"], summary["polarities"])
+    pd.testing.assert_frame_equal(index_df, expected_df)
+
+    assert list(index_df.columns[-2:]) == [SCORE_COLUMN_NAME, RANK_COLUMN_NAME]
+    assert summary["weights"][data_df.columns[1]] == 30
+
+def test_index_columns_stage_runner_gets_every_stage():
+    columnar_data = compact_columns(create_data())[0]
+    transformations = {column_name: "log" for column_name in columnar_data.column_names}
+    weights = {column_name: 100 for column_name in columnar_data.column_names}
+    polarities = {column_name: "higher is better" for column_name in columnar_data.column_names}
+
+    stages = []
+    def run_stage(stage, key_parts, function, *args):
+        stages.append(stage)
+        return function(*args)
+
+    index_df = index_columns(columnar_data, transformations, weights, polarities, run_stage=run_stage)
+
+    assert stages == ["score matrix", "score"]
+    pd.testing.assert_frame_equal(index_df, index_columns(columnar_data, transformations, weights, polarities))
+
+def test_build_index_without_usable_columns():
+    data_df = pd.DataFrame({"label": ["a", "b", "c"], "text": ["x", "y", "z"]})
+
+    with pytest.raises(ValueError, match="No usable columns"):
+        build_index(data_df, {})
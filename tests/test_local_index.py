@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from geocode_providers import Provider
+from local_index import LocalGeocodeIndex
+
+def create_result_df() -> pd.DataFrame:
+    return pd.DataFrame([
+        {"address": "rua da liberdade 125", "lat": 1.0, "long": 2.0},
+        {"address": "avenida da republica 10, porto", "lat": 3.0, "long": 4.0},
+        # written from an earlier approximate match, must not become an exact match
+        {"address": "avenida da republica 100, porto", "lat": 5.0, "long": 6.0, "match_type": LocalGeocodeIndex.FUZZY}
+    ], columns=Provider.RESULT_COLUMNS + ["match_type"])
+
+def create_index(approximate: bool) -> LocalGeocodeIndex:
+    index = LocalGeocodeIndex(Provider.RESULT_COLUMNS, approximate=approximate)
+    index.build(create_result_df())
+
+    return index
+
+@pytest.mark.parametrize("approximate", [False, True])
+def test_exact_match_is_labelled(approximate):
+    rows = create_index(approximate).lookup("Rua da Liberdade, 125")
+
+    assert [(row["lat"], row["match_type"], row["matched_address"]) for row in rows] == [(1.0, "exact", "rua da liberdade 125")]
+    assert rows[0]["address"] == "Rua da Liberdade, 125"
+
+@pytest.mark.parametrize("address", ["rua da liberdade 12", "avenida da republica 100, porto"])
+def test_near_matches_are_not_returned_by_default(address):
+    index = create_index(approximate=False)
+
+    assert index.lookup(address) is None
+    assert (index.prefix_hits, index.fuzzy_hits, index.misses) == (0, 0, 1)
+
+def test_prefix_match_is_labelled():
+    rows = create_index(approximate=True).lookup("rua da liberdade 12")
+
+    assert [(row["lat"], row["match_type"], row["matched_address"]) for row in rows] == [(1.0, "prefix", "rua da liberdade 125")]
+
+def test_fuzzy_match_is_labelled():
+    rows = create_index(approximate=True).lookup("avenida da republica 100, porto")
+
+    assert [(row["lat"], row["match_type"], row["matched_address"]) for row in rows] == [(3.0, "fuzzy", "avenida da republica 10 porto")]
+
+def test_build_from_files_skips_approximate_rows(tmp_path):
+    file_path = tmp_path / "geocoded_addresses.csv"
+    create_result_df().to_csv(file_path, index=False)
+
+    index = LocalGeocodeIndex(Provider.RESULT_COLUMNS)
+    index.build_from_files([str(file_path)])
+
+    assert index.addresses == ["avenida da republica 10 porto", "rua da liberdade 125"]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_data import get_owner
+from parallel_columns import ColumnExecutor, find_shared_array
+from utils import calculate_matrix_statistics, TRANSFORMATIONS
+
+ROW_COUNT = 10_000
+
+def create_columns(column_count: int = 5) -> list[np.ndarray]:
+    rng = np.random.default_rng(0)
+    columns = []
+    for _ in range(column_count):
+        values = rng.lognormal(size=ROW_COUNT)
+        values[rng.random(ROW_COUNT) < 0.05] = np.nan
+        columns.append(values)
+
+    return columns
+
+def test_normalised_columns_match_and_own_their_memory(executor):
+    columns = create_columns()
+    transformations = [list(TRANSFORMATIONS.keys())[i % len(TRANSFORMATIONS)] for i in range(len(columns))]
+
+    serial = ColumnExecutor(max_workers=1).normalise_columns(columns, transformations)
+    parallel = executor.normalise_columns(columns, transformations)
+
+    for serial_column, parallel_column in zip(serial, parallel):
+        np.testing.assert_array_equal(parallel_column, serial_column)
+
+    # each column can be cached on its own without keeping a shared block of every column alive
+    for column in serial + parallel:
+        assert get_owner(column).nbytes == column.nbytes
+        assert find_shared_array(column) is None
+
+def test_statistics_match(executor):
+    columns = create_columns()
+    column_names = [f"column {i}" for i in range(len(columns))]
+
+    statistics_df = executor.calculate_statistics(columns, column_names, group_count=10)
+
+    pd.testing.assert_frame_equal(statistics_df, calculate_matrix_statistics(columns, column_names, group_count=10))
+
+def test_only_text_columns_are_coerced_in_parallel(executor):
+    rng = np.random.default_rng(0)
+    integers = pd.Series(rng.integers(0, 100, ROW_COUNT))
+    floats = pd.Series(rng.random(ROW_COUNT), dtype=np.float32)
+    text = pd.Series([f"{i:_}" if i % 10 else "n/a" for i in range(ROW_COUNT)], dtype=object)
+
+    output, parse_failure_counts = executor.coerce_columns([integers, floats])
+    assert find_shared_array(output) is None
+
+    columns = [integers, text, floats, text.astype("str")]
+    output, parse_failure_counts = executor.coerce_columns(columns)
+    serial_output, serial_parse_failure_counts = ColumnExecutor(max_workers=1).coerce_columns(columns)
+
+    assert find_shared_array(output) is not None
+    np.testing.assert_array_equal(output, serial_output)
+    assert parse_failure_counts == serial_parse_failure_counts == [0, ROW_COUNT // 10, 0, ROW_COUNT // 10]
+
+def test_default_thresholds():
+    executor = ColumnExecutor(max_workers=4)
+
+    assert not executor.is_parallel("coerce", 10_000_000, 50)
+    assert not executor.is_parallel("normalise", 10_000_000, 50)
+    assert not executor.is_parallel("statistics", 100_000, 10)
+    assert executor.is_parallel("statistics", 1_000_000, 10)
@@ -0,0 +1,119 @@
+from email.utils import formatdate
+import types
+
+import pytest
+
+import rate_limiter
+from rate_limiter import parse_retry_after, RateLimiter
+
+@pytest.fixture
+def clock(monkeypatch):
+    # the limiter reads time.monotonic(), replaced so tests step it instead of sleeping
+    clock = types.SimpleNamespace(now=1_000.0, sleeps=[])
+
+    def sleep(seconds: float):
+        clock.sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limiter, 'time', types.SimpleNamespace(monotonic=lambda: clock.now, time=lambda: clock.now, sleep=sleep))
+
+    return clock
+
+def test_token_bucket(clock):
+    limiter = RateLimiter(4, burst_size=2)
+
+    assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() == pytest.approx(0.25)
+
+    clock.now += 0.125
+    assert limiter.try_acquire() == pytest.approx(0.125)
+
+    clock.now += 0.125
+    assert limiter.try_acquire() == 0
+
+    # tokens don't build up past the burst size
+    clock.now += 10
+    assert [limiter.try_acquire() for _ in range(3)] == [0, 0, pytest.approx(0.25)]
+    assert limiter.request_count == 5
+
+def test_acquire_waits_for_a_token(clock):
+    limiter = RateLimiter(2)
+
+    assert limiter.acquire()
+    assert limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+    # gives up without waiting when the token comes too late
+    assert not limiter.acquire(timeout_seconds=0.25)
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+def test_retry_after_pauses_every_caller(clock):
+    limiter = RateLimiter(10)
+
+    limiter.on_throttled('5')
+
+    assert limiter.try_acquire() == pytest.approx(5)
+    assert limiter.get_wait_seconds() == pytest.approx(5)
+    assert limiter.rate == 5
+
+    # no burst when the pause ends
+    clock.now += 5
+    assert limiter.try_acquire() == pytest.approx(0.2)
+
+def test_backoff(clock):
+    limiter = RateLimiter(10)
+
+    pauses = []
+    for _ in range(8):
+        limiter.on_throttled()
+        pauses.append(limiter.get_wait_seconds())
+        clock.now += pauses[-1]
+
+    assert pauses == pytest.approx([1, 2, 4, 8, 16, 32, 60, 60])
+    # the rate is halved down to its minimum
+    assert limiter.rate == pytest.approx(RateLimiter.MIN_RATE_FRACTION * 10)
+    assert limiter.throttle_count == 8
+
+def test_throttles_during_a_pause_reduce_the_rate_once(clock):
+    limiter = RateLimiter(10)
+
+    limiter.on_throttled('5')
+    limiter.on_throttled('5')
+    limiter.on_throttled()
+
+    assert limiter.rate == 5
+    assert limiter.get_wait_seconds() == pytest.approx(5)
+
+def test_success_recovers_the_rate_and_resets_the_backoff(clock):
+    limiter = RateLimiter(10)
+    limiter.on_throttled()
+    clock.now += 1
+    limiter.on_throttled()
+    clock.now += 2
+
+    for _ in range(5):
+        limiter.on_success()
+
+    assert limiter.rate == pytest.approx(2.5 + 5 * RateLimiter.RATE_RECOVERY_FRACTION * 10)
+
+    for _ in range(100):
+        limiter.on_success()
+
+    assert limiter.rate == 10
+    limiter.on_throttled()
+    assert limiter.get_wait_seconds() == pytest.approx(RateLimiter.INITIAL_BACKOFF_SECONDS)
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
+
+@pytest.mark.parametrize('retry_after, expected_seconds', [(None, None), ('3', 3), ('1.5', 1.5), ('-2', 0), ('soon', None)])
+def test_parse_retry_after(retry_after, expected_seconds):
+    assert parse_retry_after(retry_after) == expected_seconds
+
+def test_parse_retry_after_http_date(clock):
+    clock.now = 1_700_000_000.0
+
+    assert parse_retry_after(formatdate(clock.now + 30, usegmt=True)) == pytest.approx(30)
+    assert parse_retry_after(formatdate(clock.now - 30, usegmt=True)) == 0
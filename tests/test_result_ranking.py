@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.result_ranking_benchmark import create_results
+from result_ranking import DEFAULT_CLASS_PRIORITIES, DEFAULT_TYPE_PRIORITIES, rank_results, to_columnar
+
+def create_candidates(rows: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=['address_original', 'address', 'display_name', 'class', 'type', 'importance', 'lat', 'long'])
+
+def test_ranking_order():
+    df = create_candidates([
+        ('A', 'a', 'city', 'place', 'city', '0.5', '38.7', '-9.1'),
+        ('A', 'a', 'district', 'boundary', 'administrative', '0.9', '38.7', '-9.1'),
+        ('A', 'a', 'road', 'highway', 'primary', '0.8', '38.7', '-9.1'),
+        ('A', 'a', 'hotel', 'tourism', 'hotel', '0.7', '38.7', '-9.1'),
+        ('A', 'a', 'bar', 'amenity', 'bar', '0.7', '38.7', '-9.1'),
+        ('A', 'a', 'airport', 'aeroway', 'aerodrome', None, '38.7', '-9.1'),
+    ])
+
+    ranked_df = rank_results(df, top_k=10)
+
+    # places first by importance (ties and missing importance in the provider's order), then roads, then areas
+    assert list(ranked_df['display_name']) == ['hotel', 'bar', 'city', 'airport', 'road', 'district']
+    assert list(ranked_df['rank']) == [1, 2, 3, 4, 5, 6]
+    assert list(ranked_df.columns[:2]) == ['address_original', 'rank']
+
+def test_type_priority_overrides_class_priority():
+    df = create_candidates([
+        ('A', 'a', 'postcode', 'place', 'postcode', '0.9', '38.7', '-9.1'),
+        ('A', 'a', 'city', 'boundary', 'city', '0.1', '38.7', '-9.1'),
+        ('A', 'a', 'unknown', None, None, '0.5', '38.7', '-9.1'),
+    ])
+
+    ranked_df = rank_results(df, top_k=3, class_priorities={'boundary': 0}, type_priorities={'postcode': 1, 'city': 2})
+
+    assert list(ranked_df['display_name']) == ['unknown', 'postcode', 'city']
+
+def test_top_k_per_address():
+    df = create_candidates([
+        (address, address.lower(), f'{address} {i}', 'place', 'city', str(i / 10), '38.7', '-9.1')
+        for address in ['B', 'A', 'C'] for i in range(3 if address != 'C' else 1)
+    ])
+
+    ranked_df = rank_results(df, top_k=2)
+
+    # addresses in order of first appearance
+    assert list(ranked_df['display_name']) == ['B 2', 'B 1', 'A 2', 'A 1', 'C 0']
+    assert list(ranked_df['rank']) == [1, 2, 1, 2, 1]
+
+    ranked_df = rank_results(df.drop(columns='address_original'))
+    assert list(ranked_df['display_name']) == ['B 2', 'A 2', 'C 0']
+    assert list(ranked_df.columns[:2]) == ['address', 'rank']
+
+@pytest.mark.parametrize('bounding_box, expected_names', [
+    ((30, 45, -10, 0), ['lisboa', 'madrid']),
+    ((-50, -30, 170, -170), ['wellington', 'chatham']),
+])
+def test_bounding_box(bounding_box, expected_names):
+    df = create_candidates([
+        ('A', 'a', 'london', 'place', 'city', '0.9', '51.5', '-0.1'),
+        ('A', 'a', 'lisboa', 'place', 'city', '0.8', '38.7', '-9.1'),
+        ('B', 'b', 'wellington', 'place', 'city', '0.9', '-41.3', '174.8'),
+        ('B', 'b', 'chatham', 'place', 'city', '0.8', '-44.0', '-176.5'),
+        ('C', 'c', 'madrid', 'place', 'city', '0.9', '40.4', '-3.7'),
+        ('C', 'c', 'nowhere', 'place', 'city', '0.9', 'n/a', '-3.7'),
+    ])
+
+    ranked_df = rank_results(df, top_k=2, bounding_box=bounding_box)
+
+    assert list(ranked_df['display_name']) == expected_names
+
+def test_to_columnar():
+    df = pd.DataFrame({
+        'place_id': ['1', '2', None],
+        'osm_id': ['10', 'x', '30'],
+        'lat': ['38.7', '', '40.4'],
+        'long': ['-9.1', '-3.7', '-3.7'],
+        'class': ['place', 'place', None],
+        'type': ['city', 'town', 'city'],
+        'importance': [0.5, None, 0.7]
+    })
+
+    columnar_df = to_columnar(df)
+
+    assert list(columnar_df['place_id']) == [1, 2, pd.NA]
+    assert list(columnar_df['osm_id']) == [10, pd.NA, 30]
+    assert str(columnar_df['osm_id'].dtype) == 'Int64'
+    np.testing.assert_array_equal(columnar_df['lat'], [38.7, np.nan, 40.4])
+    assert columnar_df['class'].dtype == 'category'
+    # the input isn't modified
+    assert df['lat'].iloc[0] == '38.7'
+
+def test_matches_a_sort_of_every_candidate():
+    df = create_results(500, np.random.default_rng(0))
+    top_k = 3
+
+    ranked_df = rank_results(df, top_k)
+
+    expected_df = to_columnar(df)
+    type_priority = expected_df['type'].astype(object).map(DEFAULT_TYPE_PRIORITIES)
+    expected_df['priority'] = type_priority.fillna(expected_df['class'].astype(object).map(DEFAULT_CLASS_PRIORITIES)).fillna(0)
+    expected_df['group'] = pd.factorize(expected_df['address'])[0]
+    expected_df = expected_df.sort_values(['group', 'priority', 'importance'], ascending=[True, True, False], kind='stable')
+    expected_df = expected_df.groupby('group', sort=False).head(top_k)
+
+    assert list(ranked_df['display_name']) == list(expected_df['display_name'])
+    assert ranked_df.groupby('address', sort=False)['rank'].apply(list).map(lambda ranks: ranks == list(range(1, len(ranks) + 1))).all()
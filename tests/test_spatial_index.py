@@ -0,0 +1,47 @@
+import numpy as np
+
+from spatial_index import haversine_km, SpatialIndex
+
+def create_index(point_count: int = 2_000) -> tuple[SpatialIndex, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-60, 60, point_count)
+    long = rng.uniform(-180, 180, point_count)
+
+    return SpatialIndex(lat, long), lat, long
+
+def test_query_nearest_matches_brute_force():
+    index, lat, long = create_index()
+    rng = np.random.default_rng(1)
+    query_lat = rng.uniform(-60, 60, 200)
+    query_long = rng.uniform(-180, 180, 200)
+
+    row_ids, distances = index.query_nearest(query_lat, query_long)
+
+    expected_row_ids = [np.argmin(haversine_km(query_lat[i], query_long[i], lat, long)) for i in range(len(query_lat))]
+    np.testing.assert_array_equal(row_ids, expected_row_ids)
+    np.testing.assert_allclose(distances, haversine_km(query_lat, query_long, lat[row_ids], long[row_ids]))
+
+def test_query_nearest_non_finite_queries():
+    index, lat, long = create_index()
+    query_lat = np.array([lat[5], np.nan, 10.0, np.inf])
+    query_long = np.array([long[5], 20.0, np.nan, 20.0])
+
+    row_ids, distances = index.query_nearest(query_lat, query_long)
+
+    np.testing.assert_array_equal(row_ids, [5, -1, -1, -1])
+    assert distances[0] == 0
+    assert np.isnan(distances[1:]).all()
+
+def test_query_nearest_empty_index():
+    row_ids, distances = SpatialIndex(np.empty(0), np.empty(0)).query_nearest(np.array([1.0, np.nan]), np.array([1.0, 1.0]))
+
+    np.testing.assert_array_equal(row_ids, [-1, -1])
+    assert np.isinf(distances[0]) and np.isnan(distances[1])
+
+def test_query_radius_skips_non_finite_queries():
+    index, lat, long = create_index()
+
+    result_df = index.query_radius(np.array([np.nan, lat[5]]), np.array([0.0, long[5]]), 100)
+
+    assert (result_df["query"] == 1).all()
+    assert result_df["row_id"].iloc[0] == 5
@@ -0,0 +1,189 @@
+from io import BytesIO
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from benchmarks.scoring_benchmark import compare_outputs, create_test_data, index, index_legacy
+import utils
+from utils import (
+    apply_transformation,
+    calculate_matrix_statistics,
+    calculate_moment_errors,
+    choose_transformations,
+    create_score_matrix,
+    EPSILON,
+    is_flip_required,
+    normalise_column,
+    ORDER_REVERSING_TRANSFORMATIONS,
+    RANK_COLUMN_NAME,
+    read_csv_file,
+    register_transformation,
+    rescore_index,
+    SCORE_COLUMN_NAME,
+    SELECTION_POLICIES,
+    TRANSFORMATIONS
+)
+
+def test_read_csv_file_types_and_folds_text():
+    file_object = BytesIO('﻿name,count,amount\nSão Paulo,"1,234",1.5\n"Lisboa, Portugal",,2\n'.encode("utf-8"))
+
+    data_df = read_csv_file(file_object, chunk_row_count=1)
+
+    assert list(data_df.columns) == ["name", "count", "amount"]
+    assert list(data_df["name"]) == ["Sao Paulo", "Lisboa Portugal"]
+    np.testing.assert_array_equal(data_df["count"].to_numpy(dtype=float), [1234, np.nan])
+    assert data_df["amount"].dtype == np.float64
+
+def test_read_csv_file_folds_text_value_columns():
+    data_df = read_csv_file(BytesIO("name,note\na,Café\nb,\n".encode("utf-8")))
+
+    assert list(data_df["note"].fillna("")) == ["Cafe", ""]
+
+# the loop divides by zero on the constant column
+@pytest.mark.filterwarnings("ignore:invalid value encountered:RuntimeWarning")
+def test_index_columns_matches_the_row_by_row_loop():
+    data_df, weights, polarities, transformations = create_test_data(300, 12)
+    data_df.loc[:, "column 3"] = 1.0
+
+    index_df = index(data_df, weights, polarities, transformations)
+
+    assert compare_outputs(index_legacy(data_df, weights, polarities, transformations), index_df)
+
+def test_rescore_index_flips_and_skips_nan():
+    labels = pd.Series(["a", "b", "c"], name="label")
+    score_matrix, is_valid = create_score_matrix([normalise_column(np.array([1.0, 2.0, 3.0])), normalise_column(np.array([np.nan, 0.0, 4.0]))])
+
+    index_df = rescore_index(labels, ["x___raw", "y___raw"], score_matrix, is_valid, np.array([1.0, 3.0]), np.array([False, True]))
+
+    np.testing.assert_array_equal(index_df["x___raw"], [0, 5, 10])
+    np.testing.assert_array_equal(index_df["y___raw"], [np.nan, 10, 0])
+    np.testing.assert_array_equal(index_df[SCORE_COLUMN_NAME], [0, 35 / 40 * 100, 10 / 40 * 100])
+    np.testing.assert_array_equal(index_df[RANK_COLUMN_NAME], [3, 1, 2])
+
+VALUES = np.array([-2.0, -EPSILON, 0.0, EPSILON, 0.25, 1.0, 9.0, np.nan, np.inf])
+
+@pytest.mark.parametrize("transformation, expected", [
+    ("raw", VALUES),
+    ("log", [np.nan, -np.inf, np.log(EPSILON), np.log(2 * EPSILON), np.log(0.25 + EPSILON), np.log(1 + EPSILON), np.log(9 + EPSILON), np.nan, np.inf]),
+    ("inverse", [1 / (-2 + EPSILON), np.nan, np.nan, 1 / (2 * EPSILON), 1 / (0.25 + EPSILON), 1 / (1 + EPSILON), 1 / (9 + EPSILON), np.nan, 0.0]),
+    ("square_root", [np.nan, np.nan, np.nan, np.sqrt(EPSILON), 0.5, 1.0, 3.0, np.nan, np.inf]),
+    ("squared", [4.0, EPSILON ** 2, 0.0, EPSILON ** 2, 0.0625, 1.0, 81.0, np.nan, np.inf]),
+])
+def test_apply_transformation(transformation, expected):
+    column = pd.Series(VALUES, index=range(10, 10 + len(VALUES)), name="amount")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        column_transformed = apply_transformation(column, transformation)
+
+    np.testing.assert_array_equal(column_transformed.to_numpy(), expected)
+    assert column_transformed.name == "amount"
+    assert list(column_transformed.index) == list(column.index)
+    # the column isn't modified
+    np.testing.assert_array_equal(column.to_numpy(), VALUES)
+
+def test_transformations_work_on_matrices():
+    values = np.abs(np.random.default_rng(0).normal(size=(50, 3)))
+    values[::7, 1] = np.nan
+
+    for transformation in TRANSFORMATIONS.values():
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix_transformed = transformation(values)
+
+            for i in range(values.shape[1]):
+                np.testing.assert_array_equal(matrix_transformed[:, i], transformation(values[:, i]))
+
+def test_apply_transformation_to_integer_column():
+    column_transformed = apply_transformation(pd.Series([1, 4, 9], dtype="Int64"), "square_root")
+
+    assert column_transformed.dtype == np.float64
+    np.testing.assert_array_equal(column_transformed, [1.0, 2.0, 3.0])
+
+def test_register_transformation(monkeypatch):
+    monkeypatch.setattr(utils, "TRANSFORMATIONS", dict(TRANSFORMATIONS))
+    monkeypatch.setattr(utils, "ORDER_REVERSING_TRANSFORMATIONS", set(ORDER_REVERSING_TRANSFORMATIONS))
+
+    register_transformation("negated", np.negative, order_reversing=True)
+
+    np.testing.assert_array_equal(apply_transformation(pd.Series([1.0, -2.0]), "negated"), [-1.0, 2.0])
+    assert is_flip_required("negated", "higher is better")
+
+    # registering again replaces the transformation
+    register_transformation("negated", np.positive)
+    assert not is_flip_required("negated", "higher is better")
+
+    # statistics are calculated for every registered transformation
+    assert list(calculate_matrix_statistics([np.arange(5.0)], ["a"])["transformation"]) == list(TRANSFORMATIONS) + ["negated"]
+
+@pytest.mark.parametrize("transformation, polarity, expected", [
+    ("raw", "higher is better", False),
+    ("raw", "lower is better", True),
+    ("inverse", "higher is better", True),
+    ("inverse", "lower is better", False),
+])
+def test_is_flip_required(transformation, polarity, expected):
+    assert is_flip_required(transformation, polarity) == expected
+
+def create_statistics_columns() -> list[np.ndarray]:
+    rng = np.random.default_rng(0)
+    columns = [rng.lognormal(size=400), rng.normal(size=400), np.full(400, 3.0), np.full(400, np.nan), rng.uniform(-1, 1, 400)]
+    columns[0][::9] = np.nan
+    columns[4][:300] = np.nan
+
+    return columns
+
+def test_calculate_matrix_statistics_matches_scipy():
+    columns = create_statistics_columns()
+
+    statistics_df = calculate_matrix_statistics(columns, list("abcde")).set_index(["column", "transformation"])
+
+    for column_name, column in zip("abcde", columns):
+        for transformation in TRANSFORMATIONS:
+            values = apply_transformation(pd.Series(column), transformation).to_numpy()
+            values = values[~np.isnan(values)]
+            row = statistics_df.loc[(column_name, transformation)]
+
+            assert row["obs"] == np.count_nonzero(~np.isnan(column))
+            assert row["obs_used"] == len(values)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                np.testing.assert_allclose([row["skew"], row["kurtosis"]], [stats.skew(values), stats.kurtosis(values)], rtol=1e-9)
+
+@pytest.mark.parametrize("block_bytes", [1, 8 * 400 * 2, utils.STATISTICS_BLOCK_BYTES])
+def test_calculate_matrix_statistics_blocks(block_bytes):
+    columns = create_statistics_columns()
+
+    pd.testing.assert_frame_equal(calculate_matrix_statistics(columns, list("abcde"), block_bytes), calculate_matrix_statistics(columns, list("abcde")))
+
+def test_calculate_moment_errors_match_the_jackknife():
+    values = np.random.default_rng(0).lognormal(size=(200, 2))
+    values[::5, 1] = np.nan
+    group_count = 10
+
+    skew_errors, kurtosis_errors = calculate_moment_errors(values, group_count)
+
+    for i in range(values.shape[1]):
+        column = values[:, i]
+        group_indexes = np.arange(len(column)) % group_count
+        left_out = [column[(group_indexes != g) & ~np.isnan(column)] for g in range(group_count)]
+        for errors, moment in [(skew_errors, stats.skew), (kurtosis_errors, stats.kurtosis)]:
+            moments = np.array([moment(group_values) for group_values in left_out])
+            expected_error = np.sqrt((group_count - 1) / group_count * ((moments - moments.mean()) ** 2).sum())
+
+            np.testing.assert_allclose(errors[i], expected_error, rtol=1e-6)
+
+def test_choose_transformations():
+    statistics_df = pd.DataFrame({
+        "column": ["a", "a", "a", "b", "b", "c", "c"],
+        "transformation": ["raw", "log", "inverse", "raw", "log", "raw", "log"],
+        "skew": [2.0, -0.5, np.nan, 0.3, -0.3, np.nan, np.nan],
+        "kurtosis": [0.1, 4.0, 0.0, 1.0, 0.0, np.nan, np.nan]
+    })
+
+    # nan scores are never chosen unless every score is nan, ties go to the first transformation
+    assert choose_transformations(statistics_df) == {"a": "log", "b": "raw", "c": "raw"}
+    assert choose_transformations(statistics_df, SELECTION_POLICIES["lowest kurtosis"]) == {"a": "inverse", "b": "log", "c": "raw"}
+    assert choose_transformations(statistics_df, SELECTION_POLICIES["lowest skew + kurtosis"]) == {"a": "raw", "b": "log", "c": "raw"}
@@ -1,32 +1,83 @@
-import csv
-import io
-from io import BytesIO
-import os
+import hashlib
 
 import numpy as np
 import pandas as pd
-
-import streamlit as st
+from openpyxl import load_workbook
+import pyarrow as pa
+from pyarrow import feather
+import pyarrow.parquet as pq
 
 from unidecode import unidecode
 
-# minimum acceptable percentage of NON-na values in column
+# minimum acceptable fraction of NON-na values in column
 USABLE_ROW_COUNT_LIMIT = 0.6
 
 EPSILON = 0.000001
 
-TRANSFORMATIONS = {
-    "raw": lambda x: x,    
-    #"log": lambda x: np.log(x) if x > 0 else np.nan,    
-    "log": lambda x: np.log(x + EPSILON),
-    "inverse": lambda x: 1/(x + EPSILON) if x != 0 else np.nan,    
-    "square_root": lambda x: np.sqrt(x) if x > 0 else np.nan,    
-    #"eigth_root": lambda x: x ** 0.125 if x > 0 else np.nan,    
-    "squared": lambda x: x ** 2,
-    #"power_four": lambda x: x ** 4
-}
+# transformations are array in/array out functions, registered with register_transformation below
+TRANSFORMATIONS = {}
+
+ORDER_REVERSING_TRANSFORMATIONS = set()
+
+def register_transformation(name: str, transformation, order_reversing: bool = False):
+    """
+    Add a vectorised transformation to TRANSFORMATIONS
+
+        Parameters:
+            name (str): name shown in the app and used as the column postfix
+            transformation (function): takes and returns a float np.ndarray of the same shape
+            order_reversing (bool): True if the transformation reverses the order of values
+    """
+
+    TRANSFORMATIONS[name] = transformation
+
+    if order_reversing:
+        ORDER_REVERSING_TRANSFORMATIONS.add(name)
+    else:
+        ORDER_REVERSING_TRANSFORMATIONS.discard(name)
+
+def transform_raw(x: np.ndarray) -> np.ndarray:
+    return x
+
+def transform_log(x: np.ndarray) -> np.ndarray:
+    return np.log(x + EPSILON)
+
+def transform_inverse(x: np.ndarray) -> np.ndarray:
+    # x == -EPSILON raised ZeroDivisionError in the scalar version, it now gives nan
+    x_shifted = x + EPSILON
+    return np.where((x != 0) & (x_shifted != 0), 1 / x_shifted, np.nan)
+
+def transform_square_root(x: np.ndarray) -> np.ndarray:
+    return np.where(x > 0, np.sqrt(x), np.nan)
+
+def transform_squared(x: np.ndarray) -> np.ndarray:
+    return x ** 2
+
+register_transformation("raw", transform_raw)
+register_transformation("log", transform_log)
+register_transformation("inverse", transform_inverse, order_reversing=True)
+register_transformation("square_root", transform_square_root)
+register_transformation("squared", transform_squared)
+#register_transformation("eigth_root", lambda x: np.where(x > 0, x ** 0.125, np.nan))
+#register_transformation("power_four", lambda x: x ** 4)
 
-ORDER_REVERSING_TRANSFORMATIONS = {"inverse"}
+def apply_transformation(column: pd.Series, transformation: str) -> pd.Series:
+    """
+    Apply a registered transformation to a whole column
+
+        Parameters:
+            column (pd.Series): numeric column
+            transformation (str): key of TRANSFORMATIONS
+
+        Returns:
+            column_transformed (pd.Series): float column with the same index and name
+    """
+
+    values = column.to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        values_transformed = TRANSFORMATIONS[transformation](values)
+
+    return pd.Series(values_transformed, index=column.index, name=column.name)
 
 POLARITY_OPTIONS = [
     'higher is better',
@@ -35,123 +86,214 @@ POLARITY_OPTIONS = [
 
 VALID_FILE_EXTENSIONS = [
     "csv",
-    "xlsx"
+    "xlsx",
+    "parquet",
+    "feather",
+    "arrow"
 ]
 
+# extensions read with read_arrow_file, feather files are arrow ipc files
+ARROW_FILE_EXTENSIONS = [
+    "parquet",
+    "feather",
+    "arrow"
+]
+
+HISTOGRAM_BIN_COUNT = 20
+
+# float64 size of the block of columns whose statistics are calculated together
+STATISTICS_BLOCK_BYTES = 64 * 1024 * 1024
+
+# rows of the sample used for the statistics and histograms in preview mode
+PREVIEW_SAMPLE_ROW_COUNT = 100_000
+
+# groups of rows left out in turn to estimate the standard errors of sampled statistics
+JACKKNIFE_GROUP_COUNT = 20
+
+# rows parsed at a time when reading csv files
+CSV_CHUNK_ROW_COUNT = 100_000
+CSV_ENCODINGS = ["utf-8-sig", "latin-1"]
+
 MAX_INDEX_CELL_SCORE = 10
 MAX_INDEX_ROW_SCORE = 100
 
-def load_file(uploaded_file: bytes) -> pd.DataFrame:
+SCORE_COLUMN_NAME = f"score/{MAX_INDEX_ROW_SCORE:,.0f}"
+RANK_COLUMN_NAME = "rank"
+
+def fold_text_column(column: pd.Series) -> pd.Series:
+    """
+    ASCII-fold text values with unidecode and strip commas (thousands separators)
+
+    Only non-ASCII values are passed to unidecode, everything else uses vectorised string methods.
+
+        Parameters:
+            column (pd.Series): column of str values and na values
+
+        Returns:
+            column_out (pd.Series)
     """
-    Return a copy of the specified excel sheet as a pandas DataFrame
+
+    text = column.dropna()
+    is_non_ascii = ~text.str.isascii().astype(bool)
+    if is_non_ascii.any():
+        text[is_non_ascii] = text[is_non_ascii].map(unidecode)
+
+    column_out = column.copy()
+    column_out[text.index] = text.str.replace(",", "", regex=False)
+
+    return column_out
+
+def read_csv_file(file_object, chunk_row_count: int = CSV_CHUNK_ROW_COUNT) -> pd.DataFrame:
+    """
+    Read a csv file in memory, parsing chunks of rows straight into typed columns
+
+    Quoted numbers with thousands separators (e.g. "123,456") are parsed as numbers, a byte order mark is
+    removed and headers and text values are ASCII-folded. Text values have any remaining commas removed.
 
         Parameters:
-            uploaded_file (bytes):            
-        
+            file_object (file-like): binary file object, e.g. a streamlit UploadedFile
+            chunk_row_count (int): number of rows parsed at a time
+
+        Returns:
+            data_df (pd.DataFrame): first column as text, other columns numeric where possible
+    """
+
+    for i, encoding in enumerate(CSV_ENCODINGS):
+        try:
+            file_object.seek(0)
+            headers = pd.read_csv(file_object, header=None, nrows=1, dtype=str, keep_default_na=False, encoding=encoding).iloc[0]
+
+            column_names = []
+            for column_name in headers:
+                column_names.append(create_unique_string(unidecode(column_name).strip(), column_names))
+
+            # empty cells are na, anything else that isn't numeric is kept as text
+            file_object.seek(0)
+            chunks = pd.read_csv(
+                file_object,
+                header=None,
+                skiprows=1,
+                names=column_names,
+                dtype={column_names[0]: str},
+                thousands=",",
+                keep_default_na=False,
+                na_values={column_name: [""] for column_name in column_names[1:]},
+                encoding=encoding,
+                chunksize=chunk_row_count
+            )
+
+            data_df_chunks = []
+            for data_df_chunk in chunks:
+                for column_name in data_df_chunk.select_dtypes(include=["object", "string"]).columns:
+                    data_df_chunk[column_name] = fold_text_column(data_df_chunk[column_name])
+
+                data_df_chunks.append(data_df_chunk)
+        except UnicodeDecodeError:
+            if i == len(CSV_ENCODINGS) - 1:
+                raise
+        else:
+            break
+
+    if data_df_chunks == []:
+        return pd.DataFrame(columns=column_names)
+
+    return pd.concat(data_df_chunks, ignore_index=True)
+
+def get_file_hash(file_bytes: bytes) -> str:
+    """
+    Return the sha256 hex digest of a file's contents, used as a cache key
+    """
+
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def is_numeric_arrow_type(arrow_type: pa.DataType) -> bool:
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type) or pa.types.is_boolean(arrow_type)
+
+def read_arrow_file(source, file_extension: str) -> pd.DataFrame:
+    """
+    Read a parquet or arrow ipc (feather) file, only the first (label) column and the numeric columns
+
+    Files on disk are memory mapped and uploaded bytes are read in place, the other columns are never read
+    or decompressed.
+
+        Parameters:
+            source (str | bytes): file path or file contents
+            file_extension (str): one of ARROW_FILE_EXTENSIONS
+
         Returns:
-            data_df (pd.DataFrame):
+            data_df (pd.DataFrame): label column followed by the numeric columns
     """
 
-    if uploaded_file is not None:
-        file_extention = uploaded_file.name.split(".")[-1]
+    if isinstance(source, str):
+        open_source = lambda: pa.memory_map(source)
     else:
-        file_extention = ""
-
-    if file_extention == "":
-        # no data uploaded
-        data_df = None
-    elif file_extention not in VALID_FILE_EXTENSIONS:
-        # unsupported file type
-        st.write(f"Unsupported file type '{file_extention}'. Please upload an excel or csv file.")
-        data_df = None
+        open_source = lambda: pa.BufferReader(source)
+
+    if file_extension == "parquet":
+        schema = pq.read_schema(open_source())
     else:
-        # load csv or excel file
-        try:
-            if file_extention == "csv":
-                """
-                pandas read_csv() function cannot be made to consistently read data when there's separator
-                in the data e.g the value "123,456" would cause an error and teh entire column would be 
-                read as null values
-
-                this occurs even when using the "sep" and "quotechar" arguments
-
-                therefore the solution below does the following:
-                    1) saves the uploaded file to a csv
-                    2) reads the saved file with csv.reader
-                    3) delete file
-                """
-                
-                data_as_bytes = BytesIO(uploaded_file.read())
-                #data_df = pd.read_csv(data_as_bytes, quotechar='"', engine="python")
-
-                file_name = "test.csv"
-                file_path = os.path.join(os.getcwd(), "example_data", file_name)
-
-                # create temporary file                
-                with open(file_path, "wb") as f:                    
-                    f.write(data_as_bytes.getbuffer())
-
-                # read data from temporary file
-                data = []
-                with open(file_path, "r", newline="") as f:
-                    reader = csv.reader(f)
-                    for i, row in enumerate(reader):
-                        if i == 0:
-                            # get headers and remove characters from start of file
-                            headers = row
-                            headers[0] = headers[0][3:]
-                        else:
-                            data.append([unidecode(x).replace(",", "") for x in row])
-
-                # delete temporary file and create data frame from data
-                os.remove(file_path)
-
-                data_as_dicts = [dict(zip(headers, row)) for row in data]
-                data_df = pd.DataFrame(data_as_dicts)
-            else:
-                # get excel worksheet names
-                workbook = pd.read_excel(BytesIO(uploaded_file.read()), sheet_name=None)
-
-                with st.form("Worksheet Selection"):
-                    column_widths = [0.8, 0.1, 0.1]
-                    header = st.columns(column_widths)
-                    header[0].subheader("Worksheet Name")
-                    header[1].subheader("Start Row")
-                    header[2].subheader("Start Column")
-
-                    row = st.columns(column_widths)                    
-                    sheet_name = row[0].selectbox(label="Select a worksheet", options=workbook.keys())
-                    row_number = row[1].slider(label=f"row number", label_visibility="hidden", min_value=1, max_value=50, value=1, step=1)
-                    column_number = row[2].slider(label=f"column number", label_visibility="hidden", min_value=1, max_value=50, value=1, step=1)
-                    #st.write(row_number)
-                    
-                    st.form_submit_button("Load Data")
-
-                # load excel worksheet
-                if sheet_name != "":
-                    data_df = workbook[sheet_name]                    
-                    column_names = list(data_df.iloc[row_number - 2])[column_number - 1:]                    
-
-                    column_names_adjusted = []
-                    for column_name in column_names:
-                        column_name_adjusted = create_unique_string(column_name, column_names_adjusted)                        
-                        column_names_adjusted.append(column_name_adjusted)
-                    
-                    data_df = data_df.iloc[row_number - 1:, column_number - 1:].copy()
-                    data_df.columns = column_names_adjusted
-
-                    if len(data_df.columns) != len(set(data_df.columns)):
-                        # incorrectly formatted worksheet
-                        st.write(f"Unable to read data from '{sheet_name}' worksheet. Incorrectly formatted data.")
-                        data_df = None
-                else:
-                    data_df = None
-        except AttributeError as e:
-            st.write("Exception raised while loading file.")
-            st.write(e)
-            data_df = None
-
-    return data_df
+        schema = pa.ipc.open_file(open_source()).schema
+
+    # a saved pandas index isn't data
+    index_column_names = [name for name in (schema.pandas_metadata or {}).get("index_columns", []) if isinstance(name, str)]
+    fields = [field for field in schema if field.name not in index_column_names]
+    column_names = [fields[0].name] + [field.name for field in fields[1:] if is_numeric_arrow_type(field.type)]
+
+    if file_extension == "parquet":
+        table = pq.read_table(open_source(), columns=column_names)
+    else:
+        table = feather.read_table(open_source(), columns=column_names)
+
+    return table.to_pandas().reset_index(drop=True)
+
+def read_workbook_metadata(file_object) -> dict[str, tuple[int, int]]:
+    """
+    Read the worksheet names and dimensions of an excel workbook without parsing any cell data
+
+        Parameters:
+            file_object (file-like): binary xlsx file object
+
+        Returns:
+            workbook_metadata (dict): (row count, column count) keyed by worksheet name, counts are None
+                                      when the workbook doesn't record them
+    """
+
+    workbook = load_workbook(file_object, read_only=True)
+    try:
+        workbook_metadata = {worksheet.title: (worksheet.max_row, worksheet.max_column) for worksheet in workbook.worksheets}
+    finally:
+        workbook.close()
+
+    return workbook_metadata
+
+def read_excel_sheet(file_object, sheet_name: str, row_number: int, column_number: int) -> pd.DataFrame:
+    """
+    Parse a single excel worksheet starting from the given row and column
+
+        Parameters:
+            file_object (file-like): binary xlsx file object
+            sheet_name (str): name of the worksheet
+            row_number (int): 1-based number of the row holding the column names, data starts on the next row
+            column_number (int): 1-based number of the first column to read
+
+        Returns:
+            data_df (pd.DataFrame): worksheet data with unique column names
+    """
+
+    worksheet_df = pd.read_excel(file_object, sheet_name=sheet_name, header=None, skiprows=row_number - 1)
+    worksheet_df = worksheet_df.iloc[:, column_number - 1:]
+
+    column_names_adjusted = []
+    if worksheet_df.shape[0] > 0:
+        for column_name in worksheet_df.iloc[0]:
+            column_name = "" if pd.isna(column_name) else str(column_name)
+            column_name_adjusted = create_unique_string(column_name, column_names_adjusted)
+            column_names_adjusted.append(column_name_adjusted)
+
+    data_df = worksheet_df.iloc[1:].infer_objects()
+    data_df.columns = column_names_adjusted
+
+    return data_df.reset_index(drop=True)
 
 def convert_to_float_or_nan(value: [int, float, str]):
     """
@@ -171,6 +313,364 @@ def convert_to_float_or_nan(value: [int, float, str]):
 
     return value_out
 
+def coerce_column(column: pd.Series) -> tuple[pd.Series, int]:
+    """
+    Convert a column to float64 with the same results as convert_to_float_or_nan
+
+    float64 columns are returned without copying and other numeric columns are cast. Text columns are cast
+    in one pass, if that fails only the values pd.to_numeric can't parse are retried with convert_to_float_or_nan.
+
+        Parameters:
+            column (pd.Series)
+
+        Returns:
+            column_out (pd.Series): float64 column
+            parse_failure_count (int): number of values that were not na but could not be converted
+    """
+
+    if column.dtype == np.float64:
+        return column, 0
+
+    try:
+        return column.astype(np.float64), 0
+    except (ValueError, TypeError):
+        pass
+
+    # pd.to_numeric finds the values that can't be parsed, but can be 1 ulp out so astype does the conversion
+    parsable = pd.to_numeric(column, errors="coerce").notna().to_numpy()
+    column_out = pd.Series(np.nan, index=column.index, name=column.name)
+    column_out[parsable] = column[parsable].astype(np.float64).to_numpy()
+
+    failed = column.notna().to_numpy() & ~parsable
+    if failed.any():
+        # e.g. "1_000" is accepted by float() but not by pd.to_numeric
+        failed_values = column[failed]
+        retried_values = failed_values.map({value: convert_to_float_or_nan(value) for value in failed_values.unique()})
+        column_out[failed] = retried_values.to_numpy(dtype=np.float64)
+        failed[failed] = retried_values.isna().to_numpy()
+
+    return column_out, int(failed.sum())
+
+def get_coercion_row(column: pd.Series, column_out: pd.Series, parse_failure_count: int, row_count: int) -> dict:
+    """
+    Summarise the coercion of one column for the coercion report
+
+        Parameters:
+            column (pd.Series): column as loaded
+            column_out (pd.Series), parse_failure_count (int): outputs of coerce_column
+            row_count (int): number of rows in the data
+
+        Returns:
+            coercion_row (dict): column, dtype, missing, parse_failures, valid, valid_fraction and usable
+    """
+
+    missing_count = int(column.isna().sum())
+    valid_count = int(column_out.notna().sum())
+    valid_fraction = valid_count / row_count if row_count > 0 else 0
+
+    return {
+        "column": column.name,
+        "dtype": str(column.dtype),
+        "missing": missing_count,
+        "parse_failures": parse_failure_count,
+        "valid": valid_count,
+        "valid_fraction": valid_fraction,
+        # determine whether column contains enought NON-na values
+        "usable": valid_fraction >= USABLE_ROW_COUNT_LIMIT
+    }
+
+def calculate_moments(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Skew and kurtosis of every column of a 2D array, ignoring nan values
+
+    Gives the same results as scipy.stats.skew and scipy.stats.kurtosis (biased, Fisher) on each column with
+    the nan values dropped, including nan for constant or empty columns.
+
+        Parameters:
+            values (np.ndarray): 2D float array, one column per variable
+
+        Returns:
+            skews (np.ndarray), kurtoses (np.ndarray), obs_used (np.ndarray): one value per column
+    """
+
+    is_nan = np.isnan(values)
+    obs_used = values.shape[0] - is_nan.sum(axis=0)
+
+    # moments are accumulated in place on a single working copy
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        deviations = np.where(is_nan, 0, values)
+        mean = deviations.sum(axis=0) / obs_used
+        deviations -= mean
+        np.copyto(deviations, 0, where=is_nan)
+
+        deviations_squared = deviations * deviations
+        m2 = deviations_squared.sum(axis=0) / obs_used
+        deviations *= deviations_squared
+        m3 = deviations.sum(axis=0) / obs_used
+        deviations_squared *= deviations_squared
+        m4 = deviations_squared.sum(axis=0) / obs_used
+
+        # same test scipy uses for a (numerically) constant column
+        is_constant = m2 <= (np.finfo(float).eps * mean) ** 2
+        skews = np.where(is_constant, np.nan, m3 / m2 ** 1.5)
+        kurtoses = np.where(is_constant, np.nan, m4 / m2 ** 2 - 3)
+
+    return skews, kurtoses, obs_used
+
+def moments_from_power_sums(sums: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Skew and kurtosis (biased, Fisher) from the sums of the powers 0 to 4 of deviations from a reference value
+
+        Parameters:
+            sums (np.ndarray): shape (5, ...), sums[k] is the sum of deviation ** k
+
+        Returns:
+            skews (np.ndarray), kurtoses (np.ndarray): nan for constant or empty columns
+    """
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        obs = sums[0]
+        mean = sums[1] / obs
+        mean_2 = sums[2] / obs
+        mean_3 = sums[3] / obs
+        mean_4 = sums[4] / obs
+
+        m2 = mean_2 - mean ** 2
+        m3 = mean_3 - 3 * mean * mean_2 + 2 * mean ** 3
+        m4 = mean_4 - 4 * mean * mean_3 + 6 * mean ** 2 * mean_2 - 3 * mean ** 4
+
+        is_constant = ~(m2 > 0)
+        skews = np.where(is_constant, np.nan, m3 / m2 ** 1.5)
+        kurtoses = np.where(is_constant, np.nan, m4 / m2 ** 2 - 3)
+
+    return skews, kurtoses
+
+def calculate_moment_errors(values: np.ndarray, group_count: int = JACKKNIFE_GROUP_COUNT) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Delete-a-group jackknife standard errors of the skew and kurtosis of every column of a 2D array
+
+    Row i belongs to group i % group_count. The moments with each group left out are recalculated from power
+    sums of the deviations from the column means, so values are only passed over once. Unlike the textbook
+    standard errors these don't assume the values are normally distributed.
+
+        Parameters:
+            values (np.ndarray): 2D float array of sampled rows, one column per variable
+            group_count (int): number of groups
+
+        Returns:
+            skew_errors (np.ndarray), kurtosis_errors (np.ndarray): one value per column, nan when a moment
+                                                                     can't be calculated
+    """
+
+    is_nan = np.isnan(values)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        deviations = np.where(is_nan, 0, values)
+        deviations -= deviations.sum(axis=0) / (~is_nan).sum(axis=0)
+        np.copyto(deviations, 0, where=is_nan)
+
+        # group_sums[k, g] is the sum of deviation ** k over the rows of group g
+        group_sums = np.empty((5, group_count, values.shape[1]))
+        for g in range(group_count):
+            group_deviations = deviations[g::group_count]
+            group_sums[0, g] = (~is_nan[g::group_count]).sum(axis=0)
+            powers = group_deviations.copy()
+            for k in range(1, 5):
+                group_sums[k, g] = powers.sum(axis=0)
+                powers *= group_deviations
+
+        skews, kurtoses = moments_from_power_sums(group_sums.sum(axis=1, keepdims=True) - group_sums)
+
+        scale = (group_count - 1) / group_count
+        skew_errors = np.sqrt(scale * ((skews - skews.mean(axis=0)) ** 2).sum(axis=0))
+        kurtosis_errors = np.sqrt(scale * ((kurtoses - kurtoses.mean(axis=0)) ** 2).sum(axis=0))
+
+    return skew_errors, kurtosis_errors
+
+def calculate_matrix_statistics(columns: list[np.ndarray], column_names: list[str], block_bytes: int = STATISTICS_BLOCK_BYTES, group_count: int = None) -> pd.DataFrame:
+    """
+    Calculate the skew and kurtosis of every column under every transformation
+
+    Blocks of columns are gathered into a float64 matrix and each transformation and its moments are computed
+    for the whole block at once, so the working copies stay around block_bytes however large the data is.
+
+        Parameters:
+            columns (list[np.ndarray]): float columns of the same length, not modified
+            column_names (list[str]): names of the columns
+            block_bytes (int): approximate float64 size of the columns processed together
+            group_count (int): when values are sampled rows, the number of jackknife groups used to add the
+                               standard errors skew_error and kurtosis_error (see calculate_moment_errors)
+
+        Returns:
+            statistics_df (pd.DataFrame): one row per column and transformation with the columns
+                                          column, transformation, skew, kurtosis, obs and obs_used, followed
+                                          by skew_error and kurtosis_error when group_count is given
+    """
+
+    column_count = len(columns)
+    row_count = columns[0].shape[0] if column_count > 0 else 0
+    transformation_count = len(TRANSFORMATIONS)
+    obs = np.empty(column_count, dtype=int)
+    skews = np.empty((column_count, transformation_count))
+    kurtoses = np.empty((column_count, transformation_count))
+    obs_used = np.empty((column_count, transformation_count), dtype=int)
+    skew_errors = np.empty((column_count, transformation_count))
+    kurtosis_errors = np.empty((column_count, transformation_count))
+
+    block_column_count = max(1, block_bytes // max(1, 8 * row_count))
+    for start in range(0, column_count, block_column_count):
+        block = slice(start, start + block_column_count)
+        values_block = np.empty((row_count, len(columns[block])), order="F")
+        for i, column in enumerate(columns[block]):
+            values_block[:, i] = column
+
+        obs[block] = (~np.isnan(values_block)).sum(axis=0)
+
+        for i, transformation in enumerate(TRANSFORMATIONS.keys()):
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                values_transformed = TRANSFORMATIONS[transformation](values_block)
+
+            skews[block, i], kurtoses[block, i], obs_used[block, i] = calculate_moments(values_transformed)
+            if group_count is not None:
+                skew_errors[block, i], kurtosis_errors[block, i] = calculate_moment_errors(values_transformed, group_count)
+
+    statistics_df = pd.DataFrame({
+        "column": np.repeat(np.array(column_names, dtype=object), transformation_count),
+        "transformation": np.tile(np.array(list(TRANSFORMATIONS.keys()), dtype=object), len(column_names)),
+        "skew": skews.ravel(),
+        "kurtosis": kurtoses.ravel(),
+        "obs": np.repeat(obs, transformation_count),
+        "obs_used": obs_used.ravel()
+    })
+
+    if group_count is not None:
+        statistics_df["skew_error"] = skew_errors.ravel()
+        statistics_df["kurtosis_error"] = kurtosis_errors.ravel()
+
+    return statistics_df
+
+def score_by_skew(statistics_df: pd.DataFrame) -> pd.Series:
+    return statistics_df["skew"].abs()
+
+def score_by_kurtosis(statistics_df: pd.DataFrame) -> pd.Series:
+    return statistics_df["kurtosis"].abs()
+
+def score_by_skew_and_kurtosis(statistics_df: pd.DataFrame) -> pd.Series:
+    return statistics_df["skew"].abs() + statistics_df["kurtosis"].abs()
+
+# transformation selection policies, each scores the rows of a statistics data frame (lower is better)
+SELECTION_POLICIES = {
+    "lowest skew": score_by_skew,
+    "lowest kurtosis": score_by_kurtosis,
+    "lowest skew + kurtosis": score_by_skew_and_kurtosis
+}
+
+DEFAULT_SELECTION_POLICY = "lowest skew"
+
+def choose_transformations(statistics_df: pd.DataFrame, selection_policy=score_by_skew) -> dict:
+    """
+    Choose the transformation with the lowest selection policy score for each column
+
+    Transformations with a nan score (e.g. no usable values) are never chosen unless all of them are nan,
+    ties go to the transformation registered first.
+
+        Parameters:
+            statistics_df (pd.DataFrame): output of calculate_matrix_statistics
+            selection_policy (function): takes statistics_df and returns a score for each row,
+                                         e.g. a value of SELECTION_POLICIES
+
+        Returns:
+            transformations_to_use (dict): transformation name keyed by column name
+    """
+
+    scores = selection_policy(statistics_df).astype(float).fillna(np.inf)
+    best_rows = scores.groupby(statistics_df["column"], sort=False).idxmin()
+
+    return dict(zip(best_rows.index, statistics_df.loc[best_rows.to_numpy(), "transformation"]))
+
+def sample_row_indexes(row_count: int, sample_row_count: int, seed: int = 0) -> np.ndarray:
+    """
+    Choose a uniform random sample of rows without replacement, the same sample reservoir sampling gives
+
+        Parameters:
+            row_count (int): number of rows in the data
+            sample_row_count (int): number of rows to sample, every row is used when there are fewer
+            seed (int): seed of the random generator, so the same data always gives the same sample
+
+        Returns:
+            row_indexes (np.ndarray): sorted indexes of the sampled rows
+    """
+
+    if row_count <= sample_row_count:
+        return np.arange(row_count)
+
+    return np.sort(np.random.default_rng(seed).choice(row_count, size=sample_row_count, replace=False))
+
+def calculate_histogram(column: pd.Series, transformation: str, bin_count: int = HISTOGRAM_BIN_COUNT) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Histogram of the finite values of a transformed column
+
+        Parameters:
+            column (pd.Series): float column
+            transformation (str): key of TRANSFORMATIONS
+            bin_count (int): number of equal width bins
+
+        Returns:
+            counts (np.ndarray): number of values in each bin, empty if there are no finite values
+            bin_edges (np.ndarray): bin_count + 1 edges
+    """
+
+    values = apply_transformation(column, transformation).to_numpy()
+    values = values[np.isfinite(values)]
+
+    if values.shape[0] == 0:
+        return np.array([], dtype=int), np.array([], dtype=float)
+
+    return np.histogram(values, bins=bin_count)
+
+def combine_transformed_columns(label_column: pd.Series, transformed_columns: dict, transformations_to_use: dict) -> pd.DataFrame:
+    """
+    Combine a label column and transformed columns into a transformed data frame
+
+        Parameters:
+            label_column (pd.Series)
+            transformed_columns (dict): transformed pd.Series keyed by column name
+            transformations_to_use (dict): transformation name keyed by column name
+
+        Returns:
+            transformed_df (pd.DataFrame): label column followed by "<column>___<transformation>" columns
+    """
+
+    columns_new = [label_column]
+    column_names_new = [label_column.name]
+    for column_name, column_transformed in transformed_columns.items():
+        columns_new.append(column_transformed)
+        column_names_new.append(f"{column_name}___{transformations_to_use[column_name]}")
+
+    transformed_df = pd.concat(columns_new, axis=1)
+    transformed_df.columns = column_names_new
+
+    return transformed_df
+
+def apply_transformations(data_df: pd.DataFrame, column_names: list[str], transformations_to_use: dict) -> pd.DataFrame:
+    """
+    Apply the chosen transformation to each column
+
+        Parameters:
+            data_df (pd.DataFrame): label column followed by float columns
+            column_names (list[str]): columns to transform, other columns are dropped
+            transformations_to_use (dict): transformation name keyed by column name
+
+        Returns:
+            transformed_df (pd.DataFrame): label column followed by "<column>___<transformation>" columns
+    """
+
+    transformed_columns = {
+        column_name: apply_transformation(data_df[column_name], transformations_to_use[column_name])
+        for column_name in column_names
+    }
+
+    return combine_transformed_columns(data_df.iloc[:, 0], transformed_columns, transformations_to_use)
+
 def get_column_name_raw(column_name_in: str, splitter="___") -> str:
     """
         Splits an input string on the specified splitter and returns the first n-1 elements
@@ -212,3 +712,168 @@ def create_unique_string(text: str, disallowed_strings: list[str], unique_postfi
     
     text = f"{text}{unique_postfix}"
     return create_unique_string(text, disallowed_strings)
+
+
+def is_flip_required(transformation: str, polarity: str) -> bool:
+    """
+    Determine whether a normalised column has to be flipped (MAX_INDEX_CELL_SCORE - value)
+
+        Parameters:
+            transformation (str): name of the transformation applied to the column
+            polarity (str): one of POLARITY_OPTIONS
+
+        Returns:
+            flip_required (bool): True when a higher transformed value should give a lower score
+    """
+
+    inversion_required = transformation in ORDER_REVERSING_TRANSFORMATIONS
+    higher_is_better = "higher" in polarity.lower()
+
+    return higher_is_better == inversion_required
+
+def normalise_column(values: np.ndarray) -> np.ndarray:
+    """
+    Min-max normalise a transformed column to the range 0 to MAX_INDEX_CELL_SCORE, before any flip
+
+        Parameters:
+            values (np.ndarray): transformed column values
+
+        Returns:
+            cell_scores (np.ndarray): nan where values is nan, all nan for constant or empty columns
+    """
+
+    if np.isnan(values).all():
+        return np.full(values.shape, np.nan)
+
+    col_min = np.nanmin(values)
+    col_max = np.nanmax(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cell_scores = MAX_INDEX_CELL_SCORE * ((values - col_min) / (col_max - col_min))
+
+    return cell_scores
+
+def normalise_transformed_column(column: pd.Series, transformation: str) -> np.ndarray:
+    """
+    Apply a transformation to a column and normalise it, the transformed column is not kept
+
+        Parameters:
+            column (pd.Series): numeric column
+            transformation (str): key of TRANSFORMATIONS
+
+        Returns:
+            cell_scores (np.ndarray): output of normalise_column
+    """
+
+    return normalise_column(apply_transformation(column, transformation).to_numpy())
+
+def create_score_matrix(normalised_columns: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stack normalised columns into the matrix used by rescore_index
+
+        Parameters:
+            normalised_columns (list[np.ndarray]): outputs of normalise_column, all the same length
+
+        Returns:
+            score_matrix (np.ndarray): rows x columns cell scores with nan replaced by 0
+            is_valid (np.ndarray): rows x columns bool array, False where the cell score was nan
+    """
+
+    if normalised_columns == []:
+        return np.empty((0, 0)), np.empty((0, 0), dtype=bool)
+
+    # column-major so index data frames can be built from it without copying
+    score_matrix = np.empty((normalised_columns[0].shape[0], len(normalised_columns)), order="F")
+    for i, normalised_column in enumerate(normalised_columns):
+        score_matrix[:, i] = normalised_column
+
+    is_valid = ~np.isnan(score_matrix)
+    score_matrix[~is_valid] = 0
+
+    return score_matrix, is_valid
+
+def rescore_index(labels: pd.Series, column_names: list[str], score_matrix: np.ndarray, is_valid: np.ndarray, column_weights: np.ndarray, flip_required: np.ndarray) -> pd.DataFrame:
+    """
+    Build the index data frame from a score matrix, only weights and polarities need to be supplied again
+
+    A flipped cell scores MAX_INDEX_CELL_SCORE - score and nan cells contribute nothing to the row score.
+    Columns are accumulated left to right so the row scores are identical to summing each row cell by cell.
+
+        Parameters:
+            labels (pd.Series): label column
+            column_names (list[str]): names of the score matrix columns
+            score_matrix (np.ndarray), is_valid (np.ndarray): outputs of create_score_matrix
+            column_weights (np.ndarray): weight of each column
+            flip_required (np.ndarray): bool for each column, see is_flip_required
+
+        Returns:
+            index_df (pd.DataFrame): label column, cell scores, SCORE_COLUMN_NAME and RANK_COLUMN_NAME
+    """
+
+    column_weights = np.asarray(column_weights, dtype=float)
+    flip_required = np.asarray(flip_required, dtype=bool)
+
+    cell_scores = np.where(flip_required, MAX_INDEX_CELL_SCORE - score_matrix, score_matrix)
+    cell_scores[~is_valid] = np.nan
+
+    row_scores = np.zeros(cell_scores.shape[0], dtype=float)
+    for i, weight in enumerate(column_weights):
+        row_scores += np.where(is_valid[:, i], cell_scores[:, i] * weight, 0)
+
+    max_score = np.sum(MAX_INDEX_CELL_SCORE * column_weights)
+
+    index_df = pd.DataFrame(cell_scores, columns=column_names, index=labels.index, copy=False)
+    index_df.insert(0, labels.name, labels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index_df[SCORE_COLUMN_NAME] = MAX_INDEX_ROW_SCORE * row_scores / max_score
+    index_df[RANK_COLUMN_NAME] = index_df[SCORE_COLUMN_NAME].rank(ascending=False)
+
+    return index_df
+
+def run_stage_directly(stage: str, key_parts: tuple, function, *args):
+    """
+    Stage runner for index_columns that calls function(*args) without caching
+    """
+
+    return function(*args)
+
+def normalise_columns_serially(columnar_data, column_names: list[str], transformations: dict) -> list[np.ndarray]:
+    """
+    normalise_transformed_column for each column, one after the other
+    """
+
+    return [
+        normalise_transformed_column(columnar_data.get_column(column_name), transformations[column_name])
+        for column_name in column_names
+    ]
+
+def index_columns(columnar_data, transformations: dict, weights: dict, polarities: dict, normalise_columns=normalise_columns_serially, run_stage=run_stage_directly) -> pd.DataFrame:
+    """
+    Normalise, score and rank coerced columns, the index pipeline shared by the Visual Indexer and the
+    headless indexer so both build the same index from the same data and settings
+
+        Parameters:
+            columnar_data (ColumnarData): output of columnar_data.compact_columns
+            transformations (dict): transformation name keyed by column name, for each column in the index in order
+            weights (dict): weight keyed by column name
+            polarities (dict): polarity option keyed by column name
+            normalise_columns (function): takes (columnar_data, column names, transformations) and returns the
+                                          normalise_transformed_column output of each column, e.g. computed
+                                          in parallel or cached
+            run_stage (function): takes (stage name, key parts, function, *args) and returns function(*args),
+                                  the key parts are the stage's parameters, e.g. for caching the stage
+
+        Returns:
+            index_df (pd.DataFrame): label column, "<column>___<transformation>" cell scores,
+                                     SCORE_COLUMN_NAME and RANK_COLUMN_NAME
+    """
+
+    column_names = list(transformations.keys())
+    normalised_columns = normalise_columns(columnar_data, column_names, transformations)
+    score_matrix, is_valid = run_stage("score matrix", (column_names, transformations), create_score_matrix, normalised_columns)
+
+    # weight and polarity changes only rerun the score stage
+    index_column_names = [f"{column_name}___{transformations[column_name]}" for column_name in column_names]
+    column_weights = np.array([weights[column_name] for column_name in column_names], dtype=float)
+    flip_required = np.array([is_flip_required(transformations[column_name], polarities[column_name]) for column_name in column_names], dtype=bool)
+
+    return run_stage("score", (column_names, transformations, column_weights.tolist(), flip_required.tolist()), rescore_index, columnar_data.get_labels(), index_column_names, score_matrix, is_valid, column_weights, flip_required)